@@ -0,0 +1,109 @@
+# Benchmark of the float32 price dtype against float64: memory, time and accuracy of the whole pipeline.
+import time
+import tracemalloc
+import numpy as np
+
+# makes the trading package importable
+import common
+import trading.data as data
+import trading.indicators as ind
+import trading.strategy as strategy
+
+
+def run_pipeline(dtype, n_stocks, days, trace = False):
+    '''
+    Generates prices in the given dtype, calculates the indicators and runs the crossing averages
+    and both momentum strategies (without ledgers).
+
+    Output:
+        results (dict): the indicators and the (positions, cash) of each strategy
+        seconds (float): wall time
+        peak (int): peak memory allocated (in bytes) if trace is True (tracing slows it down), 0 otherwise
+    '''
+    data.price_dtype = dtype
+    ind.indicator_cache.clear()
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+
+    prices = data.generate_stock_price(days, np.linspace(20, 400, n_stocks), np.linspace(0.5, 5, n_stocks), seed = 0)
+    results = {'prices': prices,
+               'moving_average': ind.moving_average(prices, 50),
+               'moving_average weighted': ind.moving_average(prices, 20, np.linspace(1, 2, 20) / np.linspace(1, 2, 20).sum()),
+               'stochastic': ind.oscillator(prices, 14),
+               'RSI': ind.oscillator(prices, 14, 'RSI'),
+               'crossing_averages': strategy.crossing_averages(prices, n = 50, m = 10, ledger = None),
+               'momentum stochastic': strategy.momentum(prices, ledger = None),
+               'momentum RSI': strategy.momentum(prices, osc_type = 'RSI', wait_time = 0, ledger = None)}
+
+    seconds = time.perf_counter() - start
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    ind.indicator_cache.clear()
+    data.price_dtype = np.float64
+    return results, seconds, peak
+
+
+def relative_error(values, reference):
+    '''
+    Errors relative to the reference values, where both are finite.
+    '''
+    finite = np.isfinite(reference) & np.isfinite(values)
+    return np.abs(values[finite].astype(float) - reference[finite]) / np.maximum(np.abs(reference[finite]), 1e-12)
+
+
+def absolute_error(values, reference):
+    '''
+    Errors of the values, where both they and the reference values are finite.
+    '''
+    finite = np.isfinite(reference) & np.isfinite(values)
+    return np.abs(values[finite].astype(float) - reference[finite])
+
+
+def run(n_stocks = 2000, days = 1825):
+    '''
+    Compares the float32 pipeline with the float64 one on n_stocks simulated stocks over days days,
+    and checks the tolerances documented next to data.price_dtype.
+    '''
+    reference, reference_seconds, _ = run_pipeline(np.float64, n_stocks, days)
+    compact, compact_seconds, _ = run_pipeline(np.float32, n_stocks, days)
+    reference_peak = run_pipeline(np.float64, n_stocks, days, trace = True)[2]
+    compact_peak = run_pipeline(np.float32, n_stocks, days, trace = True)[2]
+    print(f'{n_stocks} stocks x {days} days: float64 {reference_seconds:.2f}s, peak {reference_peak / 2**20:.0f}MB, '
+          f'float32 {compact_seconds:.2f}s, peak {compact_peak / 2**20:.0f}MB')
+
+    # same stocks go bust on the same days
+    assert np.array_equal(np.isnan(reference['prices']), np.isnan(compact['prices']))
+
+    # prices and moving averages are within a relative tolerance
+    for name, tolerance in [('prices', 6e-8), ('moving_average', 5e-6), ('moving_average weighted', 5e-6)]:
+        error = relative_error(compact[name], reference[name])
+        print(f'{name:<28} dtype {compact[name].dtype}, max relative error {np.max(error):.1e}')
+        assert compact[name].dtype == np.float32 and np.max(error) < tolerance
+
+    # oscillators (between 0 and 1) are within an absolute tolerance, except a few RSI values
+    # where a price change is so small that it rounds to 0
+    for name in ['stochastic', 'RSI']:
+        error = absolute_error(compact[name], reference[name])
+        outside = np.count_nonzero(error >= 1e-5)
+        print(f'{name:<28} dtype {compact[name].dtype}, max absolute error {np.max(error):.1e}, '
+              f'{outside} of {len(error)} values off by 1e-5 or more')
+        assert compact[name].dtype == np.float32 and outside <= 1e-4 * len(error)
+
+    # the trades are (almost) the same
+    for name in ['crossing_averages', 'momentum stochastic', 'momentum RSI']:
+        (positions, cash), (reference_positions, reference_cash) = compact[name], reference[name]
+
+        # days and stocks where the trades differ, and difference of the final profit/loss
+        trades_changed = np.count_nonzero(np.diff(positions, axis = 0) != np.diff(reference_positions, axis = 0))
+        traded = np.count_nonzero(np.diff(reference_positions, axis = 0))
+        profit_change = abs(cash[-1] - reference_cash[-1]) / np.sum(np.abs(np.diff(reference_cash)))
+        print(f'{name:<28} {trades_changed} of {traded} trades differ, '
+              f'profit/loss change {profit_change:.1e} of the cash traded')
+        assert trades_changed <= 1e-3 * traded and profit_change < 1e-6
+
+
+if __name__ == '__main__':
+    run()
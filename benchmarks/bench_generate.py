@@ -0,0 +1,111 @@
+# Benchmark of the vectorized stock price simulation against the original day-by-day loop.
+import numpy as np
+
+# makes the trading package importable
+from common import time_call
+import trading.data as data
+
+
+def loop_simulate_prices(initial_prices, volatility, increment_matrix, event_days, event_sizes, event_durations):
+    '''
+    Original day-by-day simulation loop from generate_stock_price(), fed with given random draws
+    so that it can be compared with data.simulate_prices().
+    '''
+    initial_prices = np.atleast_1d(np.array(initial_prices, dtype = float))
+    volatility = np.array(volatility)
+    days = increment_matrix.shape[0] + 1
+    n = len(initial_prices)
+
+    # news drift (if any) starting on each day
+    events = {day: (size, duration) for day, size, duration in zip(event_days, event_sizes, event_durations)}
+
+    share_price_matrix = np.zeros((days, n))
+    share_price_matrix[0] = initial_prices
+    share_price_matrix[:, initial_prices == 0] = np.nan
+
+    for day in range(1, days):
+        share_price_matrix[day] += share_price_matrix[day - 1] + increment_matrix[day - 1]
+
+        if day in events:
+            size, duration = events[day]
+            share_price_matrix[day : (day + duration)] += size * volatility
+
+        if np.any(share_price_matrix[day] <= 0):
+            index_where_zero = np.where((share_price_matrix[day] <= 0))
+            share_price_matrix[day:, index_where_zero] = np.nan
+
+    return share_price_matrix
+
+
+def loop_generate_stock_price(days, initial_prices, volatility, news_probability = 0.01):
+    '''
+    Original generate_stock_price(), calling data.news() on every day of the simulation.
+    '''
+    initial_prices = np.array(initial_prices)
+    volatility = np.array(volatility)
+    n = len(np.atleast_1d(initial_prices))
+
+    share_price_matrix = np.zeros((days, n))
+    share_price_matrix[0] = initial_prices
+
+    rng = np.random.default_rng()
+    increment_matrix = rng.normal(0, volatility, size = (days - 1, n))
+
+    for day in range(1, days):
+        share_price_matrix[day] += share_price_matrix[day - 1] + increment_matrix[day - 1]
+
+        news_drift = data.news(news_probability, volatility)
+        duration = news_drift.shape[0]
+        share_price_matrix[day : (day + duration)] += news_drift[0]
+
+        if np.any(share_price_matrix[day] <= 0):
+            index_where_zero = np.where((share_price_matrix[day] <= 0))
+            share_price_matrix[day:, index_where_zero] = np.nan
+
+    return share_price_matrix
+
+
+def check(n_stocks = 1000, days = 1825):
+    '''
+    Checks that data.simulate_prices() and the original loop give the same prices
+    from the same random draws.
+    '''
+    rng = np.random.default_rng(0)
+    initial_prices = rng.uniform(1, 100, n_stocks)
+    volatility = rng.uniform(0.1, 6, n_stocks)
+    increment_matrix = rng.normal(0, volatility, size = (days - 1, n_stocks))
+    event_days, event_sizes, event_durations = data.news_events(days, 0.05, rng)
+
+    vectorized = data.simulate_prices(initial_prices, volatility, increment_matrix, event_days, event_sizes, event_durations)
+    reference = loop_simulate_prices(initial_prices, volatility, increment_matrix, event_days, event_sizes, event_durations)
+
+    # same bankruptcies, and prices equal up to floating point rounding of the sums
+    assert np.array_equal(np.isnan(vectorized), np.isnan(reference))
+    assert np.allclose(vectorized, reference, equal_nan = True, rtol = 0, atol = 1e-8)
+    print(f'check:      {n_stocks} stocks x {days} days, {np.isnan(reference[-1]).sum()} bust, identical paths')
+
+
+def run(n_stocks = 10000, days = 1825, small_stocks = 7, small_runs = 100):
+    '''
+    Times generate_stock_price() against the original loop, for one wide universe of
+    n_stocks stocks and for small_runs simulations of small_stocks stocks.
+    '''
+    check()
+
+    initial_prices = np.full(n_stocks, 200.0)
+    volatility = np.linspace(0.5, 5, n_stocks)
+    loop_time = time_call(loop_generate_stock_price, days, initial_prices, volatility)
+    vectorized_time = time_call(data.generate_stock_price, days, initial_prices, volatility)
+    print(f'wide:       {n_stocks} stocks x {days} days, loop {loop_time:.3f}s, '
+          f'vectorized {vectorized_time:.3f}s, speedup {loop_time / vectorized_time:.1f}x')
+
+    initial_prices = initial_prices[:small_stocks]
+    volatility = volatility[:small_stocks]
+    loop_time = small_runs * time_call(loop_generate_stock_price, days, initial_prices, volatility, repeat = 3)
+    vectorized_time = small_runs * time_call(data.generate_stock_price, days, initial_prices, volatility, repeat = 3)
+    print(f'small:      {small_runs} x {small_stocks} stocks x {days} days, loop {loop_time:.3f}s, '
+          f'vectorized {vectorized_time:.3f}s, speedup {loop_time / vectorized_time:.1f}x')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,82 @@
+# Benchmark of the time taken to import the trading package in a new process (cold start).
+#
+# Fails (exit status 1) if the imports take longer than the budget, or if they load matplotlib or pandas,
+# which are only needed for plots and tables:
+#     python benchmarks/bench_import.py --budget 0.5
+import sys
+import argparse
+import subprocess
+
+# folder containing the trading package
+from common import ROOT
+
+# modules that must not be imported by a headless run
+HEAVY_MODULES = ['matplotlib', 'pandas', 'scipy']
+
+# imports every module of the package and prints the time taken and the heavy modules loaded
+IMPORT_SCRIPT = f'''
+import sys, time
+start = time.perf_counter()
+import trading.data, trading.indicators, trading.process, trading.strategy, trading.performance, trading.sweep
+print(time.perf_counter() - start)
+print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))
+'''
+
+
+def import_time(repeat = 5):
+    '''
+    Imports the trading package in repeat new processes.
+
+    Output:
+        seconds (float): best time taken by the imports (not counting the start of Python itself)
+        heavy_modules (list): heavy modules loaded by the imports
+    '''
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd = ROOT, capture_output = True,
+                                text = True, check = True).stdout.splitlines()
+        times.append(float(output[0]))
+        heavy_modules = [name for name in output[1].split(',') if name]
+    return min(times), heavy_modules
+
+
+def slowest_imports(number = 10):
+    '''
+    Lists the modules that take longest to import (including the modules they import), using python -X importtime.
+    '''
+    report = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import trading.strategy, trading.performance, trading.sweep'],
+                            cwd = ROOT, capture_output = True, text = True, check = True).stderr.splitlines()
+
+    # lines look like 'import time:       412 |       1200 | numpy'
+    imports = []
+    for line in report[1:]:
+        self_time, cumulative_time, name = line.split('|')
+        imports.append((int(cumulative_time), name.strip()))
+    return sorted(imports, reverse = True)[:number]
+
+
+def run(budget = 0.5, repeat = 5):
+    '''
+    Times the imports and checks them against the budget (in seconds).
+
+    Output:
+        ok (bool): True if the imports are within budget and load no heavy module
+    '''
+    seconds, heavy_modules = import_time(repeat)
+    print(f'import trading: {seconds:.3f}s (budget {budget:.3f}s)')
+    for cumulative_time, name in slowest_imports():
+        print(f'    {cumulative_time / 1e6:.3f}s {name}')
+
+    if heavy_modules:
+        print(f'heavy modules imported: {", ".join(heavy_modules)}')
+    return seconds <= budget and not heavy_modules
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Times the import of the trading package in a new process.')
+    parser.add_argument('--budget', type = float, default = 0.5, help = 'maximum import time in seconds')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'number of processes, the best time is kept')
+    arguments = parser.parse_args()
+
+    if not run(arguments.budget, arguments.repeat):
+        sys.exit(1)
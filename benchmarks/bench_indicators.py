@@ -0,0 +1,152 @@
+# Benchmark of the vectorized indicators against the original day-by-day loops.
+import time
+import numpy as np
+
+# makes the trading package importable
+from common import time_call
+import trading.data as data
+import trading.indicators as ind
+
+
+def loop_moving_average(stock_prices, n = 7, weights = []):
+    '''
+    Original moving_average() loop, recomputing each n-day window on every day.
+    The weighted average is taken per stock.
+    '''
+    number_of_days = stock_prices.shape[0]
+    weights_array = np.array(weights)
+    ma = np.zeros(stock_prices.shape)
+    ma[:(n - 1)] = np.nan
+
+    if len(weights) == 0:
+        for day in range(n - 1, number_of_days):
+            ma[day] = np.mean(stock_prices[(day - (n - 1)) : (day + 1)], axis = 0)
+    else:
+        for day in range(n - 1, number_of_days):
+            ma[day] = np.matmul(weights_array, stock_prices[(day - (n - 1)) : (day + 1)])
+
+    return ma
+
+
+def loop_stochastic(stock_prices, n = 7):
+    '''
+    Original stochastic oscillator loop, taking the maximum and minimum of each window on every day.
+    '''
+    number_of_days, N = stock_prices.shape
+    osc = np.zeros((number_of_days, N))
+    osc[:(n - 1)] = np.nan
+
+    for day in range(n - 1, number_of_days):
+        max_price = np.amax(stock_prices[(day - (n - 1)) : (day + 1)], axis = 0)
+        min_price = np.amin(stock_prices[(day - (n - 1)) : (day + 1)], axis = 0)
+        osc[day] = (stock_prices[day] - min_price) / (max_price - min_price)
+
+    return osc
+
+
+def loop_rsi(stock_prices, n = 7):
+    '''
+    Original RSI loop, masking the positive and negative differences of each window with NaN on every day.
+    '''
+    number_of_days, N = stock_prices.shape
+    osc = np.zeros((number_of_days, N))
+    osc[:(n - 1)] = np.nan
+
+    for day in range(n - 1, number_of_days):
+        differences = stock_prices[(day - (n - 2)) : (day + 1)] - stock_prices[(day - (n - 1)) : day]
+        differences = differences.reshape((n - 1, N))
+        positive_differences = np.where(differences > 0, differences, np.nan)
+        negative_differences = np.where(differences < 0, differences, np.nan)
+        x = 0
+        y = 0
+        if np.any(np.all(np.isnan(negative_differences), axis = 0)):
+            stock_where_no_neg = np.where(np.all(np.isnan(negative_differences), axis = 0))[0]
+            negative_differences[:, stock_where_no_neg] = 0
+            x = 1
+        if np.any(np.all(np.isnan(positive_differences), axis = 0)):
+            stock_where_no_pos = np.where(np.all(np.isnan(positive_differences), axis = 0))[0]
+            positive_differences[:, stock_where_no_pos] = 0
+            y = 1
+        if np.all(positive_differences == 0) == False and np.all(negative_differences == 0) == False:
+            average_positive = np.nanmean(positive_differences, axis = 0)
+            if y == 1:
+                average_positive[stock_where_no_pos] = np.nan
+            average_negative = np.abs(np.nanmean(negative_differences, axis = 0))
+            if x == 1:
+                average_negative[stock_where_no_neg] = np.nan
+            RS = average_positive / average_negative
+            osc[day] = 1 - (1 / (1 + RS))
+        if x == 1:
+            osc[day, stock_where_no_neg] = 1
+        if y == 1:
+            osc[day, stock_where_no_pos] = 0
+
+    return osc
+
+
+def compare(name, loop_function, vectorized_function, *args):
+    '''
+    Times both versions of an indicator, checks that they agree bit for bit and prints the speedup.
+    '''
+    reference = loop_function(*args)
+    result = vectorized_function(*args)
+
+    # the same values bit for bit, so that the same trades are made on ties (e.g. two equal moving averages)
+    assert np.array_equal(reference, result, equal_nan = True)
+
+    loop_time = time_call(loop_function, *args)
+    vectorized_time = time_call(vectorized_function, *args, repeat = 3)
+    print(f'{name:<28} loop {loop_time:.3f}s, vectorized {vectorized_time:.3f}s, speedup {loop_time / vectorized_time:.1f}x')
+
+
+def run(n_stocks = 1000, days = 1825):
+    '''
+    Compares each indicator with its original loop on n_stocks simulated stocks over days days.
+    '''
+    # simulated prices, some of which go bust (NaN until the end)
+    prices = data.generate_stock_price(days, np.linspace(20, 400, n_stocks), np.linspace(0.5, 5, n_stocks), seed = 0)
+    print(f'{n_stocks} stocks x {days} days, {np.isnan(prices[-1]).sum()} bust')
+
+    compare('moving_average n=200', loop_moving_average, ind.moving_average, prices, 200)
+    compare('moving_average n=50', loop_moving_average, ind.moving_average, prices, 50)
+    weights = np.linspace(1, 2, 50) / np.linspace(1, 2, 50).sum()
+    compare('moving_average n=50 weighted', loop_moving_average, ind.moving_average, prices, 50, weights)
+
+    compare('stochastic n=14', loop_stochastic, ind.oscillator, prices, 14)
+    compare('stochastic n=200', loop_stochastic, ind.oscillator, prices, 200)
+
+    rsi = lambda stock_prices, n: ind.oscillator(stock_prices, n, 'RSI')
+    compare('RSI n=14', loop_rsi, rsi, prices, 14)
+    compare('RSI n=3', loop_rsi, rsi, prices, 3)
+
+
+def run_streaming(n_stocks = 1000, days = 1825, new_days = 100):
+    '''
+    Compares adding new_days days one at a time to the streaming indicators with
+    recomputing the batch indicators over the whole history on each new day.
+    '''
+    prices = data.generate_stock_price(days + new_days, np.linspace(20, 400, n_stocks), np.linspace(0.5, 5, n_stocks), seed = 0)
+    history, live = prices[:days], prices[days:]
+
+    for name, rolling, batch in [('RollingMA n=200', ind.RollingMA.from_history(history, 200), lambda x: ind.moving_average(x, 200)),
+                                 ('RollingStochastic n=14', ind.RollingStochastic.from_history(history, 14), lambda x: ind.oscillator(x, 14)),
+                                 ('RollingRSI n=14', ind.RollingRSI.from_history(history, 14), lambda x: ind.oscillator(x, 14, 'RSI')),
+                                 ('RollingRSI n=7 smoothed 5', ind.RollingRSI.from_history(history, 7, 5), lambda x: ind.oscillator(x, 7, 'RSI', 5))]:
+        start = time.perf_counter()
+        streamed = np.array([rolling.update(price_row).copy() for price_row in live])
+        streaming_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        recomputed = np.array([batch(prices[:(days + day + 1)])[-1] for day in range(new_days)])
+        batch_time = time.perf_counter() - start
+
+        # the same values bit for bit, so that the same trades are made on threshold ties
+        assert np.array_equal(streamed, recomputed, equal_nan = True)
+        print(f'{name:<28} {new_days} updates: batch {batch_time:.3f}s, streaming {streaming_time:.3f}s, '
+              f'speedup {batch_time / streaming_time:.1f}x')
+
+
+if __name__ == '__main__':
+    run()
+    run(n_stocks = 10)
+    run_streaming()
@@ -0,0 +1,65 @@
+# Benchmark of ledger reading against the original regex parser.
+import os
+import re
+import time
+import tempfile
+import numpy as np
+
+# makes the trading package importable
+from common import ROOT, time_call
+import trading.performance as per
+
+
+def loop_parse_ledger(ledger_file):
+    '''
+    Original read_ledger() parser, splitting with a regex and removing empty strings one at a time.
+    '''
+    file = open(ledger_file, 'r')
+    contents = file.read()
+    file.close()
+    contents = re.split('[,\n\s]\s*', contents)
+    no_of_trades = contents.count('buy') + contents.count('sell')
+
+    i = 0
+    while i < len(contents):
+        if contents[i] == '':
+            contents.remove(contents[i])
+        else:
+            if contents[i] == 'buy':
+                contents[i] = 1
+            elif contents[i] == 'sell':
+                contents[i] = -1
+            i += 1
+
+    return np.array(contents, dtype = float).reshape(no_of_trades, 7)
+
+
+def run(copies = (1, 4, 16)):
+    '''
+    Times the original parser and load_ledger() on random_ledger.txt repeated copies times,
+    and load_ledger() on the same ledger in the binary format.
+    '''
+    ledger = open(os.path.join(ROOT, 'random_ledger.txt')).read()
+
+    with tempfile.TemporaryDirectory() as folder:
+        for number_of_copies in copies:
+            text_file = os.path.join(folder, f'ledger_{number_of_copies}.txt')
+            binary_file = os.path.join(folder, f'ledger_{number_of_copies}.bin')
+            with open(text_file, 'w') as file:
+                file.write(ledger * number_of_copies)
+            per.ledger_to_binary(text_file, binary_file)
+
+            # all the parsers agree
+            reference = loop_parse_ledger(text_file)
+            assert np.array_equal(reference, per.load_ledger(text_file))
+            assert np.array_equal(reference, per.load_ledger(binary_file))
+
+            loop_time = time_call(loop_parse_ledger, text_file)
+            text_time = time_call(per.load_ledger, text_file, repeat = 3)
+            binary_time = time_call(per.load_ledger, binary_file, repeat = 3)
+            print(f'{len(reference):>8} trades: regex {loop_time:.3f}s, text {text_time:.3f}s ({loop_time / text_time:.0f}x), '
+                  f'binary {binary_time:.4f}s ({loop_time / binary_time:.0f}x)')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,108 @@
+# Benchmark of the cost of the profiling hooks (trading/profiling.py), and an example of their report.
+#
+# Fails (exit status 1) if the hooks make an instrumented function slower by more than the budget
+# when no profile is running:
+#     python benchmarks/bench_profiling.py --budget 1e-6 --output profile.json
+import sys
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+
+# makes the trading package importable
+import common
+import trading.data as data
+import trading.indicators as ind
+import trading.strategy as strategy
+import trading.performance as per
+import trading.profiling as profiling
+
+
+def call_time(function, *args, number = 200000):
+    '''
+    Returns the average time (in seconds) of one call of function(*args), over number calls.
+    '''
+    start = time.perf_counter()
+    for _ in range(number):
+        function(*args)
+    return (time.perf_counter() - start) / number
+
+
+def nothing(values):
+    '''
+    Does nothing, so that timing it only times the call.
+    '''
+    return values
+
+
+def hook_overhead(repeat = 7):
+    '''
+    Time added to each call of an instrumented function by its hook when no profile is running,
+    measured on a function that does nothing. The calls with and without the hook are timed in turns
+    and the best time of each is kept.
+    '''
+    hooked_nothing = profiling.timed(nothing)
+    hooked, plain = [], []
+    for _ in range(repeat):
+        hooked.append(call_time(hooked_nothing, None))
+        plain.append(call_time(nothing, None))
+    return max(min(hooked) - min(plain), 0)
+
+
+def run_pipeline(n_stocks, days, folder):
+    '''
+    Generates prices, runs the three strategies with ledgers and reads one of the ledgers back.
+    '''
+    ind.indicator_cache.clear()
+    prices = data.generate_stock_price(days, np.linspace(20, 400, n_stocks), np.linspace(0.5, 5, n_stocks), seed = 0)
+    ledger = os.path.join(folder, 'ledger.txt')
+    strategy.random(prices, ledger = os.path.join(folder, 'random_ledger.txt'), seed = 0)
+    strategy.crossing_averages(prices, n = 50, m = 10, ledger = os.path.join(folder, 'crossing_average_ledger.txt'))
+    strategy.momentum(prices, osc_type = 'RSI', ledger = ledger)
+    per.ledger_summary(ledger)
+    ind.indicator_cache.clear()
+
+
+def run(budget = 1e-6, n_stocks = 1000, days = 1825, output = None):
+    '''
+    Measures the hook overhead, times the pipeline with and without a profile running, and prints the report.
+
+    Output:
+        ok (bool): True if the hook overhead is within budget (in seconds per call)
+    '''
+    overhead = hook_overhead()
+    print(f'hook overhead without a profile: {overhead * 1e9:.0f}ns per call (budget {budget * 1e9:.0f}ns)')
+
+    with tempfile.TemporaryDirectory() as folder:
+        # the first run warms up numpy and the file system
+        run_pipeline(n_stocks, days, folder)
+        start = time.perf_counter()
+        run_pipeline(n_stocks, days, folder)
+        seconds = time.perf_counter() - start
+
+        with profiling.profile(trace_memory = False) as report:
+            run_pipeline(n_stocks, days, folder)
+        with profiling.profile() as memory_report:
+            run_pipeline(n_stocks, days, folder)
+
+    print(f'pipeline {n_stocks}x{days}: {seconds:.3f}s without a profile, {report.wall_time:.3f}s profiled, '
+          f'{memory_report.wall_time:.3f}s profiled with tracemalloc')
+    report.peak_memory = memory_report.peak_memory
+    print(report)
+    if output:
+        report.to_json(output)
+
+    return overhead <= budget
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Measures the cost of the profiling hooks and prints a profile of the pipeline.')
+    parser.add_argument('--budget', type = float, default = 1e-6, help = 'maximum overhead of a hook in seconds per call')
+    parser.add_argument('--stocks', type = int, default = 1000, help = 'number of stocks')
+    parser.add_argument('--days', type = int, default = 1825, help = 'number of days')
+    parser.add_argument('--output', help = 'JSON file where to save the profile')
+    arguments = parser.parse_args()
+
+    if not run(arguments.budget, arguments.stocks, arguments.days, arguments.output):
+        sys.exit(1)
@@ -0,0 +1,160 @@
+# Benchmark suite timing the data, indicator, strategy and performance functions on a grid of sizes.
+#
+# Run the whole suite and save the results:
+#     python benchmarks/bench_suite.py --output baseline.json
+# Run it again later and flag anything slower than the saved results:
+#     python benchmarks/bench_suite.py --output new.json --compare baseline.json
+import sys
+import os
+import json
+import argparse
+import platform
+import tempfile
+import numpy as np
+
+# makes the trading package importable
+from common import time_call
+import trading.data as data
+import trading.indicators as ind
+import trading.strategy as strategy
+import trading.performance as per
+
+
+def run_size(n_stocks, days, folder, repeat = 3):
+    '''
+    Times every benchmarked function on n_stocks stocks over days days, with fixed seeds.
+
+    Input:
+        n_stocks (int): number of stocks
+        days (int): number of days
+        folder (str): directory for the price file and the ledgers
+        repeat (int, default 3): each function is timed repeat times and the best time is kept
+
+    Output:
+        timings (dict): best time in seconds of each benchmark, by name
+    '''
+    timings = {}
+
+    # the same simulated stocks every time
+    initial_prices = np.linspace(20, 400, n_stocks)
+    volatility = np.linspace(0.5, 5, n_stocks)
+    timings['generate_stock_price'] = time_call(data.generate_stock_price, days, initial_prices, volatility, seed = 0, repeat = repeat)
+    prices = data.generate_stock_price(days, initial_prices, volatility, seed = 0)
+
+    # write the prices to a file, then read it back by parsing the text and from its snapshot
+    price_file = os.path.join(folder, f'prices_{n_stocks}_{days}.txt')
+    np.savetxt(price_file, np.nan_to_num(prices, nan = 0))
+    timings['get_data read'] = time_call(data.get_data, 'read', price_file, snapshot = False, repeat = repeat)
+    data.get_data('read', price_file)
+    timings['get_data snapshot'] = time_call(data.get_data, 'read', price_file, repeat = repeat)
+
+    # indicators, computed directly (without the indicator cache)
+    weights = np.linspace(1, 2, 50) / np.linspace(1, 2, 50).sum()
+    timings['moving_average'] = time_call(ind.moving_average, prices, 50, repeat = repeat)
+    timings['moving_average weighted'] = time_call(ind.moving_average, prices, 50, weights, repeat = repeat)
+    timings['oscillator stochastic'] = time_call(ind.oscillator, prices, 14, 'stochastic', repeat = repeat)
+    timings['oscillator RSI'] = time_call(ind.oscillator, prices, 14, 'RSI', repeat = repeat)
+
+    # strategies, each writing its ledger, with an empty indicator cache so that every run computes its indicators
+    random_ledger = os.path.join(folder, 'random_ledger.txt')
+    crossing_ledger = os.path.join(folder, 'crossing_average_ledger.txt')
+    momentum_ledger = os.path.join(folder, 'momentum_ledger.txt')
+    clear = ind.indicator_cache.clear
+    timings['random'] = time_call(strategy.random, prices, ledger = random_ledger, seed = 0, repeat = repeat)
+    timings['crossing_averages'] = time_call(strategy.crossing_averages, prices, n = 50, m = 10, ledger = crossing_ledger, repeat = repeat, setup = clear)
+    timings['momentum stochastic'] = time_call(strategy.momentum, prices, ledger = momentum_ledger, repeat = repeat, setup = clear)
+    timings['momentum RSI'] = time_call(strategy.momentum, prices, osc_type = 'RSI', ledger = momentum_ledger, repeat = repeat, setup = clear)
+    ind.indicator_cache.clear()
+
+    # reading the ledger of the random strategy, which trades the most
+    timings['read_ledger'] = time_call(per.read_ledger, random_ledger, profit_plot = False, repeat = repeat)
+
+    return timings
+
+
+def run(stocks = (10, 100, 1000), days = (365, 1825), repeat = 3, progress = True):
+    '''
+    Runs the benchmarks on every combination of number of stocks and number of days.
+
+    Input:
+        stocks (tuple): numbers of stocks
+        days (tuple): numbers of days
+        repeat (int, default 3): each function is timed repeat times and the best time is kept
+        progress (bool, default True): print the timings as they are measured
+
+    Output:
+        results (dict): the machine it ran on ('environment') and the best time in seconds
+            of each benchmark, with keys like 'momentum RSI [1000x1825]' ('results')
+    '''
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for number_of_days in days:
+            for n_stocks in stocks:
+                size = f'{n_stocks}x{number_of_days}'
+                for name, seconds in run_size(n_stocks, number_of_days, folder, repeat).items():
+                    results[f'{name} [{size}]'] = seconds
+                    if progress:
+                        print(f'{name + " [" + size + "]":<40} {seconds:.4f}s')
+
+    environment = {'python': platform.python_version(), 'numpy': np.__version__,
+                   'platform': platform.platform(), 'processor': platform.processor(), 'repeat': repeat}
+    return {'environment': environment, 'results': results}
+
+
+def compare(results, baseline, tolerance = 0.25, minimum_time = 0.001):
+    '''
+    Compares benchmark results with a saved baseline.
+
+    Input:
+        results (dict): output of run()
+        baseline (dict): output of run() saved earlier
+        tolerance (float, default 0.25): a benchmark is a regression if it is this much slower (0.25 = 25%)
+        minimum_time (float, default 0.001): benchmarks faster than this (in seconds) in both runs
+            are too noisy to be compared
+
+    Output:
+        regressions (list): names of the benchmarks that got slower
+    '''
+    regressions = []
+    for name, seconds in results['results'].items():
+        if name not in baseline['results']:
+            continue
+        baseline_seconds = baseline['results'][name]
+        ratio = seconds / baseline_seconds if baseline_seconds > 0 else np.inf
+
+        if ratio > 1 + tolerance and max(seconds, baseline_seconds) >= minimum_time:
+            regressions.append(name)
+            flag = 'SLOWER'
+        elif ratio < 1 / (1 + tolerance) and max(seconds, baseline_seconds) >= minimum_time:
+            flag = 'faster'
+        else:
+            flag = ''
+        print(f'{name:<40} {baseline_seconds:.4f}s -> {seconds:.4f}s ({ratio:.2f}x) {flag}')
+
+    if baseline.get('environment') != results['environment']:
+        print('Note: the baseline was measured on a different machine or with different settings.')
+    print(f'{len(regressions)} regression(s) over {tolerance:.0%}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Times the trading package on a grid of sizes.')
+    parser.add_argument('--stocks', type = int, nargs = '+', default = [10, 100, 1000], help = 'numbers of stocks')
+    parser.add_argument('--days', type = int, nargs = '+', default = [365, 1825], help = 'numbers of days')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'timings of each function, the best one is kept')
+    parser.add_argument('--output', help = 'JSON file where to save the results')
+    parser.add_argument('--compare', help = 'JSON file of saved results to compare with, exits with status 1 on regressions')
+    parser.add_argument('--tolerance', type = float, default = 0.25, help = 'slowdown counted as a regression (0.25 = 25%%)')
+    arguments = parser.parse_args()
+
+    results = run(arguments.stocks, arguments.days, arguments.repeat)
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent = 2)
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, arguments.tolerance):
+            sys.exit(1)
@@ -0,0 +1,117 @@
+# Regression check of the seeded random functions: a fresh run with the same seeds must give, bit for bit,
+# the outputs recorded in seeded_outputs.json (SHA-256 hashes of their dtype, shape and bytes).
+#
+# Check the outputs (exits with status 1 on a mismatch):
+#     python benchmarks/check_seeds.py
+# Record them again, only after a change that is meant to change the random draws:
+#     python benchmarks/check_seeds.py --update
+import sys
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+
+# makes the trading package importable
+import common
+import trading.data as data
+import trading.strategy as strategy
+
+
+# hashes of the seeded outputs, committed with the code
+REFERENCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seeded_outputs.json')
+
+
+def seeded_outputs(seed = 1234):
+    '''
+    Runs news(), news_events(), generate_stock_price(), generate_scenarios() and strategy.random() with fixed seeds.
+
+    Output:
+        outputs (dict): the arrays they give, by name
+    '''
+    data.price_dtype = np.float64
+    outputs = {}
+
+    # news of one day and all the news events of a simulation
+    volatility = np.linspace(0.5, 5, 20)
+    outputs['news'] = data.news(1.0, volatility, seed = seed)
+    event_days, event_sizes, event_durations = data.news_events(3650, 0.01, seed = seed)
+    outputs['news_events_days'] = event_days
+    outputs['news_events_sizes'] = event_sizes
+    outputs['news_events_durations'] = event_durations
+
+    # prices, and the prices of independent workers from spawned seeds
+    initial_prices = np.linspace(20, 400, 20)
+    outputs['generate_stock_price'] = data.generate_stock_price(365, initial_prices, volatility, seed = seed)
+    for worker, worker_seed in enumerate(data.spawn_seeds(seed, 3)):
+        outputs[f'generate_stock_price_worker_{worker}'] = data.generate_stock_price(365, initial_prices, volatility, seed = worker_seed)
+
+    # scenarios in one chunk and in many, which must be the same
+    outputs['generate_scenarios'] = data.generate_scenarios(16, 365, [200] * 5, [2] * 5, drift = 0.1, memory_budget = None, seed = seed)
+    outputs['generate_scenarios_chunked'] = data.generate_scenarios(16, 365, [200] * 5, [2] * 5, drift = 0.1, memory_budget = 2**16, seed = seed)
+
+    # random strategy on the seeded prices
+    positions, cash = strategy.random(outputs['generate_stock_price'], ledger = None, seed = seed)
+    outputs['random_positions'] = positions
+    outputs['random_cash'] = cash
+
+    return outputs
+
+
+def output_hash(values):
+    '''
+    SHA-256 hash of the dtype, shape and bytes (little-endian) of an array.
+    '''
+    values = np.ascontiguousarray(values)
+    values = values.astype(values.dtype.newbyteorder('<'), copy = False)
+    digest = hashlib.sha256(f'{values.dtype.str} {values.shape}'.encode())
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def mismatches(hashes, reference):
+    '''
+    Names of the outputs whose hash differs from the reference, or that are missing from either.
+    '''
+    return [name for name in sorted(set(hashes) | set(reference)) if hashes.get(name) != reference.get(name)]
+
+
+def run(update = False, reference_file = REFERENCE_FILE):
+    '''
+    Runs the seeded functions and compares the hashes of their outputs with reference_file,
+    or writes them to it if update is True.
+
+    Output:
+        ok (bool): True if no output differs
+    '''
+    outputs = seeded_outputs()
+    hashes = {name: output_hash(values) for name, values in outputs.items()}
+    different = []
+
+    # the chunks of the scenarios must not change the draws
+    if hashes['generate_scenarios'] != hashes['generate_scenarios_chunked']:
+        different.append('generate_scenarios_chunked (against generate_scenarios)')
+
+    if update:
+        with open(reference_file, 'w') as file:
+            json.dump(hashes, file, indent = 2, sort_keys = True)
+            file.write('\n')
+        print(f'recorded {len(hashes)} outputs in {reference_file}')
+    else:
+        with open(reference_file) as file:
+            different += mismatches(hashes, json.load(file))
+        print(f'compared {len(hashes)} outputs with {reference_file}')
+
+    for name in different:
+        print(f'MISMATCH {name}')
+    return not different
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Checks that seeded simulations give the recorded outputs bit for bit.')
+    parser.add_argument('--update', action = 'store_true', help = 'record the outputs of this run as the reference')
+    parser.add_argument('--reference', default = REFERENCE_FILE, help = 'JSON file of the recorded output hashes')
+    arguments = parser.parse_args()
+
+    if not run(arguments.update, arguments.reference):
+        sys.exit(1)
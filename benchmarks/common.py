@@ -0,0 +1,28 @@
+# Helpers shared by the benchmark scripts. Importing this module makes the trading package importable
+# when a script is run from the benchmarks folder (e.g. python benchmarks/bench_suite.py).
+import sys
+import os
+import time
+
+# folder containing the trading package
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def time_call(function, *args, repeat = 1, setup = None, **kwargs):
+    '''
+    Returns the best wall time (in seconds) of repeat calls of function(*args, **kwargs).
+    setup() (if given) is called before each call, outside of the timing.
+
+    Example:
+        >>> time_call(ind.moving_average, prices, 50, repeat = 3)
+    '''
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+    return min(times)
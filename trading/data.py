@@ -1,14 +1,68 @@
 # import numpy
+import io
+import os
+import json
+import itertools
+import hashlib
+import tempfile
 import numpy as np
+import trading.profiling as profiling
+
+# dtype of the prices given by generate_stock_price(), generate_scenarios() and get_data() (through read_price_file()).
+# The indicators and the strategies work in the dtype of the prices they are given (flags are booleans and
+# numbers of shares integers in any case), so setting it to np.float32 about halves the memory used:
+#     >>> data.price_dtype = np.float32
+# Tolerances against float64 (checked by benchmarks/bench_dtype.py):
+#     prices are simulated (or parsed) then rounded once to float32, a relative error below 6e-8,
+#     moving averages are added up in float64, a relative error below 5e-6,
+#     oscillators are within 1e-5, except the RSI of the few windows where a price change rounds to 0,
+#     trades differ only where two values (e.g. moving averages crossing) or a value and a threshold are this
+#     close: at most 0.1% of the trades, and the total profit/loss changes by less than 1e-6 of the cash traded.
+price_dtype = np.float64
+
+# independent random streams for parallel simulations
+def spawn_seeds(seed, n):
+    '''
+    Splits a seed into n independent seeds, using NumPy's SeedSequence.spawn, so that
+    simulations run in parallel (e.g. in a process pool) get streams that do not overlap
+    and are the same on every run.
+    
+    Input:
+        seed (None/int/SeedSequence/Generator): seed to split, a fresh unpredictable one is used if None
+        n (int): number of seeds to create
+        
+    Output:
+        seeds (list): n SeedSequence objects, each one can be passed as the seed of
+            generate_stock_price(), get_data() or strategy.random()
+        
+    Example:
+        Generate 8 independent reproducible simulations in a process pool.
+        >>> seeds = spawn_seeds(2020, 8)
+        >>> with ProcessPoolExecutor() as pool:
+        ...     results = list(pool.map(generate_stock_price, [1825] * 8, [[200] * 7] * 8, [[1] * 7] * 8, [0.01] * 8, seeds))
+    '''
+    
+    # spawn from the seed sequence behind a generator
+    if isinstance(seed, np.random.Generator):
+        seed = seed.bit_generator.seed_seq
+    
+    # otherwise build the seed sequence from the seed
+    elif not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    
+    return seed.spawn(n)
+
 
 # define the news function first
-def news(probability, volatility):
+def news(probability, volatility, seed = None):
     '''
     Creates array of drift values arising from a random news events that affects stock prices over a number of days.
     
     Input:
         probability (float): the probability of a news event happening, and
         volatility (list/ndarray): volatilities of underlying stock prices
+        seed (None/int/SeedSequence/Generator, default None): seed of the random number generator,
+            a fresh unpredictable one is used if None
         
     Output: 
         drift_matrix (ndarray): values of news event shocks to be added to the stock prices
@@ -21,8 +75,8 @@ def news(probability, volatility):
     
     
     
-    # set default random number generator
-    rng = np.random.default_rng()
+    # set random number generator from the seed
+    rng = np.random.default_rng(seed)
     
     # determine if news event occurs
     chance_of_news = rng.choice([1, 0], p = [probability, 1 - probability])
@@ -54,87 +108,699 @@ def news(probability, volatility):
     # return the cumulative drift matrix
     return drift_matrix
 
+# draw every news event of a simulation in one go
+def news_events(days, probability, seed = None):
+    '''
+    Draws all the news events of a simulation at once, instead of calling news() on every day.
+    
+    Input:
+        days (int): number of days in the simulation
+        probability (float): the probability of a news event happening on each day
+        seed (None/int/SeedSequence/Generator, default None): seed of the random number generator,
+            a fresh unpredictable one is used if None
+        
+    Output:
+        event_days (ndarray): days (from day 1) on which a news event happens
+        event_sizes (ndarray): N(0, 2^2) size m of each news event, scaled by the volatility of each stock later
+        event_durations (ndarray): number of days (between 3 and 14) each news event lasts
+        
+    Example:
+        Get the news events of a one year simulation where news happens with probability 0.01 each day.
+        >>> event_days, event_sizes, event_durations = news_events(365, 0.01)
+    '''
+    
+    # set random number generator from the seed
+    rng = np.random.default_rng(seed)
+    
+    # one Bernoulli draw per day for whether news happens, there is no news on day 0
+    chance_of_news = rng.random(days - 1) < probability
+    event_days = np.flatnonzero(chance_of_news) + 1
+    
+    # draw the size and the duration of every event at once
+    event_sizes = rng.normal(0, 2, size = len(event_days))
+    event_durations = rng.integers(3, 15, size = len(event_days))
+    
+    return event_days, event_sizes, event_durations
+
+
+def news_size_per_day(days, event_days, event_sizes, event_durations):
+    '''
+    Gets the total size m of the news in effect on each day, before scaling by volatility.
+    
+    Input:
+        days (int): number of days in the simulation
+        event_days, event_sizes, event_durations (ndarray): news events, as returned by news_events()
+        
+    Output:
+        size_per_day (ndarray): sum of the sizes of the news events in effect on each day
+        
+    Example:
+        One event of size 1.5 starting on day 2 and lasting 3 days.
+        Returns [0, 0, 1.5, 1.5, 1.5, 0].
+        >>> news_size_per_day(6, np.array([2]), np.array([1.5]), np.array([3]))
+    '''
+    
+    # difference array over days: +m where an event starts and -m the day after it ends,
+    # events running past the last day are truncated by the extra entry
+    difference = np.zeros(days + 1)
+    np.add.at(difference, event_days, event_sizes)
+    np.add.at(difference, np.minimum(event_days + event_durations, days), - event_sizes)
+    
+    # cumulative sum gives the news in effect on each day
+    return np.cumsum(difference[:days])
+
+
 # simulate data function
-def generate_stock_price(days, initial_prices, volatility, news_probability = 0.01):
+@profiling.timed
+def generate_stock_price(days, initial_prices, volatility, news_probability = 0.01, seed = None):
     '''
     Generates daily closing share prices for a given list of stock.
     
+    The simulation is vectorized: the random walk increments and the news drift are summed with
+    a cumulative sum over days, and a stock goes bust from the first day its price is 0 or below.
+    
     Input:        
         days (int): number of days in the simulation
         initial_prices (list/ndarray): inital stock prices
         volatility (list/ndarray): volatilities of the given stock
         news_probability(float, default 0.01): probability of news event happening on each day 
+        seed (None/int/SeedSequence/Generator, default None): seed of the random number generator,
+            a fresh unpredictable one is used if None
         
     Output:
-        share_price_matrix (ndarray): simulated stock price data
+        share_price_matrix (ndarray): simulated stock price data, with dtype price_dtype
         
     Example:
         Generate data for a stock with initial price 300 and volatility 3 over a one year period.
-        Returns an array with one column.
-        >>> generate_stock_price(365, 300, 3)
+        Returns an array with one column, the same array every time since the seed is fixed.
+        >>> generate_stock_price(365, 300, 3, seed = 42)
     '''
     
     # change intial_price and volatility to numpy array
-    initial_prices = np.array(initial_prices)
+    initial_prices = np.atleast_1d(np.array(initial_prices, dtype = float))
     volatility = np.array(volatility)
     
     # determine number of stock
-    n = len(np.atleast_1d(initial_prices))
+    n = len(initial_prices)
+    
+    # set random number generator from the seed
+    rng = np.random.default_rng(seed)
+    
+    # get random walk increments for share prices
+    increment_matrix = rng.normal(0, volatility, size = (days - 1, n))
     
-    # initialize matrix of zeros for share prices
-    share_price_matrix = np.zeros((days, n))
+    # draw the news events for the whole simulation from the same generator
+    event_days, event_sizes, event_durations = news_events(days, news_probability, rng)
     
-    # set first row to be initial prices
+    # simulate in float64, then round once to the price dtype
+    share_price_matrix = simulate_prices(initial_prices, volatility, increment_matrix, event_days, event_sizes, event_durations)
+    return share_price_matrix.astype(price_dtype, copy = False)
+
+
+def close_bust_stocks(share_prices, axis = 0):
+    '''
+    Closes the stocks that go bust: from the first day the price of a stock is 0 or below (or NaN),
+    all its prices are set to NaN. Done in place for all stocks at once.
+    
+    Input:
+        share_prices (ndarray): share prices, e.g. one row per day and one column per stock
+        axis (int, default 0): the axis of the days (e.g. 1 for scenarios of shape (S, days, N))
+        
+    Output:
+        share_prices (ndarray): the same array, with the prices of bust stocks set to NaN
+        
+    Example:
+        Stock 1 goes bust on day 1.
+        >>> close_bust_stocks(np.array([[100., 10.], [101., -2.], [99., 3.]]))
+        array([[100.,  10.],
+               [101.,  nan],
+               [ 99.,  nan]])
+    '''
+    # put the days first (a view, so that changes go to share_prices)
+    prices = np.moveaxis(share_prices, axis, 0)
+    days = prices.shape[0]
+    
+    # a price is bust if it is not above 0, this includes NaN
+    bust_matrix = prices > 0
+    np.logical_not(bust_matrix, out = bust_matrix)
+    
+    # a stock is closed from its first bust day on, in the same mask so that only one boolean array is used
+    np.logical_or.accumulate(bust_matrix, axis = 0, out = bust_matrix)
+    
+    # set the remaining values to nan
+    prices[bust_matrix] = np.nan
+    
+    return share_prices
+
+
+def simulate_prices(initial_prices, volatility, increment_matrix, event_days, event_sizes, event_durations):
+    '''
+    Turns random walk increments and news events into share prices. This is the deterministic
+    part of generate_stock_price(), so the same random draws always give the same prices.
+    
+    Input:
+        initial_prices (list/ndarray): inital stock prices
+        volatility (list/ndarray): volatilities of the given stock
+        increment_matrix (ndarray): random walk increments, shape (days - 1, N)
+        event_days, event_sizes, event_durations (ndarray): news events, as returned by news_events()
+        
+    Output:
+        share_price_matrix (ndarray): simulated stock price data, shape (days, N)
+        
+    Example:
+        Prices of 2 stocks over 10 days with unit increments and no news.
+        >>> simulate_prices([100, 200], [1, 1], np.ones((9, 2)), [], [], [])
+    '''
+    
+    # change intial_price to numpy array
+    initial_prices = np.atleast_1d(np.array(initial_prices, dtype = float))
+    
+    # get number of days and number of stock
+    days = increment_matrix.shape[0] + 1
+    n = len(initial_prices)
+    
+    # total increment on each day is the random walk step plus the news in effect on that day
+    share_price_matrix = np.empty((days, n))
     share_price_matrix[0] = initial_prices
+    share_price_matrix[1:] = increment_matrix
+    
+    # only the days with news in effect need the drift added
+    size_per_day = news_size_per_day(days, np.asarray(event_days, dtype = int), np.asarray(event_sizes, dtype = float),
+                                     np.asarray(event_durations, dtype = int))
+    news_days = np.flatnonzero(size_per_day)
+    share_price_matrix[news_days] += np.outer(size_per_day[news_days], volatility)
+    
+    # add up the increments starting on day 1 (not day 0)
+    np.cumsum(share_price_matrix, axis = 0, out = share_price_matrix)
     
-    # check if any of the initial prices are 0 and set to nan if true
-    if np.any(initial_prices == 0) or np.any(initial_prices == np.nan) == True:
+    # if any share price reaches 0 or below then it is closed (from day 0, so stocks with an initial price
+    # of 0 are closed from the start)
+    close_bust_stocks(share_price_matrix)
+    
+    # return as a matrix of prices
+    return share_price_matrix
+
+
+def scenario_chunk_size(days, n, memory_budget):
+    '''
+    Gets how many scenarios of a (scenarios, days, N) simulation fit in a memory budget.
+    Raises a ValueError if not even one scenario fits.
+    
+    Input:
+        days (int): number of days in the simulation
+        n (int): number of stocks in each scenario
+        memory_budget (int or None): maximum number of bytes to use at once, no limit if None
+        
+    Output:
+        chunk_size (int): number of scenarios to simulate at once (at least 1)
         
-        # find which share prices are already 0 or NaN
-            idx_where_initial_zero = np.where(initial_prices == 0)
-            share_price_matrix[:, idx_where_initial_zero] = np.nan
+    Example:
+        Number of scenarios of 7 stocks over 5 years that fit in 100MB.
+        >>> scenario_chunk_size(5 * 365, 7, 100 * 2**20)
+    '''
     
-    # set default random number generator
-    rng = np.random.default_rng()
+    if memory_budget is None:
+        return np.iinfo(np.int64).max
     
-    # get random walk increments for share prices
-    increment_matrix = rng.normal(0, volatility, size = (days - 1, n))
+    # each scenario needs its float64 prices and a boolean bust mask (see close_bust_stocks()), and its news
+    # in effect on each day twice (float64), while the caller usually still holds the float64 prices of the
+    # previous chunk (e.g. in a for loop over iterate_scenarios())
+    bytes_per_scenario = days * (n * (8 + 1 + 8) + 2 * 8)
+    
+    # the float64 increments of one scenario are drawn at a time
+    chunk_size = int((memory_budget - days * n * 8) // bytes_per_scenario)
+    if chunk_size < 1:
+        raise ValueError(f'one scenario of {days} days and {n} stocks needs about {(days * n * 8 + bytes_per_scenario) / 2**20:.1f}MB, '
+                         f'more than the memory budget of {memory_budget / 2**20:.1f}MB')
+    
+    return chunk_size
+
+
+def iterate_scenarios(scenarios, days, initial_prices, volatility, drift = 0, news_probability = 0.01, memory_budget = 2**28, seed = None):
+    '''
+    Simulates many scenarios of the same stocks in chunks, yielding each chunk as soon as it is ready,
+    so that no more than memory_budget bytes are used at once.
+    
+    Each scenario has its own random walk and its own news events. The drift is added to the
+    price increments every day, like the positive and negative drift cases of the notebook.
+    Every scenario draws from its own stream spawned from the seed, so a given seed gives the
+    same prices whatever the memory budget.
+    
+    Input:
+        scenarios (int): number of scenarios to simulate
+        days (int): number of days in each scenario
+        initial_prices (list/ndarray): initial prices of the N stocks, shape (N,) or (scenarios, N)
+        volatility (list/ndarray): volatilities of the N stocks, shape (N,) or (scenarios, N)
+        drift (float/list/ndarray, default 0): daily drift of the prices, a scalar, shape (N,) or (scenarios, N)
+        news_probability (float, default 0.01): probability of news event happening on each day
+        memory_budget (int, default 2**28): maximum number of bytes to use at once, no limit if None
+            (raises a ValueError if one scenario does not fit, see scenario_chunk_size())
+        seed (None/int/SeedSequence/Generator, default None): seed of the random number generator,
+            a fresh unpredictable one is used if None
+        
+    Output:
+        Yields (start, chunk) pairs, where chunk (ndarray) holds the prices of scenarios
+            start to start + len(chunk), with shape (len(chunk), days, N).
+    
+    Example:
+        Stream 10000 scenarios of 7 stocks with a positive drift, 64MB at a time.
+        >>> for start, chunk in iterate_scenarios(10000, 5 * 365, [200] * 7, [1] * 7, drift = 0.1, memory_budget = 2**26):
+        ...     print(start, chunk.shape)
+    '''
+    
+    # per-stock values shared by all scenarios are broadcast to one row per scenario
+    initial_prices = np.atleast_1d(np.array(initial_prices, dtype = float))
+    n = initial_prices.shape[-1]
+    initial_prices = np.broadcast_to(initial_prices, (scenarios, n))
+    volatility = np.broadcast_to(np.array(volatility, dtype = float), (scenarios, n))
+    drift = np.broadcast_to(np.array(drift, dtype = float), (scenarios, n))
+    
+    # one independent random stream per scenario
+    scenario_seeds = spawn_seeds(seed, scenarios)
+    
+    # simulate as many scenarios as fit in the memory budget at once
+    chunk_size = scenario_chunk_size(days, n, memory_budget)
+    for start in range(0, scenarios, chunk_size):
+        stop = min(start + chunk_size, scenarios)
+        yield start, simulate_scenarios(days, initial_prices[start:stop], volatility[start:stop], drift[start:stop],
+                                        news_probability, scenario_seeds[start:stop])
+
+
+@profiling.timed
+def generate_scenarios(scenarios, days, initial_prices, volatility, drift = 0, news_probability = 0.01, memory_budget = 2**28, out = None, seed = None):
+    '''
+    Simulates many scenarios of the same stocks at once, for stress testing a strategy.
+    The scenarios are simulated in chunks of at most memory_budget bytes using iterate_scenarios().
+    
+    Input:
+        scenarios (int): number of scenarios to simulate
+        days (int): number of days in each scenario
+        initial_prices (list/ndarray): initial prices of the N stocks, shape (N,) or (scenarios, N)
+        volatility (list/ndarray): volatilities of the N stocks, shape (N,) or (scenarios, N)
+        drift (float/list/ndarray, default 0): daily drift of the prices, a scalar, shape (N,) or (scenarios, N)
+        news_probability (float, default 0.01): probability of news event happening on each day
+        memory_budget (int, default 2**28): maximum number of bytes used to simulate at once, no limit if None
+            (raises a ValueError if one scenario does not fit, see scenario_chunk_size())
+        out (ndarray, default None): array of shape (scenarios, days, N) to write the chunks into,
+            e.g. a np.memmap for scenarios that do not fit in memory. A new array (with dtype price_dtype)
+            is created if None.
+        seed (None/int/SeedSequence/Generator, default None): seed of the random number generator,
+            a fresh unpredictable one is used if None
+        
+    Output:
+        scenario_prices (ndarray): simulated prices, shape (scenarios, days, N)
+        
+    Example:
+        500 scenarios of 7 stocks, the first 250 with high and the last 250 with low volatility.
+        >>> vol = np.vstack([np.full((250, 7), 4.5), np.full((250, 7), 0.8)])
+        >>> generate_scenarios(500, 5 * 365, [200] * 7, vol)
+    '''
+    
+    # get number of stocks and initialize the output
+    n = np.atleast_1d(np.array(initial_prices)).shape[-1]
+    if out is None:
+        out = np.empty((scenarios, days, n), dtype = price_dtype)
+    
+    # write each chunk in place as it is simulated, and let it go before the next one
+    for start, chunk in iterate_scenarios(scenarios, days, initial_prices, volatility, drift, news_probability, memory_budget, seed):
+        out[start : (start + len(chunk))] = chunk
+        del chunk
+    
+    return out
+
+
+def simulate_scenarios(days, initial_prices, volatility, drift, news_probability, seeds):
+    '''
+    Simulates one chunk of scenarios at once, with the same model as generate_stock_price().
     
-    # loop over each day
-    for day in range(1, days):
+    Input:
+        days (int): number of days in each scenario
+        initial_prices, volatility, drift (ndarray): values for each scenario and stock, shape (S, N)
+        news_probability (float): probability of news event happening on each day
+        seeds (list): one seed (see spawn_seeds()) for each of the S scenarios
         
-        # add the increments starting on day 1 (not day 0)
-        share_price_matrix[day] += share_price_matrix[day - 1] + increment_matrix[day - 1]
+    Output:
+        share_price_matrix (ndarray): simulated stock price data, shape (S, days, N)
         
-        # get the effect of news for each day and get it's duration
-        news_drift = news(news_probability, volatility)
-        duration = news_drift.shape[0]
+    Example:
+        >>> simulate_scenarios(365, np.full((4, 2), 100.), np.ones((4, 2)), np.zeros((4, 2)), 0.01, spawn_seeds(1, 4))
+    '''
+    
+    # get number of scenarios and number of stock
+    S, n = initial_prices.shape
+    
+    # initialize prices and set first day to be initial prices
+    share_price_matrix = np.empty((S, days, n))
+    share_price_matrix[:, 0] = initial_prices
+    
+    # news events of every scenario
+    scenario_of_event, event_days, event_sizes, event_durations = [], [], [], []
+    
+    # each scenario draws from its own stream
+    for scenario, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
         
-        # add the effect of this news to the price of the duration of the news effect
-        # if day + duration exceeds the amount of days we truncate the duration
-        if day + duration > days - 1:
-            # add news drift to the remaining prices
-            share_price_matrix[day:] += news_drift[0]
+        # random walk increments with drift, starting on day 1
+        share_price_matrix[scenario, 1:] = rng.normal(drift[scenario], volatility[scenario], size = (days - 1, n))
         
-        # otherwise do as normal
-        else:
-            share_price_matrix[day : (day + duration)] += news_drift[0]
-                
-        # if any share price reaches 0 or below then it is closed
-        # check if any entries are less than or equal to 0
-        if np.any(share_price_matrix[day] <= 0):
-            
-            # find which share prices have hit 0 or are NaN
-            index_where_zero = np.where((share_price_matrix[day] <= 0))
-            
-            # set the remaining values of those columns to nan
-            share_price_matrix[day:, index_where_zero] = np.nan
+        # news events, drawn exactly like in generate_stock_price()
+        days_with_news, sizes, durations = news_events(days, news_probability, rng)
+        scenario_of_event.append(np.full(len(days_with_news), scenario))
+        event_days.append(days_with_news)
+        event_sizes.append(sizes)
+        event_durations.append(durations)
+    
+    scenario_of_event = np.concatenate(scenario_of_event)
+    event_days = np.concatenate(event_days)
+    event_sizes = np.concatenate(event_sizes)
+    event_durations = np.concatenate(event_durations)
+    
+    # difference array of the news in effect on each day of each scenario
+    difference = np.zeros((S, days + 1))
+    np.add.at(difference, (scenario_of_event, event_days), event_sizes)
+    np.add.at(difference, (scenario_of_event, np.minimum(event_days + event_durations, days)), - event_sizes)
+    size_per_day = np.cumsum(difference[:, :days], axis = 1)
+    del difference
+    
+    # add the news drift, scaled by the volatility of each stock, on the days with news in effect only,
+    # one scenario at a time so that no (S, days, N) temporary is needed
+    for scenario in range(S):
+        news_days = np.flatnonzero(size_per_day[scenario])
+        share_price_matrix[scenario, news_days] += np.outer(size_per_day[scenario, news_days], volatility[scenario])
+    del size_per_day
+    
+    # add up the increments starting on day 1 (not day 0)
+    np.cumsum(share_price_matrix, axis = 1, out = share_price_matrix)
+    
+    # close each stock from the first day where it is at 0 or below (from day 0, so stocks with
+    # an initial price of 0 are closed from the start)
+    close_bust_stocks(share_price_matrix, axis = 1)
     
-    # return as a matrix of prices
     return share_price_matrix
 
 
-def get_data(method = 'read', filename = 'stock_data_5y.txt', initial_prices = [], volatility = [], days = 5 * 365):
+def file_hash(filename):
+    '''
+    Hash of the contents of a file, read in blocks of 1MB.
+
+    Input:
+        filename (str): path to the file
+
+    Output:
+        digest (str): hexadecimal blake2b hash
+    '''
+    digest = hashlib.blake2b()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(2**20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def replace_atomically(target, write):
+    '''
+    Writes a file through a temporary file in the same directory, moved in place with os.replace() once
+    it is complete. Other processes never see a half-written file, even if several write it at once
+    (the last one to finish wins). Raises an OSError if the directory can't be written to.
+
+    Input:
+        target (str): path of the file to write
+        write (function): writes the file, called with the path of the temporary file
+
+    Example:
+        >>> replace_atomically('prices.npy', lambda path: np.save(path, prices))
+    '''
+    # the temporary file has the same extension, np.save() would add '.npy' otherwise
+    directory, name = os.path.split(target)
+    handle, temporary = tempfile.mkstemp(dir = directory or '.', prefix = name + '.', suffix = '.tmp' + os.path.splitext(name)[1])
+    os.close(handle)
+    try:
+        write(temporary)
+        os.replace(temporary, target)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+def save_snapshot_info(info_file, info):
+    '''
+    Writes the description of a snapshot (see read_price_file()) atomically, does nothing if it can't be written.
+    '''
+    def write(path):
+        with open(path, 'w') as file:
+            json.dump(info, file)
+
+    try:
+        replace_atomically(info_file, write)
+    except OSError:
+        pass
+
+
+def parse_price_chunks(filename, text_data, header = False, chunk_rows = 10000):
+    '''
+    Parses a price file chunk_rows rows at a time into an array (e.g. a memory-mapped snapshot),
+    setting each stock to NaN from the first day its price is 0 or below (or NaN), as in read_price_file().
+
+    Input:
+        filename (str): path to the price file
+        text_data (ndarray): where to write the data, one row per (non-empty) line of the file
+        header (bool, default False): True if the first row is not prices, it is copied as it is
+        chunk_rows (int, default 10000): number of rows to parse at a time
+    '''
+    # stocks already bust in the previous rows
+    bust = np.zeros(text_data.shape[1], dtype = bool)
+
+    with open(filename) as file:
+        lines = (line for line in file if line.strip())
+        for row in range(0, text_data.shape[0], chunk_rows):
+            chunk = np.loadtxt(io.StringIO(''.join(itertools.islice(lines, chunk_rows))), dtype = text_data.dtype, ndmin = 2)
+
+            # the header is not prices
+            price_chunk = chunk[1:] if header and row == 0 else chunk
+
+            # a stock is bust from the first day its price is not above 0, set the rest to NaN
+            if len(price_chunk) > 0:
+                bust_matrix = np.logical_or.accumulate(~(price_chunk > 0), axis = 0) | bust
+                price_chunk[bust_matrix] = np.nan
+                bust = bust_matrix[-1]
+
+            text_data[row : row + len(chunk)] = chunk
+
+
+@profiling.timed
+def read_price_file(filename, header = False, snapshot = True, chunk_rows = None):
+    '''
+    Reads a text file of share prices (one row per day, one column per stock), where each stock is
+    set to NaN from the first day its price is 0 or below (or NaN).
+
+    Parsing text is slow, so the first read saves the cleaned prices as a binary snapshot next to the file
+    (filename + '.snapshot.npy', with filename + '.snapshot.json' describing the file it was made from).
+    Later reads memory-map the snapshot instead, as long as the file has not changed: its modification time
+    and size are checked first, and its hash if they differ. The prices are copy-on-write, so changing them
+    never changes the snapshot. The snapshot and its description are written to temporary files moved in place
+    (see replace_atomically()), so processes building the same snapshot at once (e.g. sweep workers) never
+    read a half-written one, and a description or snapshot that can't be read is made again.
+
+    For files too large to fit in memory, chunk_rows parses the file a few rows at a time straight into
+    the snapshot, so only the rows being parsed are ever in memory (stocks still go bust from the same day
+    as when reading the whole file), and the memory-mapped prices are only read from disk when used.
+    If the snapshot can't be written (e.g. in a read-only directory), the rows are parsed into memory instead.
+
+    The data has dtype price_dtype. Snapshots in other dtypes than float64 are kept apart
+    (e.g. filename + '.float32.snapshot.npy').
+
+    Input:
+        filename (str): path to the price file
+        header (bool, default False): True if the first row is not prices (e.g. the volatilities
+            in stock_data_5y.txt), it is returned as it is
+        snapshot (bool, default True): use (and create) the binary snapshot, or always parse the text file
+        chunk_rows (int, default None): number of rows to parse at a time, None to parse the whole file at once.
+            Needs the snapshot (raises a ValueError if snapshot is False).
+
+    Output:
+        text_data (ndarray): the data in the file, with the header row first if there is one
+
+    Example:
+        Volatilities and cleaned prices of stock_data_5y.txt.
+        >>> text_data = read_price_file('stock_data_5y.txt', header = True)
+        >>> volatilities, price_data = text_data[0], text_data[1:]
+    '''
+    if chunk_rows is not None and not snapshot:
+        raise ValueError('chunk_rows parses the file into its snapshot, it needs snapshot = True')
+    
+    dtype = np.dtype(price_dtype)
+    name = filename if dtype == np.float64 else f'{filename}.{dtype.name}'
+    snapshot_file = name + '.snapshot.npy'
+    info_file = name + '.snapshot.json'
+    file_info = os.stat(filename)
+
+    # description of the snapshot, a missing or unreadable one means there is no usable snapshot
+    info = None
+    if snapshot and os.path.exists(snapshot_file):
+        try:
+            with open(info_file) as file:
+                info = json.load(file)
+        except (OSError, ValueError):
+            info = None
+
+    # use the snapshot if it was made from the same file
+    if isinstance(info, dict) and info.get('header') == header:
+        # same modification time and size, the file has not changed
+        unchanged = info.get('mtime_ns') == file_info.st_mtime_ns and info.get('size') == file_info.st_size
+
+        # otherwise, it might only have been touched or copied: compare the contents,
+        # and remember the new modification time if the directory can be written to
+        if not unchanged and file_hash(filename) == info.get('hash'):
+            unchanged = True
+            info['mtime_ns'], info['size'] = file_info.st_mtime_ns, file_info.st_size
+            save_snapshot_info(info_file, info)
+
+        # a snapshot that can't be read is made again
+        if unchanged:
+            try:
+                return np.load(snapshot_file, mmap_mode = 'c')
+            except (OSError, ValueError):
+                pass
+
+    # parse a few rows at a time into the snapshot
+    if snapshot and chunk_rows is not None:
+        
+        # count the rows and the columns first
+        with open(filename) as file:
+            number_of_rows = sum(1 for line in file if line.strip())
+        with open(filename) as file:
+            N = len(next(line for line in file if line.strip()).split())
+        
+        shape = (number_of_rows, N)
+        
+        # parse into a temporary snapshot, moved in place once complete
+        def write(path):
+            text_data = np.lib.format.open_memmap(path, mode = 'w+', dtype = dtype, shape = shape)
+            parse_price_chunks(filename, text_data, header, chunk_rows)
+            text_data.flush()
+        
+        # parse into memory if the directory can't be written to
+        try:
+            replace_atomically(snapshot_file, write)
+        except OSError:
+            text_data = np.empty(shape, dtype = dtype)
+            parse_price_chunks(filename, text_data, header, chunk_rows)
+            return text_data
+        
+        # the snapshot is used as it is if its description can't be written
+        save_snapshot_info(info_file, {'mtime_ns': file_info.st_mtime_ns, 'size': file_info.st_size,
+                                       'hash': file_hash(filename), 'header': header})
+        return np.load(snapshot_file, mmap_mode = 'c')
+    
+    # use numpy loadtxt function to read in the txt/csv file and store in a numpy array
+    text_data = np.loadtxt(filename, dtype = dtype)
+    price_data = text_data[1:] if header else text_data
+
+    # set the prices of each stock to NaN from the day it goes bust
+    close_bust_stocks(price_data)
+
+    # save the snapshot (to a temporary file first, so that a half-written snapshot is never used),
+    # reading still works without it if the directory can't be written to
+    if snapshot:
+        try:
+            replace_atomically(snapshot_file, lambda path: np.save(path, text_data))
+        except OSError:
+            pass
+        else:
+            save_snapshot_info(info_file, {'mtime_ns': file_info.st_mtime_ns, 'size': file_info.st_size,
+                                           'hash': file_hash(filename), 'header': header})
+
+    return text_data
+
+
+def select_columns(keys, targets, matching = 'greedy'):
+    '''
+    Chooses a different column for each target value, with a key (e.g. initial price or volatility) close to it.
+
+    'greedy' matching takes the targets in order and gives each one the closest column not chosen yet
+    (the first column if several are as close). The keys are sorted once, and the columns still available
+    on each side are tracked, so each target only needs a binary search: O(N log M) in total.
+    'optimal' matching chooses the columns with the smallest total distance to their targets
+    (needs scipy).
+    Columns with a NaN key are only chosen once all the other columns are.
+
+    Input:
+        keys (ndarray): key of each of the M columns
+        targets (list): the N values to match (N <= M)
+        matching (str, default 'greedy'): either 'greedy' or 'optimal'
+
+    Output:
+        columns (ndarray): index of the column chosen for each target
+
+    Example:
+        >>> select_columns(np.array([150., 370., 100., 210.]), [200, 210])
+        array([3, 0])
+    '''
+    keys = np.asarray(keys, dtype = float)
+    targets = np.atleast_1d(np.asarray(targets, dtype = float))
+
+    # NaN keys are the furthest away from any target
+    keys = np.where(np.isnan(keys), np.inf, keys)
+
+    if matching == 'optimal':
+        # optional dependency, only needed for the optimal matching
+        import scipy.optimize
+
+        # distance from each target to each column, +inf distances are replaced by a large cost
+        distances = np.abs(targets[:, None] - keys[None, :])
+        distances[~np.isfinite(distances)] = np.finfo(float).max / (len(keys) + 1)
+        rows, columns = scipy.optimize.linear_sum_assignment(distances)
+        return columns[np.argsort(rows)]
+
+    # columns sorted by key, and by column number for equal keys
+    order = np.lexsort((np.arange(len(keys)), keys))
+    sorted_keys = keys[order]
+    M = len(keys)
+
+    # first position of each group of equal keys
+    group_start = np.maximum.accumulate(np.where(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]], np.arange(M), 0))
+
+    # chosen columns are linked to their neighbour, so that following the links from a position
+    # gives the nearest available column on the right (M if none) or on the left (-1 if none).
+    # Position p is entry p of on_the_right and entry p + 1 of on_the_left.
+    on_the_right = list(range(M + 1))
+    on_the_left = list(range(M + 1))
+
+    def follow(links, entry):
+        # find the end of the links, then point every entry on the way straight to it
+        end = entry
+        while links[end] != end:
+            end = links[end]
+        while links[entry] != end:
+            links[entry], entry = end, links[entry]
+        return end
+
+    columns = np.zeros(len(targets), dtype = int)
+    for i, target in enumerate(targets):
+        # closest available columns with key >= target and key <= target
+        right = follow(on_the_right, np.searchsorted(sorted_keys, target, side = 'left'))
+        left = follow(on_the_left, np.searchsorted(sorted_keys, target, side = 'right')) - 1
+
+        # on the left, the first available column of the group of equal keys
+        if left >= 0:
+            left = follow(on_the_right, group_start[left])
+
+        # choose the closest, or the first column if both are as close
+        candidates = [position for position in (left, right) if 0 <= position < M]
+        chosen = min((abs(sorted_keys[position] - target), order[position], position) for position in candidates)[2]
+        columns[i] = order[chosen]
+
+        # the chosen column is no longer available
+        on_the_right[chosen] = chosen + 1
+        on_the_left[chosen + 1] = chosen
+
+    return columns
+
+
+@profiling.timed
+def get_data(method = 'read', filename = 'stock_data_5y.txt', initial_prices = [], volatility = [], days = 5 * 365, seed = None, snapshot = True, matching = 'greedy', chunk_rows = None):
     '''
     Generates or reads simulation data for one or more stocks over 5 years,
     given their initial share price and volatility.
@@ -144,7 +810,7 @@ def get_data(method = 'read', filename = 'stock_data_5y.txt', initial_prices = [
             If method is 'generate', use generate_stock_price() to generate
                 the data from scratch.
             If method is 'read', use Numpy's loadtxt() to read the data
-                from the file stock_data_5y.txt.
+                from the file stock_data_5y.txt (only parsed once, see read_price_file()).
             
         initial_price (list): list of initial prices for each stock (default None)
             If method is 'generate', use these initial prices to generate the data.
@@ -158,6 +824,20 @@ def get_data(method = 'read', filename = 'stock_data_5y.txt', initial_prices = [
         
         days (int): Number of days used if method is 'generate' (default 5 * 365)
         
+        seed (None/int/SeedSequence/Generator): seed used if method is 'generate' (default None)
+            The same seed always generates the same data.
+        
+        snapshot (bool): if method is 'read', read the file from its binary snapshot, made the first
+            time the file is read (default True). See read_price_file().
+        
+        matching (str): if method is 'read', how to choose the columns (default 'greedy'):
+            'greedy' gives each value in turn the closest column not chosen yet,
+            'optimal' minimizes the total distance (needs scipy). See select_columns().
+        
+        chunk_rows (int): if method is 'read', parse the file this many rows at a time (default None,
+            all at once), for files too large to fit in memory. The prices are then memory-mapped
+            and only read from disk when used. Needs snapshot to be True. See read_price_file().
+        
 
         If no arguments are specified, read price data from the whole file.
         
@@ -198,140 +878,49 @@ def get_data(method = 'read', filename = 'stock_data_5y.txt', initial_prices = [
     # if user chose method = 'read'
     if method == 'read':
         
-        # remove first line of 'stock_data_5y.txt'
+        # remove first line of 'stock_data_5y.txt'
         if filename == 'stock_data_5y.txt':            
-            # use numpy loadtxt function to read in the txt/csv file and store in a numpy array
-            text_data = np.loadtxt(filename)            
+            # read the file (or its binary snapshot), with prices set to NaN once stocks go bust
+            text_data = read_price_file(filename, header = True, snapshot = snapshot, chunk_rows = chunk_rows)
             # get rid of first line of 'stock_data_5y.txt' as these are the volatilities
             price_data = text_data[1:]
             
         # if it is another file, read in as normal
         else:
-            price_data = np.loadtxt(filename)
-        
-        #find any prices below zero or NaN 
-        if np.any(price_data <= 0) or np.any(np.isnan(price_data)):
-            stocks_where_bust = np.unique(np.where((price_data <= 0) | np.isnan(price_data))[1])
-            
-            for stock in stocks_where_bust:
-                # get first day where stock goes bust
-                i = next(idx for idx in range(price_data.shape[0]) if price_data[idx, stock] <= 0 or np.isnan(price_data[idx, stock]))                
-                # set remaining days to nan
-                price_data[i:, stock] = np.nan
+            price_data = read_price_file(filename, snapshot = snapshot, chunk_rows = chunk_rows)
         
         # now find closest initial prices if this input is given
-        if len(np.atleast_1d(initial_prices)) > 0:           
-            # number of stock to choose
-            N = len(np.atleast_1d(initial_prices))            
-            # initialize data
-            sim_data = np.zeros((price_data.shape[0], N))            
-            
-            # for any other data file
-            if filename != 'stock_data_5y.txt':
-                
-                # enter the while loop and loop through each initial price
-                i = 0
-                while i < N:
-                    # get column where initial price is closest to test price
-                    stock = (np.abs(price_data[0] - initial_prices[i])).argmin()                    
-                    # add this column to stock price data 
-                    sim_data[:, i] = price_data[:, stock]
-                    # now effectively remove this column from the data so that we don't choose it again
-                    price_data = np.delete(price_data, stock, 1)
-                    
-                    # go to next initial price
-                    i += 1
-                
-                # get initial prices and volatilities    
-                initial = [sim_data[0, i] for i in range(N)]
-                volatilities = np.nanstd(sim_data, axis = 0)
-            
-            # if the file is 'stock_data_5y.txt'
+        if len(np.atleast_1d(initial_prices)) > 0:
+            # initial price of every stock, stocks in 'stock_data_5y.txt' are matched on their price on day 1
+            if filename == 'stock_data_5y.txt':
+                stocks = select_columns(price_data[1], initial_prices, matching)
             else:
-                volatilities = np.zeros(N)
-                
-                # enter while loop and loop through each initial price
-                i = 0
-                while i < N:                    
-                    # get column where initial price is closest to test price
-                    stock = (np.abs(price_data[1] - initial_prices[i])).argmin()
-                    # add this column to stock price data 
-                    sim_data[:, i] = price_data[:, stock]
-                    # get volatility from first row
-                    volatilities[i] = text_data[0, stock]
-                    
-                    # now effectively remove this column from the data so that we don't choose it again
-                    price_data = np.delete(price_data, stock, 1)
-                    text_data = np.delete(text_data, stock, 1)
-                    
-                    # go to next initial price
-                    i += 1
-                
-                # get initial prices
-                initial = [sim_data[0, i] for i in range(N)]
-                
-            # display appropriate messages
-            print(f'Found data with initial prices {np.round(initial, 2)} and volatilities {np.round(volatilities, 2)}.')
-            
-            if len(np.atleast_1d(volatility)) > 0:
-                print('Input argument volaility ignored.')
-                
-        
+                stocks = select_columns(price_data[0], initial_prices, matching)
         
         # now find columns with closest volatility if this input is given and no initial prices given
-        elif len(np.atleast_1d(volatility)) > 0:            
-            # number of stock to choose
-            N = len(np.atleast_1d(volatility))             
-            # initialize data
-            sim_data = np.zeros((price_data.shape[0], N))
+        elif len(np.atleast_1d(volatility)) > 0:
+            # volatilities of all the stocks (given in the first line of 'stock_data_5y.txt')
+            if filename == 'stock_data_5y.txt':
+                stocks = select_columns(text_data[0], volatility, matching)
+            else:
+                stocks = select_columns(np.nanstd(price_data, axis = 0), volatility, matching)
+        
+        if len(np.atleast_1d(initial_prices)) > 0 or len(np.atleast_1d(volatility)) > 0:
+            # get all the chosen columns at once
+            sim_data = price_data[:, stocks]
             
-            # for any other data file
-            if filename != 'stock_data_5y.txt':
-               
-            # enter while loop and loop through each volatility
-                i = 0
-                while i < N:
-                    # get column where volatility is closest to test volatility
-                    stock = (np.abs(np.nanstd(price_data, axis = 0) - volatility[i])).argmin()                    
-                    # add this column to stock price data 
-                    sim_data[:, i] = price_data[:, stock]
-                    # now effectively remove this column from the data so that we don't choose it again
-                    price_data = np.delete(price_data, stock, 1)
-                    
-                    # move to next volatility
-                    i += 1
-
-                # get initial prices and volatilities
-                initial = [sim_data[0, i] for i in range(N)]                
+            # get initial prices and volatilities
+            initial = sim_data[0]
+            if filename == 'stock_data_5y.txt':
+                volatilities = text_data[0, stocks]
+            else:
                 volatilities = np.nanstd(sim_data, axis = 0)
             
-            # if the file is 'stock_data_5y.txt'
-            else:
-                volatilities = np.zeros(N)
-                
-                # enter while loop and loop through each initial price
-                i = 0
-                while i < N:
-                    
-                    # get column where volatility is closest to test volatility
-                    stock = (np.abs(text_data[0] - volatility[i])).argmin()                   
-                    # add this column to stock price data 
-                    sim_data[:, i] = price_data[:, stock]
-                    # get volatility from first row
-                    volatilities[i] = text_data[0, stock]
-                    
-                    # now effectively remove this column from the data so that we don't choose it again
-                    price_data = np.delete(price_data, stock, 1)
-                    text_data = np.delete(text_data, stock, 1)
-                    
-                    # move to next volatility
-                    i += 1
-                
-                # get initial prices    
-                initial = [sim_data[0, i] for i in range(N)]
-                
             # display appropriate messages
             print(f'Found data with initial prices {np.round(initial, 2)} and volatilities {np.round(volatilities, 2)}.')
+            
+            if len(np.atleast_1d(initial_prices)) > 0 and len(np.atleast_1d(volatility)) > 0:
+                print('Input argument volaility ignored.')
 
         # if only the file is given
         else:    
@@ -353,7 +942,7 @@ def get_data(method = 'read', filename = 'stock_data_5y.txt', initial_prices = [
         
         else:      
             # generate the stock data using generate_stock_price()
-            sim_data = generate_stock_price(days, initial_prices, volatility)
+            sim_data = generate_stock_price(days, initial_prices, volatility, seed = seed)
     
     return sim_data
         
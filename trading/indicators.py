@@ -1,8 +1,42 @@
+import os
+import weakref
+import hashlib
+import collections
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import trading.profiling as profiling
 
+def float_dtype(values):
+    '''
+    Gets the dtype to calculate an indicator in: the dtype of the values if they are floats
+    (e.g. float32 prices, see data.price_dtype), float64 otherwise.
+    
+    Input:
+        values (ndarray): the values the indicator is calculated from
+        
+    Output:
+        dtype (dtype): a floating point dtype
+        
+    Example:
+        >>> float_dtype(np.zeros(3, dtype = np.float32))
+        dtype('float32')
+    '''
+    dtype = np.asarray(values).dtype
+    return dtype if np.issubdtype(dtype, np.floating) else np.dtype(np.float64)
+
+
+@profiling.timed
 def moving_average(stock_prices, n = 7, weights = []):
     '''
     Calculates the n-day (possibly weighted) moving average for a given stock over time.
+    
+    The non-weighted average adds up each window from its oldest day (see ordered_rolling_sum()), so it
+    costs O(n x days x N). Cumulative sums would cost O(days x N), but they round differently: two averages
+    that are exactly equal (e.g. flat prices) can come out a few 1e-11 apart, which adds or removes a
+    crossing averages trade. Adding from the oldest day gives the same values as np.mean over the window
+    of several stocks, bit for bit.
+    The weighted average multiplies a sliding window view of the prices (no copy) by the weights.
+    The result has the dtype of the prices if they are floats (see float_dtype()).
 
     Input:
         stock_price (ndarray): share prices over time for several stock,
@@ -19,39 +53,309 @@ def moving_average(stock_prices, n = 7, weights = []):
         >>> moving_average(stock_price_data, n = 3, weights = [0.1, 0.4, 0.5])
     '''
 
-    # get number of days and number of stock
+    # get number of days, and work on 2D prices (days, N) even for a single stock
     number_of_days = stock_prices.shape[0]
-    N = len(np.atleast_1d(stock_prices[0]))
+    dtype = float_dtype(stock_prices)
+    prices = np.asarray(stock_prices, dtype = dtype).reshape(number_of_days, -1)
             
     # convert weights to a numpy array
-    weights_array = np.array(weights) 
+    weights_array = np.array(weights, dtype = dtype) 
             
     # initialize moving average array
-    ma = np.zeros(stock_prices.shape)
+    ma = np.zeros(prices.shape, dtype = dtype)
     
     # set first n-1 values for MA to NaN since we cannot calculate these
     ma[:(n - 1)] = np.nan
     
+    # nothing else to calculate if there are fewer than n days
+    if number_of_days < n:
+        return ma.reshape(stock_prices.shape)
+    
     # condition for no weights
-    if weights == []:
-        # loop through each day starting from first day of available data for calculation
-        for day in range(n - 1, number_of_days):
-            
-            # calculate averages for the last n-days for each stock
-            ma[day] = np.mean(stock_prices[(day - (n - 1)) : (day + 1)], axis = 0)
+    if len(weights_array) == 0:
+        # average of the window ending on each day from the first day with n days of data
+        ma[(n - 1):] = ordered_rolling_sum(prices, n, np.float64) / n
                 
     # condition for weights
-    elif weights != []:
-        # loop through each day starting from first day of available data for calculation
-        for day in range(n - 1, number_of_days):
-                
-                # calculate weighted average using matrix multiplication
-                ma[day] = np.sum(np.matmul(weights_array, stock_prices[(day - (n - 1)) : (day + 1)]), axis = 0)
+    else:
+        # weighted sum of the window ending on each day, the first weight goes to the oldest day
+        ma[(n - 1):] = sliding_window_view(prices, n, axis = 0) @ weights_array
            
     #return n-day ma
-    return ma
+    return ma.reshape(stock_prices.shape)
+
+
+def rolling_sum(values, n, dtype = None):
+    '''
+    Calculates the sum of every window of n consecutive days using cumulative sums.
+    NaN and infinite values only affect the windows that contain them.
+    Floats are added up in float64 and booleans (e.g. to count days) in integers, whatever the dtype of the result.
+    
+    Input:
+        values (ndarray): values over time for several stock, shape (days, N)
+        n (int): length of the windows (in days)
+        dtype (dtype, default None): dtype of the sums, float_dtype(values) if None
+        
+    Output:
+        window_sum (ndarray): sum of the n days ending on each day from day n - 1, shape (days - n + 1, N)
+        
+    Example:
+        Get the 3-day sums of 2 stocks over 5 days.
+        Returns [[3, 3], [6, 6], [9, 9]].
+        >>> rolling_sum(np.array([[0, 0], [1, 1], [2, 2], [3, 3], [4, 4]]), 3)
+    '''
+    
+    if dtype is None:
+        dtype = float_dtype(values)
+    
+    # cumulative sums with a row of zeros in front, so that each window sum is a difference
+    def window_sums(x):
+        accumulator = np.int32 if x.dtype == bool and x.shape[0] < 2**31 else np.int64 if x.dtype.kind in 'biu' else np.float64
+        total = np.zeros((x.shape[0] + 1,) + x.shape[1:], dtype = accumulator)
+        np.cumsum(x, axis = 0, dtype = accumulator, out = total[1:])
+        return (total[n:] - total[:-n]).astype(dtype, copy = False)
+    
+    # remove the first value of each stock to keep the cumulative sums small and precise
+    # (sums of booleans and integers are exact already)
+    if np.issubdtype(values.dtype, np.floating):
+        offset = np.where(np.isfinite(values[0]), values[0], 0)
+        with np.errstate(invalid = 'ignore'):
+            window_sum = window_sums(values - offset) + n * offset
+    else:
+        window_sum = window_sums(values)
+    
+    # stocks with NaN or infinite values (e.g. after going bust) need to be fixed
+    finite = np.isfinite(values)
+    stocks_not_finite = np.flatnonzero(~np.all(finite, axis = 0))
+    if len(stocks_not_finite) > 0:
+        values = values[:, stocks_not_finite]
+        finite = finite[:, stocks_not_finite]
+        offset = offset[stocks_not_finite]
+        
+        # add up the finite values and count the NaN, +inf and -inf in each window
+        fixed_sum = window_sums(np.where(finite, values - offset, 0)) + n * offset
+        nan_count = window_sums(np.isnan(values))
+        positive_inf_count = window_sums(values == np.inf)
+        negative_inf_count = window_sums(values == - np.inf)
+        
+        # infinite values win over finite ones, NaN or opposite infinities give NaN (like np.sum)
+        fixed_sum[positive_inf_count > 0] = np.inf
+        fixed_sum[negative_inf_count > 0] = - np.inf
+        fixed_sum[(nan_count > 0) | ((positive_inf_count > 0) & (negative_inf_count > 0))] = np.nan
+        window_sum[:, stocks_not_finite] = fixed_sum
+    
+    return window_sum
+
+
+def ordered_rolling_sum(values, n, dtype = None, block_bytes = 2**18):
+    '''
+    Calculates the sum of every window of n consecutive days by adding the days of each window one
+    at a time from the oldest, in O(n x days x N). This is the order in which np.sum and np.mean add up
+    the rows of a (days, N) window, so the sums are the same bit for bit and equal windows give equal
+    sums, unlike with rolling_sum(). NaN and infinite values propagate like in np.sum.
+    The values are added up in float64 whatever the dtype of the result (like in rolling_sum()),
+    a block of days at a time so that the sums stay in the CPU cache.
+    
+    Input:
+        values (ndarray): values over time for several stock, shape (days, N)
+        n (int): length of the windows (in days)
+        dtype (dtype, default None): dtype of the sums, float_dtype(values) if None
+        block_bytes (int, default 2**18): size of the blocks of sums (in bytes)
+        
+    Output:
+        window_sum (ndarray): sum of the n days ending on each day from day n - 1, shape (days - n + 1, N)
+        
+    Example:
+        Get the 3-day sums of 2 stocks over 5 days.
+        Returns [[3., 3.], [6., 6.], [9., 9.]].
+        >>> ordered_rolling_sum(np.array([[0., 0.], [1., 1.], [2., 2.], [3., 3.], [4., 4.]]), 3)
+    '''
+    if dtype is None:
+        dtype = float_dtype(values)
+    
+    number_of_windows = values.shape[0] - n + 1
+    window_sum = values[:number_of_windows].astype(np.float64)
+    
+    # number of windows in a block, at least one
+    block = max(1, block_bytes // max(window_sum[:1].nbytes, 1))
+    
+    # add the following days of the windows of each block to their first day
+    for start in range(0, number_of_windows, block):
+        block_sum = window_sum[start : (start + block)]
+        stop = start + len(block_sum)
+        for lag in range(1, n):
+            block_sum += values[(start + lag) : (stop + lag)]
+    
+    return window_sum.astype(dtype, copy = False)
 
-def oscillator(stock_prices, n = 7, osc_type = 'stochastic', smoothing_period = False):
+
+def rolling_max(values, n):
+    '''
+    Calculates the maximum of every window of n consecutive days with the van Herk/Gil-Werman
+    algorithm, in O(days) whatever n is. NaN values propagate like in np.amax.
+    
+    Input:
+        values (ndarray): values over time for several stock, shape (days, N)
+        n (int): length of the windows (in days)
+        
+    Output:
+        window_max (ndarray): maximum of the n days ending on each day from day n - 1, shape (days - n + 1, N)
+        
+    Example:
+        Get the 3-day maximum of a stock over 5 days.
+        Returns [[3], [3], [4]].
+        >>> rolling_max(np.array([[1], [3], [2], [1], [4]]), 3)
+    '''
+    return rolling_extremum(values, n, np.maximum)
+
+
+def rolling_min(values, n):
+    '''
+    Calculates the minimum of every window of n consecutive days with the van Herk/Gil-Werman
+    algorithm, in O(days) whatever n is. NaN values propagate like in np.amin.
+    
+    Input:
+        values (ndarray): values over time for several stock, shape (days, N)
+        n (int): length of the windows (in days)
+        
+    Output:
+        window_min (ndarray): minimum of the n days ending on each day from day n - 1, shape (days - n + 1, N)
+        
+    Example:
+        Get the 3-day minimum of a stock over 5 days.
+        Returns [[1], [1], [1]].
+        >>> rolling_min(np.array([[1], [3], [2], [1], [4]]), 3)
+    '''
+    return rolling_extremum(values, n, np.minimum)
+
+
+def rolling_extremum(values, n, extremum):
+    '''
+    van Herk/Gil-Werman rolling maximum or minimum. The days are cut into blocks of n days.
+    Every window of n days is the end of one block followed by the start of the next, so its
+    extremum is the extremum of a suffix of the first block and a prefix of the second one.
+    
+    Input:
+        values (ndarray): values over time for several stock, shape (days, N)
+        n (int): length of the windows (in days)
+        extremum (ufunc): np.maximum or np.minimum
+        
+    Output:
+        window_extremum (ndarray): extremum of the n days ending on each day from day n - 1, shape (days - n + 1, N)
+    '''
+    
+    # get number of days and pad them to a whole number of blocks, padding is never used by a window
+    number_of_days = values.shape[0]
+    number_of_blocks = - (- number_of_days // n)
+    blocks = np.empty((number_of_blocks * n,) + values.shape[1:], dtype = float_dtype(values))
+    blocks[:number_of_days] = values
+    blocks[number_of_days:] = values[-1]
+    blocks = blocks.reshape((number_of_blocks, n) + values.shape[1:])
+    
+    # running extremum from the start of each block, and from the end of each block backwards,
+    # one position of all blocks at a time (n steps over all blocks and stocks)
+    prefix = np.empty(blocks.shape, dtype = blocks.dtype)
+    suffix = np.empty(blocks.shape, dtype = blocks.dtype)
+    prefix[:, 0] = blocks[:, 0]
+    suffix[:, -1] = blocks[:, -1]
+    for k in range(1, n):
+        extremum(prefix[:, k - 1], blocks[:, k], out = prefix[:, k])
+        extremum(suffix[:, n - k], blocks[:, n - k - 1], out = suffix[:, n - k - 1])
+    prefix = prefix.reshape((-1,) + values.shape[1:])
+    suffix = suffix.reshape((-1,) + values.shape[1:])
+    
+    # window [day - n + 1, day] is the suffix from day - n + 1 and the prefix up to day
+    return extremum(suffix[:(number_of_days - n + 1)], prefix[(n - 1):number_of_days])
+
+
+@profiling.timed
+def relative_strength(stock_prices, n = 7, method = 'cutler'):
+    '''
+    Calculates the n-day RSI from the n - 1 price changes ending on each day, for all days at once
+    from a single np.diff of the prices.
+    
+    With method 'cutler', the average gain is the mean of the positive price changes and the average
+    loss is the mean of the negative price changes in the window (changes that are 0 or NaN are
+    ignored). The numbers of gains and losses in each window are rolling sums, but the gains and losses
+    themselves are added up one lag at a time from the oldest day of every window (see ordered_rolling_sum()),
+    in n - 2 whole-array additions, so this costs O(n x days x N) instead of O(days x N).
+    
+    Rolling sums (differences of cumulative sums) would be faster, but they move an RSI that sits
+    exactly on a threshold (e.g. 0.25 with prices in cents) by about 1e-14, which is enough to add or
+    remove a momentum trade. Adding from the oldest day gives the same values as the original
+    np.nanmean loop, bit for bit.
+    
+    With method 'wilder', the gains and losses (0 on other days) are smoothed with Wilder's
+    exponential moving average with period n - 1, starting from their mean over the first window.
+    
+    Either way, a stock with no negative change in the window has an RSI of 1, and a stock with no
+    positive change in the window (including a stock that went bust) has an RSI of 0.
+    
+    Input:
+        stock_prices (ndarray): share prices over time for several stock, shape (days, N)
+        n (int, default 7): period of the RSI (in days)
+        method (str, default 'cutler'): either 'cutler' or 'wilder'
+        
+    Output:
+        rsi (ndarray): RSI on each day from day n - 1, shape (days - n + 1, N)
+        
+    Example:
+        Get the 14-day RSI of some stocks with Wilder smoothing.
+        >>> relative_strength(stock_price_data, n = 14, method = 'wilder')
+    '''
+    
+    # get number of days and the window of price changes
+    number_of_days = stock_prices.shape[0]
+    period = n - 1
+    
+    # a window without any price change has neither gains nor losses
+    if period < 1:
+        return np.zeros((number_of_days - n + 1,) + stock_prices.shape[1:], dtype = float_dtype(stock_prices))
+    
+    # price changes between consecutive days, NaN changes are neither gains nor losses
+    differences = np.diff(stock_prices, axis = 0)
+    rising = differences > 0
+    falling = differences < 0
+    gains = np.where(rising, differences, 0)
+    losses = np.where(falling, - differences, 0)
+    
+    # count the gains and losses in each window
+    number_of_gains = rolling_sum(rising, period, float_dtype(differences))
+    number_of_losses = rolling_sum(falling, period, float_dtype(differences))
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        
+        # mean of the positive and of the negative changes in each window, the windows are added up
+        # one day at a time from the oldest (like np.nanmean) so that an RSI exactly on a threshold
+        # is not moved off it by rounding
+        if method == 'cutler':
+            average_gain = ordered_rolling_sum(gains, period) / number_of_gains
+            average_loss = ordered_rolling_sum(losses, period) / number_of_losses
+        
+        # Wilder's smoothing: average = ((period - 1) * previous average + today's change) / period
+        elif method == 'wilder':
+            average_gain = np.empty(number_of_gains.shape, dtype = gains.dtype)
+            average_loss = np.empty(number_of_losses.shape, dtype = losses.dtype)
+            average_gain[0] = np.mean(gains[:period], axis = 0)
+            average_loss[0] = np.mean(losses[:period], axis = 0)
+            for day in range(1, len(average_gain)):
+                average_gain[day] = average_gain[day - 1] + (gains[day + period - 1] - average_gain[day - 1]) / period
+                average_loss[day] = average_loss[day - 1] + (losses[day + period - 1] - average_loss[day - 1]) / period
+        
+        # get relative strength and RSI
+        RS = average_gain / average_loss
+        rsi = 1 - (1 / (1 + RS))
+    
+    # no negative differences means we set the RSI for that stock to 1,
+    # no positive differences means we set RSI to 0
+    rsi[number_of_losses == 0] = 1
+    rsi[number_of_gains == 0] = 0
+    
+    return rsi
+
+
+@profiling.timed
+def oscillator(stock_prices, n = 7, osc_type = 'stochastic', smoothing_period = False, rsi_method = 'cutler'):
     '''
     Calculates the level of the stochastic or RSI oscillator with a period of n days.
 
@@ -61,6 +365,8 @@ def oscillator(stock_prices, n = 7, osc_type = 'stochastic', smoothing_period =
         n (int, default 7): period of the oscillator (in days).
         osc_type (str, default 'stochastic'): either 'stochastic' or 'RSI' to choose an oscillator.
         smoothing_period (int, default = False): period of moving average to be applied to the oscillator.
+        rsi_method (str, default 'cutler'): how gains and losses are averaged for the RSI, see relative_strength().
+            'cutler' averages them over the last n - 1 price changes, 'wilder' smooths them with Wilder's EMA.
 
     Output:
         osc (ndarray): the (possibly smoothed) oscillator level with period $n$ for the stocks over time.
@@ -71,105 +377,40 @@ def oscillator(stock_prices, n = 7, osc_type = 'stochastic', smoothing_period =
         >>> oscillator(stock_price_data, n = 10, osc_type = 'RSI', smoothing_period = 21)
     '''
    
-    # get number of days and number of stocks
+    # get number of days and number of stocks, and work on 2D prices (days, N) even for a single stock
     number_of_days = stock_prices.shape[0]
     N = len(np.atleast_1d(stock_prices[0]))
+    dtype = float_dtype(stock_prices)
+    prices = np.asarray(stock_prices, dtype = dtype).reshape(number_of_days, N)
     
-    # inititalize oscillator array
-    osc = np.zeros((number_of_days, N))
+    # inititalize oscillator array, in the dtype of the prices if they are floats
+    osc = np.zeros((number_of_days, N), dtype = dtype)
     
     # set first n values to NaN since we cannot caculate these
     osc[:(n - 1)] = np.nan
     
-    # if the user chooses a stochastic oscillator
-    if osc_type == 'stochastic':
+    # if the user chooses a stochastic oscillator, cannot get n-day oscillator before n days
+    if osc_type == 'stochastic' and number_of_days >= n:
         
-        # loop over each day, cannot get n-day oscillator before n + 1 days
-        for day in range(n - 1, number_of_days):
-                
-            # get the maximum and minimum prices over the last n days for each stock and get difference
-            max_price = np.amax(stock_prices[(day - (n - 1)) : (day + 1)], axis = 0)
-            min_price = np.amin(stock_prices[(day - (n - 1)) : (day + 1)], axis = 0)
-            max_min_difference = max_price - min_price
+        # get the maximum and minimum prices over the last n days for each stock and get difference
+        max_price = rolling_max(prices, n)
+        min_price = rolling_min(prices, n)
+        max_min_difference = max_price - min_price
 
-            # calculate n-day stohastic oscillator and add to osc
-            osc[day] = (stock_prices[day] - min_price) / max_min_difference
+        # calculate n-day stohastic oscillator and add to osc
+        osc[(n - 1):] = (prices[(n - 1):] - min_price) / max_min_difference
       
     # if the user chooses an RSI oscillator          
-    elif osc_type == 'RSI':
+    elif osc_type == 'RSI' and number_of_days >= n:
         
-        # loop over each day
-        for day in range(n - 1, number_of_days):
-                
-            # get differences of consecutive prices
-            differences = stock_prices[(day - (n - 2)) : (day + 1)] - stock_prices[(day - (n - 1)) : day] 
-            # get the right shape to operate on the array
-            differences = differences.reshape((n - 1, N))
-            
-            # separate positive and negative
-            positive_differences = np.where(differences > 0, differences, np.nan)
-            negative_differences = np.where(differences < 0, differences, np.nan)
-            
-            # set indicators which show if there is a stock with no negative differences or no positive differences
-            x = 0
-            y = 0
-            
-            # manage the case where there is no negative differences
-            if np.any(np.all(np.isnan(negative_differences), axis = 0)):
-                
-                # get the stocks where there ar eno negative differences 
-                stock_where_no_neg = np.where(np.all(np.isnan(negative_differences), axis = 0))[0]
-                # set the column to 0
-                negative_differences[:, stock_where_no_neg] = 0
-                # indicate for later that such stock exists 
-                x = 1
-                
-            # manage the case where there is no positive differences
-            if np.any(np.all(np.isnan(positive_differences), axis = 0)):
-                
-                # get the stocks where there ar eno negative differences 
-                stock_where_no_pos = np.where(np.all(np.isnan(positive_differences), axis = 0))[0]
-                # set the column to 0
-                positive_differences[:, stock_where_no_pos] = 0
-                # indicate for later that such stock exists 
-                y = 1
-            
-            # for the other stock we get RSI as normal
-            if np.all(positive_differences == 0) == False and np.all(negative_differences == 0) == False:
-                
-                # calculate average of positive differences excluding NaNs
-                average_positive = np.nanmean(positive_differences, axis = 0)
-                
-                # set average positive for stock with no positive differences to NaN, ensuring no division by 0
-                if y == 1:
-                    average_positive[stock_where_no_pos] = np.nan
-                
-                # get absolute value of mean of negative differences
-                average_negative = np.abs(np.nanmean(negative_differences, axis = 0))
-                
-                # set average for stock with no negative differences to NaN, ensuring no division by 0
-                if x ==1:                    
-                    average_negative[stock_where_no_neg] = np.nan
-                
-                # get relative strength
-                RS = average_positive / average_negative
-                        
-                # get RSI and add to osc
-                osc[day] = 1 - (1 / (1 + RS))
-            
-            # no negative differences means we set the RSI for that stock to 1
-            if x == 1:                
-                osc[day, stock_where_no_neg] = 1
-            
-            # no positive differences means we set RSI to 0    
-            if y == 1:                
-                osc[day, stock_where_no_pos] = 0
+        # RSI from the gains and losses over the last n - 1 price changes
+        osc[(n - 1):] = relative_strength(prices, n, rsi_method)
 
     # if the user chose a smoothing period, apply it
     if smoothing_period != False and smoothing_period != 0:
         
         # initialize the smoothed oscillator
-        smoothed_oscillator = np.zeros(osc.shape)
+        smoothed_oscillator = np.zeros(osc.shape, dtype = dtype)
         # set first n - 1 values to NaN since we cannot calculate them
         smoothed_oscillator[:(n - 1)] = np.nan
         
@@ -182,4 +423,491 @@ def oscillator(stock_prices, n = 7, osc_type = 'stochastic', smoothing_period =
     # if no smoothing applied, return normal oscillator
     else:            
         return osc
-            
\ No newline at end of file
+            
+
+# Streaming indicators: keep the last n days of each stock and update with one new day of prices at a time.
+# Stacking the values returned by update() on every day from the first day gives exactly the same array as the
+# batch functions above on float64 prices, as the sums are made of the same additions in the same order.
+# The streaming indicators always work in float64: with float32 prices (see data.price_dtype) the batch
+# functions work in float32, and the two agree within the tolerances given there.
+
+class RollingMA:
+    '''
+    n-day (possibly weighted) moving average of N stocks, updated one day at a time.
+    The window is kept in a ring buffer and added up from its oldest day like in moving_average(),
+    so that the values are the same bit for bit, and each update costs O(n x N).
+    
+    Input:
+        N (int): number of stocks
+        n (int, default 7): period of the moving average (in days).
+        weights (list, default []): must be of length n if specified. Indicates the weights
+            to use for the weighted average. If empty, use a non-weighted average.
+    
+    Example:
+        Get the 50-day moving average of live prices, starting from the price history.
+        >>> ma = RollingMA.from_history(stock_price_data, n = 50)
+        >>> todays_ma = ma.update(todays_prices)
+    '''
+    
+    def __init__(self, N, n = 7, weights = []):
+        self.N = N
+        self.n = n
+        self.weights = np.array(weights, dtype = float)
+        
+        # ring buffer of the last n days, position is the slot of the next day (the oldest day once full)
+        self.buffer = np.zeros((n, N))
+        self.position = 0
+        self.days = 0
+        
+        # moving average on the last day
+        self.value = np.full(N, np.nan)
+    
+    @classmethod
+    def from_history(cls, stock_prices, n = 7, weights = []):
+        '''
+        Creates the moving average from past prices (days, N), so that the next update() is for the following day.
+        Only the last n days are needed.
+        '''
+        prices = np.asarray(stock_prices, dtype = float).reshape(stock_prices.shape[0], -1)
+        rolling = cls(prices.shape[1], n, weights)
+        for price_row in prices[-n:]:
+            rolling.update(price_row)
+        return rolling
+    
+    def update(self, price_row):
+        '''
+        Adds the prices of one new day and returns the moving average on that day (NaN for the first n - 1 days).
+        '''
+        # copy the prices, the caller may reuse its array for the next day
+        self.buffer[self.position] = np.array(price_row, dtype = float).reshape(self.N)
+        self.position = (self.position + 1) % self.n
+        self.days += 1
+        
+        # cannot calculate the first n - 1 days
+        if self.days < self.n:
+            self.value = np.full(self.N, np.nan)
+            return self.value
+        
+        # the window from its oldest day, which is in the slot of the next day
+        window = np.roll(self.buffer, - self.position, axis = 0)
+        
+        # weighted average, the first weight goes to the oldest day, multiplied like in moving_average()
+        if len(self.weights) > 0:
+            self.value = (sliding_window_view(window, self.n, axis = 0) @ self.weights)[0]
+        
+        # average of the window, added up like in moving_average()
+        else:
+            self.value = ordered_rolling_sum(window, self.n)[0] / self.n
+        
+        return self.value
+
+
+class RollingStochastic:
+    '''
+    n-day (possibly smoothed) stochastic oscillator of N stocks, updated one day at a time.
+    The window maximum and minimum use the van Herk/Gil-Werman blocks of rolling_extremum(),
+    built as the days come in, so each update costs O(N) on average.
+    
+    Input:
+        N (int): number of stocks
+        n (int, default 7): period of the oscillator (in days).
+        smoothing_period (int, default = False): period of moving average to be applied to the oscillator.
+    
+    Example:
+        Get the 14-day stochastic oscillator of live prices, starting from the price history.
+        >>> osc = RollingStochastic.from_history(stock_price_data, n = 14)
+        >>> todays_osc = osc.update(todays_prices)
+    '''
+    
+    def __init__(self, N, n = 7, smoothing_period = False):
+        self.N = N
+        self.n = n
+        self.days = 0
+        
+        # prices of the current block of n days, running max/min from its start,
+        # and max/min from each position to the end of the previous block
+        self.block = np.zeros((n, N))
+        self.prefix_max = np.zeros(N)
+        self.prefix_min = np.zeros(N)
+        self.suffix_max = np.zeros((n, N))
+        self.suffix_min = np.zeros((n, N))
+        
+        # moving average applied to the oscillator
+        self.smoothing = None
+        if smoothing_period != False and smoothing_period != 0:
+            self.smoothing = RollingMA(N, smoothing_period)
+        
+        # oscillator on the last day
+        self.value = np.full(N, np.nan)
+    
+    @classmethod
+    def from_history(cls, stock_prices, n = 7, smoothing_period = False):
+        '''
+        Creates the oscillator from past prices (days, N), so that the next update() is for the following day.
+        Only the last n days are needed, and the smoothing_period - 1 days before them if smoothed.
+        '''
+        prices = np.asarray(stock_prices, dtype = float).reshape(stock_prices.shape[0], -1)
+        rolling = cls(prices.shape[1], n, smoothing_period)
+        days_needed = n + smoothing_period - 1 if rolling.smoothing is not None else n
+        for price_row in prices[-days_needed:]:
+            rolling.update(price_row)
+        return rolling
+    
+    def update(self, price_row):
+        '''
+        Adds the prices of one new day and returns the oscillator on that day (NaN for the first n - 1 days,
+        and for the following smoothing_period - 1 days if smoothed).
+        '''
+        # copy the prices, the caller may reuse its array for the next day
+        row = np.array(price_row, dtype = float).reshape(self.N)
+        
+        # position of the day in its block
+        k = self.days % self.n
+        self.block[k] = row
+        if k == 0:
+            self.prefix_max = row.copy()
+            self.prefix_min = row.copy()
+        else:
+            np.maximum(self.prefix_max, row, out = self.prefix_max)
+            np.minimum(self.prefix_min, row, out = self.prefix_min)
+        self.days += 1
+        
+        # cannot calculate the first n - 1 days
+        if self.days < self.n:
+            self.value = np.full(self.N, np.nan)
+            return self.value
+        
+        # the window is the end of the previous block and the start of the current one
+        if k == self.n - 1:
+            max_price = self.prefix_max
+            min_price = self.prefix_min
+        else:
+            max_price = np.maximum(self.suffix_max[k + 1], self.prefix_max)
+            min_price = np.minimum(self.suffix_min[k + 1], self.prefix_min)
+        
+        # calculate n-day stohastic oscillator
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            self.value = (row - min_price) / (max_price - min_price)
+        
+        # once the block is full, get its max/min from each position to its end for the next block
+        if k == self.n - 1:
+            self.suffix_max = np.maximum.accumulate(self.block[::-1], axis = 0)[::-1]
+            self.suffix_min = np.minimum.accumulate(self.block[::-1], axis = 0)[::-1]
+        
+        # apply the smoothing from the first day of the oscillator
+        if self.smoothing is not None:
+            self.value = self.smoothing.update(self.value)
+        
+        return self.value
+
+
+class RollingRSI:
+    '''
+    n-day (possibly smoothed) RSI of N stocks, updated one day at a time, see relative_strength().
+    With method 'cutler', the gains and losses of the last n - 1 price changes are added up from the oldest
+    on each update, like relative_strength() does, so each update costs O(n x N).
+    With method 'wilder', each update costs O(N).
+    
+    Input:
+        N (int): number of stocks
+        n (int, default 7): period of the RSI (in days).
+        smoothing_period (int, default = False): period of moving average to be applied to the RSI.
+        method (str, default 'cutler'): either 'cutler' or 'wilder'
+    
+    Example:
+        Get the 14-day RSI with Wilder smoothing of live prices, starting from the price history.
+        >>> rsi = RollingRSI.from_history(stock_price_data, n = 14, method = 'wilder')
+        >>> todays_rsi = rsi.update(todays_prices)
+    '''
+    
+    def __init__(self, N, n = 7, smoothing_period = False, method = 'cutler'):
+        self.N = N
+        self.n = n
+        self.period = n - 1
+        self.method = method
+        self.days = 0
+        self.previous_row = np.zeros(N)
+        
+        # ring buffers of the gains, losses and their counts over the last n - 1 price changes
+        self.gains = np.zeros((max(self.period, 1), N))
+        self.losses = np.zeros((max(self.period, 1), N))
+        self.rising = np.zeros((max(self.period, 1), N), dtype = int)
+        self.falling = np.zeros((max(self.period, 1), N), dtype = int)
+        self.number_of_gains = np.zeros(N, dtype = int)
+        self.number_of_losses = np.zeros(N, dtype = int)
+        
+        # Wilder's averages
+        self.average_gain = np.zeros(N)
+        self.average_loss = np.zeros(N)
+        
+        # moving average applied to the RSI
+        self.smoothing = None
+        if smoothing_period != False and smoothing_period != 0:
+            self.smoothing = RollingMA(N, smoothing_period)
+        
+        # RSI on the last day
+        self.value = np.full(N, np.nan)
+    
+    @classmethod
+    def from_history(cls, stock_prices, n = 7, smoothing_period = False, method = 'cutler'):
+        '''
+        Creates the RSI from past prices (days, N), so that the next update() is for the following day.
+        Only the last n days are needed, and the smoothing_period - 1 days before them if smoothed,
+        except with Wilder smoothing which replays all of them.
+        '''
+        prices = np.asarray(stock_prices, dtype = float).reshape(stock_prices.shape[0], -1)
+        rolling = cls(prices.shape[1], n, smoothing_period, method)
+        if method != 'wilder':
+            days_needed = n + smoothing_period - 1 if rolling.smoothing is not None else n
+            prices = prices[-days_needed:]
+        for price_row in prices:
+            rolling.update(price_row)
+        return rolling
+    
+    def update(self, price_row):
+        '''
+        Adds the prices of one new day and returns the RSI on that day (NaN for the first n - 1 days,
+        and for the following smoothing_period - 1 days if smoothed).
+        '''
+        # copy the prices, the caller may reuse its array as the previous day is kept
+        row = np.array(price_row, dtype = float).reshape(self.N)
+        
+        # a window without any price change has neither gains nor losses
+        if self.period < 1:
+            self.days += 1
+            self.value = np.zeros(self.N)
+            return self.smoothing.update(self.value) if self.smoothing is not None else self.value
+        
+        # no price change on the first day
+        if self.days == 0:
+            self.previous_row = row
+            self.days = 1
+            self.value = np.full(self.N, np.nan)
+            return self.value
+        
+        # price change since the previous day, NaN changes are neither gains nor losses
+        difference = row - self.previous_row
+        self.previous_row = row
+        rising = difference > 0
+        falling = difference < 0
+        gain = np.where(rising, difference, 0)
+        loss = np.where(falling, - difference, 0)
+        
+        # replace the oldest price change of the window by the new one
+        slot = (self.days - 1) % self.period
+        if self.days - 1 >= self.period:
+            self.number_of_gains -= self.rising[slot]
+            self.number_of_losses -= self.falling[slot]
+        self.gains[slot] = gain
+        self.losses[slot] = loss
+        self.rising[slot] = rising
+        self.falling[slot] = falling
+        self.number_of_gains += rising
+        self.number_of_losses += falling
+        self.days += 1
+        
+        # cannot calculate the first n - 1 days
+        if self.days < self.n:
+            self.value = np.full(self.N, np.nan)
+            return self.value
+        
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            
+            # mean of the positive and of the negative changes in the window, added up from the oldest change
+            # (in the slot of the next change) like in relative_strength()
+            if self.method == 'cutler':
+                oldest = (self.days - 1) % self.period
+                gain_total = self.gains[oldest].copy()
+                loss_total = self.losses[oldest].copy()
+                for lag in range(1, self.period):
+                    gain_total += self.gains[(oldest + lag) % self.period]
+                    loss_total += self.losses[(oldest + lag) % self.period]
+                average_gain = gain_total / self.number_of_gains
+                average_loss = loss_total / self.number_of_losses
+            
+            # Wilder's smoothing, starting from the mean over the first window
+            elif self.method == 'wilder':
+                if self.days == self.n:
+                    self.average_gain = np.mean(self.gains, axis = 0)
+                    self.average_loss = np.mean(self.losses, axis = 0)
+                else:
+                    self.average_gain = self.average_gain + (gain - self.average_gain) / self.period
+                    self.average_loss = self.average_loss + (loss - self.average_loss) / self.period
+                average_gain = self.average_gain
+                average_loss = self.average_loss
+            
+            # get relative strength and RSI
+            RS = average_gain / average_loss
+            self.value = 1 - (1 / (1 + RS))
+        
+        # no negative differences means RSI is 1, no positive differences means RSI is 0
+        self.value[self.number_of_losses == 0] = 1
+        self.value[self.number_of_gains == 0] = 0
+        
+        # apply the smoothing from the first day of the RSI
+        if self.smoothing is not None:
+            self.value = self.smoothing.update(self.value)
+        
+        return self.value
+
+
+class IndicatorCache:
+    '''
+    Keeps the indicators already calculated, so that calculating the same indicator on the same prices
+    with the same parameters again (e.g. the same moving average in every run of a parameter sweep)
+    just returns the stored result. Results are found from a fingerprint (hash) of the prices, the
+    indicator function and its parameters, and are read-only.
+    
+    Hashing all the prices costs as much as reading them, so it is only done once for each array: the hash
+    is remembered for as long as the array exists, and later lookups with the same array only check a cheap
+    fingerprint (shape, dtype, memory address and a sample of the values, see quick_fingerprint()).
+    Changing the prices of an array in place after a lookup is only noticed if the sample changes,
+    so pass a copy (or clear the cache) in that case.
+    
+    When the stored results take more than max_bytes, the least recently used ones are dropped, or
+    saved as .npy files in spill_dir and opened again as memory maps when needed.
+    
+    Input:
+        max_bytes (int, default 2**28): memory available for the results kept in memory (in bytes)
+        spill_dir (str, default None): directory where to save the dropped results, None to forget them
+    
+    Example:
+        >>> cache = IndicatorCache(max_bytes = 2**30)
+        >>> slow_MA = cache.get(moving_average, stock_price_data, 200)
+        >>> slow_MA = cache.get(moving_average, stock_price_data, 200)
+        >>> cache.stats()['hits'], cache.stats()['misses']
+        (1, 1)
+    '''
+    
+    def __init__(self, max_bytes = 2**28, spill_dir = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        
+        # results in memory, least recently used first, and results saved on disk
+        self.entries = collections.OrderedDict()
+        self.disk_entries = {}
+        self.bytes = 0
+        
+        # hashes of the arrays looked up, by id: (weak reference to the array, quick fingerprint, hash)
+        self.array_hashes = {}
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def fingerprint(values):
+        '''
+        Hash of the shape, dtype and contents of an array.
+        '''
+        values = np.ascontiguousarray(values)
+        digest = hashlib.blake2b(f'{values.shape} {values.dtype.str}'.encode(), digest_size = 16)
+        digest.update(values.data)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def quick_fingerprint(values, sample_size = 1024):
+        '''
+        Shape, dtype, strides and memory address of an array, and the bytes of sample_size of its values
+        spread evenly over it (including the first and the last one), in O(sample_size).
+        '''
+        interface = values.__array_interface__
+        sample = values.flat[np.linspace(0, values.size - 1, min(sample_size, values.size)).astype(np.intp)]
+        return (values.shape, values.dtype.str, values.strides, interface['data'][0], sample.tobytes())
+    
+    def prices_hash(self, stock_prices):
+        '''
+        fingerprint() of the prices, calculated once for each array as long as its quick_fingerprint() is the same.
+        '''
+        # only arrays can be remembered (e.g. not lists)
+        if not isinstance(stock_prices, np.ndarray):
+            return self.fingerprint(stock_prices)
+        
+        key = id(stock_prices)
+        quick = self.quick_fingerprint(stock_prices)
+        known = self.array_hashes.get(key)
+        if known is not None and known[0]() is stock_prices and known[1] == quick:
+            return known[2]
+        
+        # forget the hash when the array is deleted (unless its id was reused by then)
+        def forget(reference, key = key):
+            if self.array_hashes.get(key, (None,))[0] is reference:
+                del self.array_hashes[key]
+        
+        digest = self.fingerprint(stock_prices)
+        self.array_hashes[key] = (weakref.ref(stock_prices, forget), quick, digest)
+        return digest
+    
+    def get(self, indicator, stock_prices, *args, **kwargs):
+        '''
+        Returns indicator(stock_prices, *args, **kwargs), calculating it only if it is not stored yet.
+        '''
+        # lists and arrays of parameters (e.g. weights) are compared by value
+        def by_value(arg):
+            return tuple(np.ravel(arg).tolist()) if isinstance(arg, (list, tuple, np.ndarray)) else arg
+        
+        parameters = tuple(by_value(arg) for arg in args) + tuple((name, by_value(arg)) for name, arg in sorted(kwargs.items()))
+        key = (self.prices_hash(stock_prices), indicator.__module__, indicator.__qualname__, parameters)
+        
+        # in memory, it becomes the most recently used
+        if key in self.entries:
+            self.hits += 1
+            profiling.count('indicator_cache hits')
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        
+        # on disk, open it without reading it
+        if key in self.disk_entries:
+            self.disk_hits += 1
+            profiling.count('indicator_cache disk_hits')
+            return np.load(self.disk_entries[key], mmap_mode = 'r')
+        
+        # calculate it and keep it
+        self.misses += 1
+        profiling.count('indicator_cache misses')
+        result = np.asarray(indicator(stock_prices, *args, **kwargs))
+        result.flags.writeable = False
+        self.entries[key] = result
+        self.bytes += result.nbytes
+        self.evict()
+        
+        return result
+    
+    def evict(self):
+        '''
+        Drops (or saves to disk) the least recently used results until they fit in max_bytes.
+        '''
+        while self.bytes > self.max_bytes and len(self.entries) > 0:
+            key, result = self.entries.popitem(last = False)
+            self.bytes -= result.nbytes
+            self.evictions += 1
+            
+            if self.spill_dir is not None:
+                os.makedirs(self.spill_dir, exist_ok = True)
+                path = os.path.join(self.spill_dir, hashlib.blake2b(repr(key).encode(), digest_size = 16).hexdigest() + '.npy')
+                np.save(path, result)
+                self.disk_entries[key] = path
+    
+    def clear(self):
+        '''
+        Forgets every result and deletes the ones saved on disk.
+        '''
+        for path in self.disk_entries.values():
+            if os.path.exists(path):
+                os.remove(path)
+        self.entries.clear()
+        self.disk_entries.clear()
+        self.array_hashes.clear()
+        self.bytes = 0
+    
+    def stats(self):
+        '''
+        Number of hits (in memory and on disk), misses and evictions, and what is stored.
+        '''
+        return {'hits': self.hits, 'disk hits': self.disk_hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.entries), 'disk entries': len(self.disk_entries), 'bytes': self.bytes}
+
+
+# cache used by the strategies
+indicator_cache = IndicatorCache()
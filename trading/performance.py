@@ -1,196 +1,502 @@
+import io
+import itertools
 import numpy as np
-import re
-# import re for splitting list with several delimiters
-import matplotlib.pyplot as plt
-import pandas as pd
+import trading.process as proc
+import trading.profiling as profiling
 
 # Evaluate performance.
 
-def read_ledger(ledger_file, profit_plot = True, strategy = 'Random Strategy', stock = False):
+@profiling.timed
+def load_ledger(ledger_file, chunk_size = 100000):
     '''
-    Reads and reports useful information from ledger_file.
+    Reads all the transactions of a text or binary ledger (see process.LedgerWriter), detecting the format from the file.
     
     Input:
         ledger_file (str): path to the ledger file
-        profit_plot (boolean, default True): plots profit/loss made over time if True.
-        strategy (str, default 'Random Strategy'): to be displayed on title of plot if True.
-        stock (int, default False): Information of this stock will be returned if stock number is given.
+        chunk_size (int, default 100000): number of transactions parsed at a time, see iterate_ledger()
         
     Output:
-        State of initial and final portfolio, information on portfolio and information of chosen stock.
+        ledger_data (ndarray): one row per transaction, with columns type (1 for 'buy', -1 for 'sell'),
+            day, stock, number of shares, price, fees and amount
+    
+    Example:
+        >>> load_ledger('random_ledger.txt')
+    '''
+    chunks = list(iterate_ledger(ledger_file, chunk_size))
+    
+    # an empty ledger has no transactions
+    if len(chunks) == 0:
+        return np.zeros((0, 7))
+    
+    return np.concatenate(chunks)
+
+
+def iterate_ledger(ledger_file, chunk_size = 100000):
+    '''
+    Reads the transactions of a text or binary ledger chunk_size transactions at a time,
+    so that a huge ledger can be processed without reading the whole file at once.
+    
+    Input:
+        ledger_file (str): path to the ledger file
+        chunk_size (int, default 100000): number of transactions in each chunk
         
+    Output:
+        Yields arrays of up to chunk_size rows, with the same columns as load_ledger()
+    
     Example:
-        Read the ledger from a crossing average strategy and choose to output information on stock 3 with no plot.
-        Returns tables of initial portfolio, final portfolio, trading period information, dates stock 3 was bought and sold and the amount earned from stock 3.
-        >>> read_ledger('crossing_average_ledger.txt', profit_plot = False, strategy = 'Momentum', stock = 3)
+        Total amount spent and earned in a huge ledger.
+        >>> sum(np.sum(chunk[:, 6]) for chunk in iterate_ledger('huge_ledger.txt', chunk_size = 10**6))
+    '''
+    # a binary ledger is memory-mapped, and the columns of each chunk put side by side
+    if proc.is_binary_ledger(ledger_file):
+        transactions = proc.read_binary_ledger(ledger_file)
+        for start in range(0, len(transactions), chunk_size):
+            chunk = transactions[start : (start + chunk_size)]
+            yield np.column_stack([chunk[name].astype(float) for name in proc.LEDGER_DTYPE.names])
+    
+    # a text ledger is read chunk_size lines at a time
+    else:
+        with open(ledger_file, 'r') as file:
+            while True:
+                lines = list(itertools.islice(file, chunk_size))
+                if len(lines) == 0:
+                    break
+                yield parse_ledger_lines(lines)
+
+
+def parse_ledger_lines(lines):
+    '''
+    Parses lines of a text ledger like 'buy, 0, 0, 14.0, 200.0, 10, -2810.0' into an array.
+    
+    Input:
+        lines (list): lines of the text ledger
+        
+    Output:
+        ledger_data (ndarray): one row per line, with 1 for 'buy' and -1 for 'sell' in the first column
+    
+    Example:
+        Returns [[1, 0, 0, 14, 200, 10, -2810]].
+        >>> parse_ledger_lines(['buy, 0, 0, 14.0, 200.0, 10, -2810.0 \\n'])
+    '''
+    # change 'buy' to 1 and 'sell' to -1, so that every value is a number
+    text = ''.join(lines).replace('buy', '1').replace('sell', '-1')
+    
+    # skip lines that are only white space
+    if text.strip() == '':
+        return np.zeros((0, 7))
+    
+    # let NumPy's C parser read the comma-separated values
+    return np.loadtxt(io.StringIO(text), delimiter = ',', ndmin = 2)
+
+
+def ledger_to_binary(text_file, binary_file):
+    '''
+    Converts a text ledger into a binary ledger, appending to binary_file if it already exists
+    (raises a ValueError if it is a text ledger).
+    
+    Input:
+        text_file (str): path to the text ledger
+        binary_file (str): path to the binary ledger
+    
+    Example:
+        >>> ledger_to_binary('random_ledger.txt', 'random_ledger.bin')
+    '''
+    proc.check_ledger_format(binary_file, binary = True)
+    ledger_data = load_ledger(text_file)
+    records = np.zeros(ledger_data.shape[0], dtype = proc.LEDGER_DTYPE)
+    for column, name in enumerate(proc.LEDGER_DTYPE.names):
+        records[name] = ledger_data[:, column]
+    
+    # write the header of a new ledger, then the records
+    with open(binary_file, 'ab') as file:
+        if file.tell() == 0:
+            file.write(proc.LEDGER_HEADER)
+        file.write(records.tobytes())
+
+
+def ledger_to_text(binary_file, text_file):
     '''
-    # first open the file into a readable mode
-    file = open(ledger_file, 'r')    
-    # now read it into a list
-    contents = file.read()
-    # get list by separating by commas, \n and white spaces 
-    # idea for below line: https://stackoverflow.com/questions/4998629/split-string-with-multiple-delimiters-in-python
-    contents = re.split('[,\n\s]\s*', contents)
-    
-    # count how many trades were done 
-    no_of_trades = contents.count('buy') + contents.count('sell')
-    
-    # enter while loop to clean and format the list
-    i = 0    
-    while i < len(contents):
-        
-        # if there are white spaces in the list remove them
-        if contents[i] == '':
-            contents.remove(contents[i])
-            # stay on same index        
-        
-        else:             
-        # change 'buy' to 1 and 'sell' to -1
-            if contents[i] == 'buy':
-                contents[i] = 1
-            elif contents[i] == 'sell':
-                contents[i] = -1
+    Converts a binary ledger into a text ledger, appending to text_file if it already exists
+    (raises a ValueError if it is a binary ledger).
+    The lines are written like process.log_transaction() writes them, so that converting a text ledger
+    to binary and back gives the same file: the day and stock are integers, the price and amount floats,
+    the fees integers if they are whole numbers (like the default fees), and the shares floats, except
+    for the sales of shares that have not been bought again since the portfolio was created on day 0
+    (see process.record_trades()).
+    
+    Input:
+        binary_file (str): path to the binary ledger
+        text_file (str): path to the text ledger
+    
+    Example:
+        >>> ledger_to_text('random_ledger.bin', 'random_ledger.txt')
+    '''
+    transactions = proc.read_binary_ledger(binary_file)
+    
+    # whether each stock was bought after day 0, since its last purchase on day 0
+    topped_up = {}
+    
+    with proc.LedgerWriter(text_file) as ledger:
+        for transaction_type, day, stock, shares, price, fees, amount in transactions.tolist():
+            if transaction_type == 1:
+                topped_up[stock] = day > 0
+            elif not topped_up.get(stock, False):
+                shares = int(shares)
             
-            # move to next index
-            i += 1
-    
-    # now turn the new list into a numpy array
-    ledger_data = np.array(contents, dtype = float).reshape(no_of_trades, 7)
-           
-    # we can now use this array to find the relevant information
-                          
+            fees = int(fees) if fees.is_integer() else fees
+            ledger.log('buy' if transaction_type == 1 else 'sell', day, stock, shares, price, fees, amount)
+
+
+@profiling.timed
+def portfolio_positions(ledger_data, sparse = False):
+    '''
+    Gets the number of shares held of each stock at the end of each trading day, in one pass over the ledger.
+    The shares bought and sold are added up by (trading day, stock) with np.add.at, then summed over days.
+    
+    Input:
+        ledger_data (ndarray): transactions, as returned by load_ledger()
+        sparse (bool, default False): if True, return the positions as a scipy.sparse CSR matrix
+            built from the trades only, which is much smaller when there are many stocks and
+            few of them are held at a time (needs scipy)
+        
+    Output:
+        trading_days (ndarray): the days on which there was at least one trade
+        positions (ndarray/csr_matrix): shares of each stock held at the end of each trading day,
+            shape (trading days, N) where N is the largest stock number + 1
+    
+    Example:
+        Get the portfolio on each trading day of the random strategy.
+        >>> trading_days, positions = portfolio_positions(load_ledger('random_ledger.txt'))
+    '''
+    
+    # get trading days, the trading day of each trade and the number of stocks
+    trading_days, day_index = np.unique(ledger_data[:, 1], return_inverse = True)
+    stock_index = ledger_data[:, 2].astype(int)
+    no_of_stock = int(stock_index.max()) + 1 if len(stock_index) > 0 else 0
+    
+    # shares bought are added and shares sold are removed
+    shares = ledger_data[:, 0] * ledger_data[:, 3]
+    
+    if not sparse:
+        # change of each stock on each trading day, then the positions are the running total
+        positions = np.zeros((len(trading_days), no_of_stock))
+        np.add.at(positions, (day_index, stock_index), shares)
+        return trading_days, np.cumsum(positions, axis = 0)
+    
+    # optional dependency, only needed for the sparse positions
+    import scipy.sparse
+    
+    # order the trades by stock then day, and get each stock's position after each of its trades
+    order = np.lexsort((day_index, stock_index))
+    day_index, stock_index, shares = day_index[order], stock_index[order], shares[order]
+    new_stock = np.r_[True, stock_index[1:] != stock_index[:-1]]
+    running_total = np.cumsum(shares)
+    position = running_total - np.repeat(running_total[new_stock] - shares[new_stock], np.diff(np.r_[np.flatnonzero(new_stock), len(shares)]))
+    
+    # each position lasts until the next trade of the same stock (or the last trading day)
+    last_trade_of_day = np.r_[(stock_index[1:] != stock_index[:-1]) | (day_index[1:] != day_index[:-1]), True]
+    day_index, stock_index, position = day_index[last_trade_of_day], stock_index[last_trade_of_day], position[last_trade_of_day]
+    end_index = np.r_[np.where(stock_index[1:] == stock_index[:-1], day_index[1:], len(trading_days)), len(trading_days)][:len(day_index)]
+    
+    # only keep the periods where shares are held, and spell out one entry per trading day
+    held = position != 0
+    day_index, end_index, stock_index, position = day_index[held], end_index[held], stock_index[held], position[held]
+    lengths = end_index - day_index
+    rows = np.repeat(day_index - np.cumsum(np.r_[0, lengths[:-1]]), lengths) + np.arange(lengths.sum())
+    
+    positions = scipy.sparse.csr_matrix((np.repeat(position, lengths), (rows, np.repeat(stock_index, lengths))),
+                                        shape = (len(trading_days), no_of_stock))
+    return trading_days, positions
+
+
+@profiling.timed
+def mark_to_market(ledger_data, stock_prices):
+    '''
+    Values the trades of a ledger at the market prices of every day, for every stock at once.
+    Shares of a stock that went bust (NaN price) are worth 0.
+    
+    Input:
+        ledger_data (ndarray): transactions, as returned by load_ledger()
+        stock_prices (ndarray): the stock price data the ledger was traded on, shape (days, N)
+        
+    Output:
+        positions (ndarray): shares of each stock held at the end of each day, shape (days, N)
+        cash (ndarray): cash earned (+) or spent (-) on each stock up to each day, fees included, shape (days, N)
+        holdings (ndarray): market value of the shares held at the end of each day, shape (days, N)
+        traded (ndarray): total value of the shares bought and sold on each day, shape (days,)
+        
+        The mark-to-market profit/loss of each stock is cash + holdings.
+    
+    Example:
+        Daily profit/loss of the whole portfolio of the crossing averages strategy.
+        >>> positions, cash, holdings, traded = mark_to_market(load_ledger('crossing_average_ledger.txt'), sim_data)
+        >>> pnl = np.sum(cash + holdings, axis = 1)
+    '''
+    
+    # get number of days and number of stocks, and the day and stock of each trade
+    days, N = stock_prices.shape
+    day_index = ledger_data[:, 1].astype(int)
+    stock_index = ledger_data[:, 2].astype(int)
+    
+    # shares and cash of each stock changing on each day, then running totals over days
+    positions = np.zeros((days, N))
+    cash = np.zeros((days, N))
+    np.add.at(positions, (day_index, stock_index), ledger_data[:, 0] * ledger_data[:, 3])
+    np.add.at(cash, (day_index, stock_index), ledger_data[:, 6])
+    np.cumsum(positions, axis = 0, out = positions)
+    np.cumsum(cash, axis = 0, out = cash)
+    
+    # value of the shares held at the closing price of each day
+    holdings = positions * np.nan_to_num(stock_prices, nan = 0)
+    
+    # value of the shares traded on each day
+    traded = np.bincount(day_index, weights = ledger_data[:, 3] * ledger_data[:, 4], minlength = days)
+    
+    return positions, cash, holdings, traded
+
+
+def capital_used(cash):
+    '''
+    Capital a strategy needs so that it never spends more cash than it has: the largest amount of cash
+    spent and not yet earned back, over all days. The strategies spend amount on every purchase whatever
+    they have earned, so this is usually more than what they spend on day 0.
+    
+    Input:
+        cash (ndarray): total cash earned (+) or spent (-) up to the end of each day, fees included, shape (..., days)
+        
+    Output:
+        capital (ndarray): the capital needed, shape (...)
+    
+    Example:
+        >>> positions, cash = strategy.momentum(sim_data, ledger = None)
+        >>> capital_used(cash)
+    '''
+    return np.maximum(np.max(- np.asarray(cash, dtype = float), axis = -1), 0)
+
+
+def risk_metrics(pnl, holdings, traded, capital, periods_per_year = 365):
+    '''
+    Calculates risk and return metrics from daily mark-to-market profit/loss curves.
+    Every input can have leading dimensions (e.g. one row per ledger), days are always the last axis.
+    
+    The capital should cover all the cash the strategy spends (see capital_used()), so that the portfolio
+    value stays positive. If the value falls to 0 or below on some day, the returns and ratios to the value
+    mean nothing, so every metric but 'Total Profit/Loss' is NaN.
+    
+    Input:
+        pnl (ndarray): mark-to-market profit/loss on each day, shape (..., days)
+        holdings (ndarray): total market value of the shares held on each day, shape (..., days)
+        traded (ndarray): total value of the shares bought and sold on each day, shape (..., days)
+        capital (float/ndarray): starting capital, the portfolio value on each day is capital + pnl
+        periods_per_year (int, default 365): number of days in a year, to annualize the Sharpe ratio
+        
+    Output:
+        metrics (dict): arrays of shape (...) for 'Total Profit/Loss', 'Total Return', 'Sharpe Ratio',
+            'Max Drawdown', 'Turnover' (value traded / average portfolio value) and
+            'Exposure' (average fraction of the portfolio value held in shares)
+    
+    Example:
+        >>> risk_metrics(pnl, np.sum(holdings, axis = 1), traded, capital = capital_used(cash))
+    '''
+    
+    # portfolio value over time and its daily returns
+    capital = np.asarray(capital, dtype = float)[..., None]
+    value = capital + pnl
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        returns = np.diff(value, axis = -1) / value[..., :-1]
+        
+        # annualized Sharpe ratio (with no risk-free rate)
+        sharpe = np.mean(returns, axis = -1) / np.std(returns, axis = -1) * np.sqrt(periods_per_year)
+        
+        # largest fall from a previous maximum of the portfolio value
+        drawdown = 1 - value / np.maximum.accumulate(value, axis = -1)
+        
+        # how much is traded and how much is invested compared to the portfolio value
+        turnover = np.sum(traded, axis = -1) / np.mean(value, axis = -1)
+        exposure = np.mean(holdings / value, axis = -1)
+        
+        # profit/loss on the capital
+        total_return = pnl[..., -1] / capital[..., 0]
+    
+    # the metrics relative to the portfolio value are not valid once it is used up
+    used_up = np.any(value <= 0, axis = -1)
+    return {'Total Profit/Loss': pnl[..., -1],
+            'Total Return': np.where(used_up, np.nan, total_return),
+            'Sharpe Ratio': np.where(used_up, np.nan, sharpe),
+            'Max Drawdown': np.where(used_up, np.nan, np.max(drawdown, axis = -1)),
+            'Turnover': np.where(used_up, np.nan, turnover),
+            'Exposure': np.where(used_up, np.nan, exposure)}
+
+
+@profiling.timed
+def evaluate_ledgers(ledger_files, stock_prices, capital = None, periods_per_year = 365, table = True):
+    '''
+    Compares the mark-to-market performance of several ledgers traded on the same stock prices.
+    
+    Input:
+        ledger_files (list): paths to the ledger files (text or binary)
+        stock_prices (ndarray): the stock price data the ledgers were traded on, shape (days, N)
+        capital (float, default None): starting capital of every ledger. If None, use the capital
+            each ledger needed to never spend more cash than it had (see capital_used()).
+        periods_per_year (int, default 365): number of days in a year, to annualize the Sharpe ratio
+        table (bool, default True): return the metrics as a DataFrame (needs pandas), or as the
+            dict of arrays of risk_metrics() (one value per ledger) if False
+        
+    Output:
+        metrics (DataFrame/dict): one row per ledger with the metrics of risk_metrics()
+        pnl (ndarray): mark-to-market profit/loss of each ledger on each day, shape (ledgers, days)
+    
+    Example:
+        >>> metrics, pnl = evaluate_ledgers(['random_ledger.txt', 'crossing_average_ledger.txt', 'RSI_ledger.txt'], sim_data)
+    '''
+    
+    # value every ledger at the market prices
+    days = stock_prices.shape[0]
+    pnl = np.zeros((len(ledger_files), days))
+    holdings = np.zeros((len(ledger_files), days))
+    traded = np.zeros((len(ledger_files), days))
+    cash = np.zeros((len(ledger_files), days))
+    for i, ledger_file in enumerate(ledger_files):
+        positions, stock_cash, stock_holdings, traded[i] = mark_to_market(load_ledger(ledger_file), stock_prices)
+        cash[i] = np.sum(stock_cash, axis = 1)
+        holdings[i] = np.sum(stock_holdings, axis = 1)
+        pnl[i] = np.sum(stock_cash + stock_holdings, axis = 1)
+    
+    # get all the metrics at once
+    metrics = risk_metrics(pnl, holdings, traded, capital_used(cash) if capital is None else capital, periods_per_year)
+    
+    if not table:
+        return metrics, pnl
+    
+    # tables need pandas, only imported when they are asked for
+    import pandas as pd
+    return pd.DataFrame(metrics, index = ledger_files), pnl
+
+
+@profiling.timed
+def ledger_summary(ledger_file, stock = False):
+    '''
+    Gets the information reported by read_ledger() as plain numbers and arrays, without
+    pandas or matplotlib (e.g. for batch jobs that only need the numbers).
+    
+    Input:
+        ledger_file (str): path to the ledger file, text or binary (see load_ledger())
+        stock (int, default False): information on this stock is added if a stock number is given.
+        
+    Output:
+        summary (dict):
+            'initial_portfolio' (ndarray): shares of each stock held after the first trading day
+            'final_portfolio' (ndarray): shares of each stock held before the last trading day
+            'number_of_trades' (int): number of trading days after the portfolio was created
+            'total_amount_spent', 'total_amount_earned', 'total_profit_loss' (float): cash spent, earned and their difference
+            'trading_days' (ndarray): the days on which there was at least one trade
+            'profits' (ndarray): cash profit/loss before the first trading day (0) and at the end of each trading day
+        and if stock is given:
+            'bought_dates', 'sold_dates' (list): days on which the stock was bought and sold
+            'earned_from_stock' (float): cash earned (+) or spent (-) on the stock
+        
+    Example:
+        Profit/loss of the crossing averages strategy and how much stock 3 earned.
+        >>> summary = ledger_summary('crossing_average_ledger.txt', stock = 3)
+        >>> summary['total_profit_loss'], summary['earned_from_stock']
+    '''
+    # get the transactions as an array with one row per trade, from a text or a binary ledger
+    ledger_data = load_ledger(ledger_file)
+    
     # calculate how much money was spent and earned
-    # use np.where to find which indices have ledger_data < 0 and > 0
     total_amount_spent = np.abs(np.sum(ledger_data[ledger_data[:, 6] < 0, 6]))
     total_amount_earned = np.sum(ledger_data[(ledger_data[:, 6] > 0), 6])
     
-    # total profit/loss = amount earned - amount spent
-    total_profit_loss = total_amount_earned - total_amount_spent
-            
-    # get state of portfolio before last day
-    # do this by getting the state of the portfolio on each trading day
-    # get different trading days
-    trading_days = np.unique(ledger_data[:, 1])
-    no_of_trading_days = len(trading_days)
-    no_of_stock = np.count_nonzero(ledger_data[:, 1] == 0)
-    # initialize portfolio
-    portfolio = np.zeros((no_of_trading_days, no_of_stock))
-    # get initial portfolio
-    portfolio[0] = np.array(ledger_data[ledger_data[:, 1] == 0, 3])
-    
-    # rows of data where stocks were bought and sold
-    bought_rows = ledger_data[ledger_data[:, 0] == 1]
-    sold_rows = ledger_data[ledger_data[:, 0] == -1]
-    
-    # initialize index
-    i = 1
-    # now loop over each trading day to update portfolio
-    for day in trading_days[1:]:
-        
-        # get rows of data where stocks were bought and sold on the day
-        bought_on_day_rows = bought_rows[bought_rows[:, 1] == day]
-        sold_on_day_rows = sold_rows[sold_rows[:, 1] == day]       
-        
-        # get which stocks were bought and sold on the day
-        if len(bought_on_day_rows) > 0 and len(sold_on_day_rows) > 0:
-            stocks_bought_on_day = np.array(bought_on_day_rows[:, 2], dtype = int)
-            stocks_sold_on_day = np.array(sold_on_day_rows[:, 2], dtype = int)
-            
-            # update portfolio
-            portfolio[i, stocks_bought_on_day] = portfolio[i - 1, stocks_bought_on_day] + bought_on_day_rows[:, 3]           
-            portfolio[i, stocks_sold_on_day] = portfolio[i - 1, stocks_sold_on_day] - sold_on_day_rows[:, 3] 
+    # get state of portfolio on each trading day
+    trading_days, portfolio = portfolio_positions(ledger_data)
+    
+    # cash profit over time: the running total of the amounts, at the last trade of each trading day
+    last_trade_of_day = np.r_[ledger_data[1:, 1] != ledger_data[:-1, 1], True]
+    profits = np.r_[0, np.cumsum(ledger_data[:, 6])[last_trade_of_day]]
+    
+    summary = {'initial_portfolio': portfolio[0].astype(int),
+               # the final portfolio is the one before selling everything on the last day (if there are more than 1 trading days)
+               'final_portfolio': portfolio[-2 if portfolio.shape[0] > 1 else 0].astype(int),
+               'number_of_trades': len(trading_days) - 1,
+               'total_amount_spent': total_amount_spent,
+               'total_amount_earned': total_amount_earned,
+               'total_profit_loss': total_amount_earned - total_amount_spent,
+               'trading_days': trading_days,
+               'profits': profits}
+    
+    # get information on stock of choice
+    if stock != False and len(np.atleast_1d(stock)) > 0:
         
-        # if stocks were only bought on the day
-        elif len(bought_on_day_rows) > 0:
-            stocks_bought_on_day = np.array(bought_on_day_rows[:, 2], dtype = int)
-            
-            #update portfolio
-            portfolio[i] = portfolio[i - 1]
-            portfolio[i, stocks_bought_on_day] += bought_on_day_rows[:, 3]  
+        # rows of data where the stock was bought and sold
+        of_stock = ledger_data[:, 2] == stock
+        summary['bought_dates'] = list(map(int, np.unique(ledger_data[of_stock & (ledger_data[:, 0] == 1), 1])))
+        summary['sold_dates'] = list(map(int, np.unique(ledger_data[of_stock & (ledger_data[:, 0] == -1), 1])))
         
-        # if stocks were only sold on the day
-        elif len(sold_on_day_rows) > 0:
-            stocks_sold_on_day = np.array(sold_on_day_rows[:, 2], dtype = int)
-            
-            #update portfolio
-            portfolio[i] = portfolio[i - 1]
-            portfolio[i, stocks_sold_on_day] += - sold_on_day_rows[:, 3]  
+        # get how much we earned from this stock
+        summary['earned_from_stock'] = np.sum(ledger_data[of_stock, 6])
+    
+    return summary
+
+
+@profiling.timed
+def read_ledger(ledger_file, profit_plot = True, strategy = 'Random Strategy', stock = False):
+    '''
+    Reads and reports useful information from ledger_file.
+    The numbers are calculated by ledger_summary(), this function puts them in tables (and a plot).
+    
+    Input:
+        ledger_file (str): path to the ledger file, text or binary (see load_ledger())
+        profit_plot (boolean, default True): plots profit/loss made over time if True.
+        strategy (str, default 'Random Strategy'): to be displayed on title of plot if True.
+        stock (int, default False): Information of this stock will be returned if stock number is given.
         
-        # otherwise portfolio does not change 
-        else:
-            portfolio[i] = portfolio[i - 1]
+    Output:
+        State of initial and final portfolio, information on portfolio and information of chosen stock.
         
-        # move to next index
-        i = int(i + 1)
-
-       
+    Example:
+        Read the ledger from a crossing average strategy and choose to output information on stock 3 with no plot.
+        Returns tables of initial portfolio, final portfolio, trading period information, dates stock 3 was bought and sold and the amount earned from stock 3.
+        >>> read_ledger('crossing_average_ledger.txt', profit_plot = False, strategy = 'Momentum', stock = 3)
+    '''
+    # tables need pandas, only imported when they are asked for
+    import pandas as pd
+    
+    summary = ledger_summary(ledger_file, stock)
+    total_profit_loss = summary['total_profit_loss']
+    
     # put initial and final state of portfolio in tables
-    initial_portfolio = pd.DataFrame(map(int,portfolio[0]), columns = ['No. of Shares (Initial Portfolio)']).transpose()
-    # if there are more than 1 trading days get final portfolio
-    if portfolio.shape[0] > 1:        
-        final_portfolio = pd.DataFrame(map(int, portfolio[-2]), columns = ['No. of Shares (Final Portfolio before selling)']).transpose()
+    initial_portfolio = pd.DataFrame(summary['initial_portfolio'], columns = ['No. of Shares (Initial Portfolio)']).transpose()
+    if len(summary['trading_days']) > 1:
+        final_portfolio = pd.DataFrame(summary['final_portfolio'], columns = ['No. of Shares (Final Portfolio before selling)']).transpose()
     # otherwise it is the same as initial portfolio
     else:
         final_portfolio = initial_portfolio
     
-        
     # option for user to plot the portfolio profits
-    if profit_plot == True:        
-        # calculate profit over time
-        profits = np.zeros(no_of_trading_days + 1)
-        
-        # profits start from 0, then we buy
-        profits[0], profits[1] = 0, ledger_data[0, 6]
-        
-        # initialize index for profit array and loop over each trade
-        profit_idx = 2
-        for row in range(2, no_of_trades + 1):
-            # if trading day is the same, add to profits on that trading day
-            if ledger_data[row - 1, 1] == ledger_data[row - 2, 1]:
-                profits[profit_idx - 1] += ledger_data[row - 1, 6]
-            
-            # otherwise add to profits on next trading day
-            else:
-                profits[profit_idx] = profits[profit_idx - 1] + ledger_data[row - 1, 6]
-                profit_idx += 1
-            
-        # plot the results
-        plt.plot(np.append(-1, trading_days), profits)
+    if profit_plot == True:
+        # plotting needs matplotlib, only imported when a plot is asked for
+        import matplotlib.pyplot as plt
+        import trading.plotting as plotting
+        
+        # decimated to the width of the plot, there can be a point for every day
+        trading_days = summary['trading_days']
+        plotting.plot_lines(summary['profits'], np.append(-1, trading_days))
         plt.hlines(0, -1, trading_days[-1], linestyle = '--', colors = 'r')
         plt.title(f'Cash Profit/Loss using {strategy}\n Total Cash Profit/Loss = ${round(total_profit_loss, 2)}')
         plt.xlabel('Time (days)')
         plt.ylabel('Profit/Loss (+/-)')
         plt.grid()
         plt.show()
-        
     
     # put information in a table using pandas
-    information = pd.DataFrame(np.array([int(no_of_trading_days - 1), round(total_amount_spent, 2), round(total_amount_earned,2), round(total_profit_loss, 2)]), index = ['No. of Trades (after portfolio creation)', 'Total Amount Spent ($)', 'Total Amount Earned ($)', 'Total Profit/Loss (+/-)'], columns = [''])  
-    
-    
+    information = pd.DataFrame(np.array([int(summary['number_of_trades']), round(summary['total_amount_spent'], 2), round(summary['total_amount_earned'], 2), round(total_profit_loss, 2)]), index = ['No. of Trades (after portfolio creation)', 'Total Amount Spent ($)', 'Total Amount Earned ($)', 'Total Profit/Loss (+/-)'], columns = [''])  
     
     # get information on stock of choice
     if stock != False and len(np.atleast_1d(stock)) > 0:
-        
-        # get dates on which stock was bought and sold
-        bought_dates = np.unique(bought_rows[np.where(bought_rows[:, 2] == stock), 1])
-        sold_dates = np.unique(sold_rows[np.where(sold_rows[:, 2] == stock), 1])
-                
-        # get how much we earned from this stock
-        earned_from_stock = np.sum(ledger_data[np.where(ledger_data[:, 2] == stock), 6])
-        
         # return extra information
-        return initial_portfolio, final_portfolio, information, list(map(int, bought_dates)), list(map(int, sold_dates)), earned_from_stock
+        return initial_portfolio, final_portfolio, information, summary['bought_dates'], summary['sold_dates'], summary['earned_from_stock']
     
     else:
         # return general information
-        return initial_portfolio, final_portfolio, information, 
-        
-    
-            
-            
-            
-      
-        
-    
-        
+        return initial_portfolio, final_portfolio, information,
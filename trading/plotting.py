@@ -0,0 +1,279 @@
+# Functions to plot many stocks over long periods quickly.
+# Lines are decimated to about as many points as the plot has pixels, only a few stocks are shown by default,
+# and all the lines of a plot are drawn at once as a LineCollection.
+import warnings
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+
+def select_stocks(stock_prices, k = 10, method = 'representative'):
+    '''
+    Chooses which stocks to plot when there are too many of them, from their total return
+    (last price / first price - 1, -1 for stocks that went bust).
+
+    Input:
+        stock_prices (ndarray): the stock price data, shape (days, N)
+        k (int/None, default 10): number of stocks to choose, all of them if None
+        method (str, default 'representative'): 'top' chooses the k stocks with the best return,
+            'representative' chooses k stocks spread evenly from the worst return to the best one
+
+    Output:
+        stocks (ndarray): the chosen stock numbers in increasing order (all the stocks if N <= k or k is None)
+
+    Example:
+        Choose 5 stocks covering the range of returns.
+        >>> select_stocks(stock_price_data, 5)
+    '''
+    N = stock_prices.shape[1]
+    if k is None or N <= k:
+        return np.arange(N)
+
+    # total return of each stock, prices are NaN once a stock went bust
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        total_return = np.asarray(stock_prices[-1], dtype = float) / np.asarray(stock_prices[0], dtype = float) - 1
+    total_return[~np.isfinite(total_return)] = -1
+
+    # stocks from the worst return to the best
+    order = np.argsort(total_return, kind = 'stable')
+    if method == 'top':
+        return np.sort(order[-k:])
+
+    # evenly spread ranks, always including the worst and the best stocks
+    return np.sort(order[np.unique(np.round(np.linspace(0, N - 1, k)).astype(int))])
+
+
+def lttb(y, max_points, x = None):
+    '''
+    Largest-Triangle-Three-Buckets downsampling of several lines at once. The first and last points
+    are kept, the others are cut into max_points - 2 buckets, and in each bucket the point making the
+    largest triangle with the point kept in the previous bucket and the average of the next bucket is kept.
+    This keeps the shape of the lines (peaks and troughs) with few points. NaN values are only kept
+    if their whole bucket is NaN.
+
+    Input:
+        y (ndarray): values of the lines, shape (days, N)
+        max_points (int): number of points to keep on each line (at least 3)
+        x (ndarray, default None): x coordinate of each day, shape (days,), day numbers if None
+
+    Output:
+        indices (ndarray): the days kept on each line, shape (max_points, N) (all the days if there are
+            no more than max_points)
+
+    Example:
+        Keep 500 points of each of a 5-year MA.
+        >>> indices = lttb(moving_average(stock_price_data, 200), 500)
+        >>> values = np.take_along_axis(moving_average(stock_price_data, 200), indices, axis = 0)
+    '''
+    days, N = y.shape
+    if days <= max_points or max_points < 3:
+        return np.broadcast_to(np.arange(days)[:, None], (days, N)).copy()
+    x = np.arange(days, dtype = float) if x is None else np.asarray(x, dtype = float)
+
+    # bucket b covers days bounds[b] to bounds[b + 1] - 1, the last bucket is the last day on its own
+    bounds = np.r_[np.floor(np.linspace(1, days - 1, max_points - 1)).astype(int), days]
+
+    indices = np.zeros((max_points, N), dtype = int)
+    indices[-1] = days - 1
+    columns = np.arange(N)
+    for b in range(max_points - 2):
+        start, end = bounds[b], bounds[b + 1]
+
+        # average point of the next bucket
+        next_x = np.mean(x[end:bounds[b + 2]])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category = RuntimeWarning)
+            next_y = np.nanmean(y[end:bounds[b + 2]], axis = 0)
+
+        # area of the triangle made by the previous point kept, each point of the bucket and the next average
+        previous = indices[b]
+        previous_x, previous_y = x[previous], y[previous, columns]
+        area = np.abs((previous_x - next_x) * (y[start:end] - previous_y) - (previous_x - x[start:end, None]) * (next_y - previous_y))
+
+        # NaN areas are never the largest
+        area[np.isnan(area)] = -1
+        indices[b + 1] = start + np.argmax(area, axis = 0)
+
+    return indices
+
+
+def min_max(y, max_points):
+    '''
+    Min-max downsampling of several lines at once: the days are cut into max_points // 2 buckets,
+    and the smallest and largest values of each bucket are kept (in the order of the days).
+    Faster than lttb() and never misses a peak, but needs twice as many points for the same look.
+
+    Input:
+        y (ndarray): values of the lines, shape (days, N)
+        max_points (int): number of points to keep on each line
+
+    Output:
+        indices (ndarray): the days kept on each line, shape (2 * (max_points // 2), N) (all the days
+            if there are no more than max_points)
+
+    Example:
+        >>> indices = min_max(stock_price_data, 1000)
+    '''
+    days, N = y.shape
+    number_of_buckets = max_points // 2
+    if days <= max_points or number_of_buckets < 1:
+        return np.broadcast_to(np.arange(days)[:, None], (days, N)).copy()
+
+    # buckets of the same length, the last one padded with the last day
+    bucket_length = - (- days // number_of_buckets)
+    number_of_buckets = - (- days // bucket_length)
+    padded = np.minimum(np.arange(number_of_buckets * bucket_length), days - 1)
+    buckets = y[padded].reshape(number_of_buckets, bucket_length, N)
+
+    # smallest and largest value of each bucket, NaN are neither
+    nan = np.isnan(buckets)
+    smallest = np.argmin(np.where(nan, np.inf, buckets), axis = 1)
+    largest = np.argmax(np.where(nan, - np.inf, buckets), axis = 1)
+
+    # keep both, the earliest first
+    start = (np.arange(number_of_buckets) * bucket_length)[:, None]
+    first, second = np.minimum(smallest, largest) + start, np.maximum(smallest, largest) + start
+    indices = np.stack([first, second], axis = 1).reshape(2 * number_of_buckets, N)
+    return np.minimum(indices, days - 1)
+
+
+def plot_lines(y, x = None, ax = None, max_points = None, method = 'lttb', colors = None, **kwargs):
+    '''
+    Draws several lines at once as one LineCollection, each line decimated to max_points points.
+
+    Input:
+        y (ndarray): values of the lines, shape (days, N), or (days,) for a single line
+        x (ndarray, default None): x coordinate of each day, shape (days,), day numbers if None
+        ax (Axes, default None): where to draw, the current axes if None
+        max_points (int, default None): number of points of each line, twice the width of the axes
+            in pixels if None
+        method (str, default 'lttb'): 'lttb' (see lttb()), 'min_max' (see min_max()) or None to draw all the points
+        colors (list, default None): color of each line, the default color cycle if None
+        kwargs: other arguments of LineCollection, e.g. linestyle or linewidth
+
+    Output:
+        lines (LineCollection): the lines drawn
+
+    Example:
+        Draw the prices of all the stocks.
+        >>> plot_lines(stock_price_data)
+    '''
+    ax = plt.gca() if ax is None else ax
+    y = np.asarray(y).reshape(len(y), -1)
+    days, N = y.shape
+    x = np.arange(days) if x is None else np.asarray(x)
+
+    # about two points for each pixel across the axes
+    if max_points is None:
+        max_points = max(2 * int(ax.get_window_extent().width), 3)
+
+    # days kept on each line
+    if method == 'lttb':
+        indices = lttb(y, max_points, x)
+    elif method == 'min_max':
+        indices = min_max(y, max_points)
+    else:
+        indices = np.broadcast_to(np.arange(days)[:, None], (days, N))
+
+    # one (points, 2) array of coordinates per line
+    segments = np.stack([x[indices].T, np.take_along_axis(y, indices, axis = 0).T], axis = -1).astype(float)
+
+    if colors is None:
+        colors = [f'C{i % 10}' for i in range(N)]
+    lines = LineCollection(segments, colors = colors, **kwargs)
+    ax.add_collection(lines)
+    ax.autoscale_view()
+
+    return lines
+
+
+def stock_legend(ax, stocks, styles = {}, style_color = 'k'):
+    '''
+    Adds a legend with the color of each stock, and what each line style shows.
+    The stocks are left out if there are more than 10 of them, as the colors repeat after 10.
+
+    Input:
+        ax (Axes): the axes of the plot
+        stocks (ndarray): the stock numbers of the lines, in the order they were drawn
+        styles (dict, default {}): label of each line style, e.g. {'-': 'Price', '--': '200-day MA'}
+        style_color (str, default 'k'): color of the line styles in the legend
+    '''
+    handles = [Line2D([], [], color = f'C{i}', label = f'Stock {stock}') for i, stock in enumerate(stocks)] if len(stocks) <= 10 else []
+    handles += [Line2D([], [], color = style_color, linestyle = style, label = label) for style, label in styles.items()]
+    ax.legend(handles = handles)
+
+
+def plot_crossing_averages(stock_prices, n_day_MA, m_day_MA, n, m, k = 10, method = 'representative', ax = None, max_points = None):
+    '''
+    Plots the prices and moving averages of the crossing averages strategy (of at most k stocks, all of them if k is None).
+
+    Input:
+        stock_prices (ndarray): the stock price data, shape (days, N)
+        n_day_MA, m_day_MA (ndarray): the slow and fast moving averages, shape (days, N)
+        n, m (int): periods of the moving averages
+        k (int/None, default 10): maximum number of stocks to plot, chosen with select_stocks(), all of them if None
+        method (str, default 'representative'): how to choose the stocks, see select_stocks()
+        ax (Axes, default None): where to draw, the current axes if None
+        max_points (int, default None): number of points of each line, see plot_lines()
+
+    Output:
+        ax (Axes): the axes of the plot
+
+    Example:
+        >>> signals, n_day_MA, m_day_MA = crossing_averages_signals(stock_price_data, 5, 200, 50)
+        >>> plot_crossing_averages(stock_price_data, n_day_MA, m_day_MA, 200, 50)
+    '''
+    ax = plt.gca() if ax is None else ax
+    stocks = select_stocks(stock_prices, k, method)
+
+    # price solid, slow MA dashed, fast MA dotted, one color per stock
+    for values, style in [(stock_prices, '-'), (n_day_MA, '--'), (m_day_MA, ':')]:
+        plot_lines(values[:, stocks], ax = ax, max_points = max_points, linestyle = style)
+
+    stock_legend(ax, stocks, {'-': 'Stock Price', '--': f'{n}-day MA', ':': f'{m}-day MA'})
+    ax.set_xlabel('Time (days)')
+    ax.set_ylabel('Price ($)')
+    ax.set_title(f'{n}-day MA vs {m}-day MA')
+    ax.grid()
+    return ax
+
+
+def plot_oscillator(oscillator, osc_type, lower, upper, n, stock_prices = None, k = 10, method = 'representative', ax = None, max_points = None):
+    '''
+    Plots the oscillator of the momentum strategy (of at most k stocks, all of them if k is None) with its thresholds.
+
+    Input:
+        oscillator (ndarray): the oscillator of each stock, shape (days, N)
+        osc_type (str): name of the oscillator, e.g. 'stochastic' or 'RSI'
+        lower, upper (float): the thresholds
+        n (int): period of the oscillator, the thresholds are drawn from day n
+        stock_prices (ndarray, default None): the stock price data, used to choose the stocks
+            with select_stocks() (the first k stocks if None)
+        k (int/None, default 10): maximum number of stocks to plot, all of them if None
+        method (str, default 'representative'): how to choose the stocks, see select_stocks()
+        ax (Axes, default None): where to draw, the current axes if None
+        max_points (int, default None): number of points of each line, see plot_lines()
+
+    Output:
+        ax (Axes): the axes of the plot
+
+    Example:
+        >>> signals, oscillator = momentum_signals(stock_price_data, 'RSI', 0.2, 0.8)
+        >>> plot_oscillator(oscillator, 'RSI', 0.2, 0.8, 7, stock_price_data)
+    '''
+    ax = plt.gca() if ax is None else ax
+    if stock_prices is not None:
+        stocks = select_stocks(stock_prices, k, method)
+    else:
+        stocks = np.arange(oscillator.shape[1] if k is None else min(k, oscillator.shape[1]))
+
+    plot_lines(oscillator[:, stocks], ax = ax, max_points = max_points)
+    ax.hlines([upper, lower], n, oscillator.shape[0], colors = 'r', linestyles = '--')
+
+    stock_legend(ax, stocks, {'--': 'Upper and Lower'}, 'r')
+    ax.set_xlabel('Time (days)')
+    ax.set_ylabel('Value')
+    ax.set_title(f'{osc_type} Oscillator, Upper Threshold = {upper}, Lower Threshold = {lower}')
+    ax.grid()
+    return ax
@@ -1,5 +1,211 @@
 # Functions to process transactions.
+import os
+import contextlib
 import numpy as np
+import trading.profiling as profiling
+
+
+# Binary ledger format: an 8-byte header followed by one fixed-width record per transaction,
+# so that new transactions can be appended and the whole ledger opened with np.memmap.
+# The type is 1 for 'buy' and -1 for 'sell'.
+LEDGER_HEADER = b'\x93LEDGER1'
+LEDGER_DTYPE = np.dtype([('type', 'i1'), ('day', '<i4'), ('stock', '<i4'), ('shares', '<f8'),
+                         ('price', '<f8'), ('fees', '<f8'), ('amount', '<f8')])
+
+
+def is_binary_ledger(ledger_file):
+    '''
+    Checks whether a ledger file is in the binary format, by looking at its header.
+    
+    Input:
+        ledger_file (str): path to the ledger file
+    
+    Output:
+        binary (bool): True for a binary ledger, False for a text ledger
+    
+    Example:
+        >>> is_binary_ledger('random_ledger.txt')
+        False
+    '''
+    with open(ledger_file, 'rb') as file:
+        return file.read(len(LEDGER_HEADER)) == LEDGER_HEADER
+
+
+def check_ledger_format(ledger_file, binary):
+    '''
+    Checks that transactions in a given format can be appended to a ledger file: it must not exist,
+    be empty, or already be in that format. Appending records to a text ledger (or lines to a binary
+    ledger) would make a file that neither format can read.
+    
+    Input:
+        ledger_file (str): path to the ledger file
+        binary (bool): True to append binary records, False to append text lines
+    
+    Output: None, raises a ValueError if the ledger is in the other format.
+    
+    Example:
+        >>> check_ledger_format('random_ledger.txt', binary = True)
+        ValueError: random_ledger.txt is a text ledger, binary transactions can't be appended to it
+    '''
+    if os.path.exists(ledger_file) and os.path.getsize(ledger_file) > 0 and is_binary_ledger(ledger_file) != binary:
+        existing, new = ('binary', 'text') if not binary else ('text', 'binary')
+        raise ValueError(f'{ledger_file} is a {existing} ledger, {new} transactions can\'t be appended to it')
+
+
+def read_binary_ledger(ledger_file):
+    '''
+    Opens a binary ledger as a memory-mapped structured array with dtype LEDGER_DTYPE,
+    without reading it into memory.
+    
+    Input:
+        ledger_file (str): path to the binary ledger file
+    
+    Output:
+        transactions (ndarray): one record per transaction, read-only, with fields
+            'type', 'day', 'stock', 'shares', 'price', 'fees' and 'amount'
+    
+    Example:
+        Total amount earned from stock 3.
+        >>> transactions = read_binary_ledger('random_ledger.bin')
+        >>> np.sum(transactions['amount'][transactions['stock'] == 3])
+    '''
+    # np.memmap cannot map an empty ledger
+    number_of_transactions = (os.path.getsize(ledger_file) - len(LEDGER_HEADER)) // LEDGER_DTYPE.itemsize
+    if number_of_transactions == 0:
+        return np.zeros(0, dtype = LEDGER_DTYPE)
+    
+    return np.memmap(ledger_file, dtype = LEDGER_DTYPE, mode = 'r', offset = len(LEDGER_HEADER),
+                     shape = (number_of_transactions,))
+
+
+class LedgerWriter:
+    '''
+    Writes transactions to a ledger file in bulk instead of opening and closing the file for every trade.
+    Transactions are kept in memory, one list per column, and written out every flush_size transactions
+    and when the writer is closed. The lines are exactly the same as the ones written by log_transaction().
+    With binary = True, the transactions are written as LEDGER_DTYPE records instead (see read_binary_ledger()).
+    
+    A LedgerWriter can be passed instead of a file name as ledger_file to log_transaction(), buy(), sell()
+    and create_portfolio(), and as ledger to every strategy.
+    
+    Input:
+        ledger_file (str): path to the ledger file, transactions are appended if it already exists
+            (it must then be in the same format, see check_ledger_format())
+        flush_size (int, default 10000): number of transactions kept in memory before writing them
+        fsync (str, default 'never'): when to force the written transactions onto the disk with os.fsync,
+            'never', 'flush' (every time transactions are written) or 'close' (once, when closing)
+        binary (bool, default False): write a binary ledger instead of a text ledger
+    
+    Example:
+        Run two strategies on the same data, writing each ledger in bulk.
+        >>> with LedgerWriter('random_ledger.txt') as ledger:
+        ...     strategy.random(sim_data, ledger = ledger)
+        >>> with LedgerWriter('crossing_average_ledger.txt', fsync = 'close') as ledger:
+        ...     strategy.crossing_averages(sim_data, ledger = ledger)
+    '''
+    
+    def __init__(self, ledger_file, flush_size = 10000, fsync = 'never', binary = False):
+        self.ledger_file = ledger_file
+        self.flush_size = flush_size
+        self.fsync = fsync
+        self.binary = binary
+        
+        # open the file once, 'a' creates it if it doesn't exist and appends to it otherwise
+        check_ledger_format(ledger_file, binary)
+        self.file = open(ledger_file, 'ab' if binary else 'a')
+        
+        # a new binary ledger starts with its header
+        if binary and self.file.tell() == 0:
+            self.file.write(LEDGER_HEADER)
+        
+        # columns of the transactions not written yet
+        self.columns = [[] for _ in range(7)]
+    
+    def log(self, transaction_type, date, stock, number_of_shares, price, fees, amount):
+        '''
+        Keeps one transaction in memory, and writes out all the transactions kept once there are flush_size of them.
+        '''
+        for column, value in zip(self.columns, (transaction_type, date, stock, number_of_shares, price, fees, amount)):
+            column.append(value)
+        
+        if len(self.columns[0]) >= self.flush_size:
+            self.flush()
+    
+    def log_many(self, transaction_types, dates, stocks, numbers_of_shares, prices, fees, amounts):
+        '''
+        Keeps many transactions in memory at once, given as one list (or 1D array) per column.
+        The transactions are written out once there are flush_size of them or more.
+        '''
+        for column, values in zip(self.columns, (transaction_types, dates, stocks, numbers_of_shares, prices, fees, amounts)):
+            column.extend(values)
+        
+        if len(self.columns[0]) >= self.flush_size:
+            self.flush()
+    
+    @profiling.timed
+    def flush(self):
+        '''
+        Writes all the transactions kept in memory to the ledger file in one go.
+        '''
+        # binary records, one column at a time
+        if len(self.columns[0]) > 0 and self.binary:
+            records = np.zeros(len(self.columns[0]), dtype = LEDGER_DTYPE)
+            records['type'] = np.where(np.array(self.columns[0]) == 'buy', 1, -1)
+            for name, column in zip(LEDGER_DTYPE.names[1:], self.columns[1:]):
+                records[name] = column
+            self.file.write(records.tobytes())
+            profiling.count('ledger_bytes', records.nbytes)
+            self.columns = [[] for _ in range(7)]
+        
+        # text lines
+        elif len(self.columns[0]) > 0:
+            text = ''.join([f'{transaction_type}, {date}, {stock}, {number_of_shares}, {price}, {fees}, {amount} \n'
+                            for transaction_type, date, stock, number_of_shares, price, fees, amount in zip(*self.columns)])
+            self.file.write(text)
+            profiling.count('ledger_bytes', len(text))
+            self.columns = [[] for _ in range(7)]
+        
+        self.file.flush()
+        if self.fsync == 'flush':
+            os.fsync(self.file.fileno())
+    
+    def close(self):
+        '''
+        Writes the remaining transactions and closes the ledger file.
+        '''
+        if not self.file.closed:
+            self.flush()
+            if self.fsync == 'close':
+                os.fsync(self.file.fileno())
+            self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+@contextlib.contextmanager
+def open_ledger(ledger):
+    '''
+    Gives a LedgerWriter for a ledger given either as a path or as a LedgerWriter.
+    A path gets its own LedgerWriter, closed at the end of the with block. A LedgerWriter is
+    used as it is, and left open for the caller.
+    
+    Input:
+        ledger (str/LedgerWriter): path to the ledger file, or a LedgerWriter
+    
+    Example:
+        >>> with open_ledger('ledger.txt') as ledger:
+        ...     buy(21, 7, 1000, sim_data, 30, portfolio, ledger)
+    '''
+    if isinstance(ledger, LedgerWriter):
+        yield ledger
+    else:
+        with LedgerWriter(ledger) as writer:
+            yield writer
+
 
 def log_transaction(transaction_type, date, stock, number_of_shares, price, fees, ledger_file):
     '''
@@ -12,7 +218,7 @@ def log_transaction(transaction_type, date, stock, number_of_shares, price, fees
         number_of_shares (int): the number of shares bought or sold
         price (float): the price of a share at the time of the transaction
         fees (float): transaction fees (fixed amount per transaction, independent of the number of shares)
-        ledger_file (str): path to the ledger file
+        ledger_file (str/LedgerWriter): path to the ledger file, or a LedgerWriter to log the transaction in bulk
     
     Output: returns None.
         Writes one line in the ledger file to record a transaction with the input information.
@@ -26,6 +232,7 @@ def log_transaction(transaction_type, date, stock, number_of_shares, price, fees
         buy,5,2,10,100.00,-1050.00
             >>> log_transaction('buy', 5, 2, 10, 100, 50, 'ledger.txt')
     '''
+    profiling.count('log_transaction')
     
     # log transaction if we buy
     if transaction_type == 'buy':
@@ -33,15 +240,21 @@ def log_transaction(transaction_type, date, stock, number_of_shares, price, fees
         # how much do we spend
         amount_spent = - (number_of_shares * price) - fees
         
-        # first open the ledger_file, if it does not exist we create a new empty file
-        # use 'a' as second argument as we wish to append to the file (creates and append if it doesn't exist)
-        file = open(ledger_file, 'a')
-    
-        # now append the contents to the file
-        file.write(f'{transaction_type}, {date}, {stock}, {number_of_shares}, {price}, {fees}, {amount_spent} \n')
+        # a LedgerWriter keeps the transaction and writes it later with others
+        if isinstance(ledger_file, LedgerWriter):
+            ledger_file.log(transaction_type, date, stock, number_of_shares, price, fees, amount_spent)
+        
+        else:
+            # first open the ledger_file, if it does not exist we create a new empty file
+            # use 'a' as second argument as we wish to append to the file (creates and append if it doesn't exist)
+            file = open(ledger_file, 'a')
+        
+            # now append the contents to the file
+            written = file.write(f'{transaction_type}, {date}, {stock}, {number_of_shares}, {price}, {fees}, {amount_spent} \n')
+            profiling.count('ledger_bytes', written)
 
-        #close the file to any more changes
-        file.close()
+            #close the file to any more changes
+            file.close()
         
     # log transaction if we sell
     elif transaction_type == 'sell':
@@ -52,15 +265,21 @@ def log_transaction(transaction_type, date, stock, number_of_shares, price, fees
             # how much do we earn
             amount_spent = number_of_shares * price - fees
             
-            # first open the ledger_file, if it does not exist we create a new empty file
-            # use 'a' as second argument as we wish to append to the file (create and append if it doesn't exist)
-            file = open(ledger_file, 'a')
+            # a LedgerWriter keeps the transaction and writes it later with others
+            if isinstance(ledger_file, LedgerWriter):
+                ledger_file.log(transaction_type, date, stock, number_of_shares, price, fees, amount_spent)
+            
+            else:
+                # first open the ledger_file, if it does not exist we create a new empty file
+                # use 'a' as second argument as we wish to append to the file (create and append if it doesn't exist)
+                file = open(ledger_file, 'a')
 
-            # now append the contents to the file
-            file.write(f'{transaction_type}, {date}, {stock}, {number_of_shares}, {price}, {fees}, {amount_spent} \n')
+                # now append the contents to the file
+                written = file.write(f'{transaction_type}, {date}, {stock}, {number_of_shares}, {price}, {fees}, {amount_spent} \n')
+                profiling.count('ledger_bytes', written)
 
-            #close the file to any more changes
-            file.close()
+                #close the file to any more changes
+                file.close()
     
 
 def buy(date, stock, available_capital, stock_prices, fees, portfolio, ledger_file):
@@ -76,7 +295,7 @@ def buy(date, stock, available_capital, stock_prices, fees, portfolio, ledger_fi
         stock_prices (ndarray): the stock price data
         fees (float): total transaction fees (fixed amount per transaction)
         portfolio (list): our current portfolio
-        ledger_file (str): path to the ledger file
+        ledger_file (str/LedgerWriter): path to the ledger file, or a LedgerWriter
     
     Output: None
 
@@ -84,6 +303,7 @@ def buy(date, stock, available_capital, stock_prices, fees, portfolio, ledger_fi
         Spend at most 1000 to buy shares of stock 7 on day 21, with fees 30:
             >>> buy(21, 7, 1000, sim_data, 30, portfolio)
     '''
+    profiling.count('buy')
     
     # if the price is NaN we do not buy
     if np.isnan(stock_prices[date, stock]) == False:
@@ -112,7 +332,7 @@ def sell(date, stock, stock_prices, fees, portfolio, ledger_file):
         stock_prices (ndarray): the stock price data
         fees (float): transaction fees (fixed amount per transaction)
         portfolio (list): our current portfolio
-        ledger_file (str): path to the ledger file
+        ledger_file (str/LedgerWriter): path to the ledger file, or a LedgerWriter
     
     Output: None
 
@@ -120,6 +340,8 @@ def sell(date, stock, stock_prices, fees, portfolio, ledger_file):
         To sell all our shares of stock 1 on day 8, with fees 20:
             >>> sell(8, 1, sim_data, 20, portfolio)
     '''
+    profiling.count('sell')
+    
     # if stock price is NaN we have no stock to sell
     if np.isnan(stock_prices[date, stock]) == False:
         
@@ -134,6 +356,7 @@ def sell(date, stock, stock_prices, fees, portfolio, ledger_file):
         portfolio[stock] = 0
     
 
+@profiling.timed
 def create_portfolio(available_amounts, stock_prices, fees, ledger_file):
     '''
     Create a portfolio by buying a given number of shares of each stock.
@@ -143,6 +366,7 @@ def create_portfolio(available_amounts, stock_prices, fees, ledger_file):
             purchase for each stock (this should cover fees)
         stock_prices (ndarray): the stock price data
         fees (float): transaction fees (fixed amount per transaction)
+        ledger_file (str/LedgerWriter): path to the ledger file, or a LedgerWriter
     
     Output:
         portfolio (list): our initial portfolio
@@ -162,17 +386,206 @@ def create_portfolio(available_amounts, stock_prices, fees, ledger_file):
     # we create this portfolio on day 0
     start_date = 0
     
-    # initialize portfolio
-    portfolio = np.zeros(N)
+    # initialize portfolio (whole numbers of shares)
+    portfolio = np.zeros(N, dtype = np.int64)
     
-    # loop through each stock to buy
-    for stock in range(N):
-        
-        # buy stock using the buy function
-        buy(start_date, stock, available_amounts[stock], stock_prices, fees, portfolio, ledger_file)
+    # loop through each stock to buy, writing all the purchases to the ledger at once
+    with open_ledger(ledger_file) as ledger:
+        for stock in range(N):
+            
+            # buy stock using the buy function
+            buy(start_date, stock, available_amounts[stock], stock_prices, fees, portfolio, ledger)
     
     # return the initial portfolio with integer values 
     return list(map(int, portfolio))
     
     
 
+
+
+def backtest(signals, stock_prices, amount, fees, ledger_file):
+    '''
+    Runs a strategy given by its trading signals, for all days and stocks at once.
+    The portfolio is created on day 0 by spending amount on each stock (signals on day 0 are ignored),
+    then each day we buy the stocks with signal 1 (or 2) and then sell the stocks with signal -1 (or 2),
+    and on the last day we sell everything that is left. Every trade follows buy() and sell(): we buy
+    floor((amount - fees) / price) shares, we sell all the shares we hold, and we never trade
+    a stock whose price is NaN (its shares are lost). The ledger is exactly the same as calling
+    create_portfolio(), buy() and sell() one trade at a time.
+    
+    Input:
+        signals (ndarray): 1 to buy, -1 to sell, 2 to buy then sell on the same day and 0 to do nothing,
+            for each day and stock, shape (days, N)
+        stock_prices (ndarray): the stock price data, shape (days, N)
+        amount (float): how much we spend on each purchase (must cover fees)
+        fees (float): transaction fees (fixed amount per transaction)
+        ledger_file (str/LedgerWriter/None): path to the ledger file, or a LedgerWriter,
+            or None to keep no ledger
+    
+    Output:
+        positions (ndarray): shares held of each stock at the end of each day, shape (days, N)
+        cash (ndarray): total cash earned (+) or spent (-) up to the end of each day, fees included, shape (days,)
+    
+    Example:
+        Buy every stock on day 10 and sell all of them on day 20.
+        >>> signals = np.zeros(sim_data.shape)
+        >>> signals[10], signals[20] = 1, -1
+        >>> positions, cash = backtest(signals, sim_data, 5000, 20, 'ledger.txt')
+    '''
+    trades, positions = backtest_trades(signals, stock_prices, amount, fees)
+    cash = record_trades(trades, stock_prices.shape[0], fees, ledger_file)
+    
+    return positions, cash
+
+
+def trade_prices(prices):
+    '''
+    Gets the prices of some trades in float64. Prices in a smaller float dtype (see data.price_dtype)
+    are given the fewest decimals that round back to them, e.g. 101.24 for np.float32(101.24) instead
+    of 101.23999786376953, so that trades and ledgers use the prices as they were written.
+    
+    Input:
+        prices (ndarray): prices of the trades
+    
+    Output:
+        prices (ndarray): the same prices in float64
+    
+    Example:
+        >>> trade_prices(np.array([101.24], dtype = np.float32))
+        array([101.24])
+    '''
+    prices = np.asarray(prices)
+    if prices.dtype == np.float64:
+        return prices
+    return prices.astype(str).astype(np.float64)
+
+
+@profiling.timed
+def backtest_trades(signals, stock_prices, amount, fees):
+    '''
+    Finds all the trades of a strategy given by its trading signals, see backtest().
+    Stocks are independent, so the trades of a group of stocks can be found separately
+    from the others and put together with record_trades().
+    
+    Input:
+        signals (ndarray): 1 to buy, -1 to sell, 2 to buy then sell on the same day and 0 to do nothing,
+            for each day and stock, shape (days, N)
+        stock_prices (ndarray): the stock price data, shape (days, N)
+        amount (float): how much we spend on each purchase (must cover fees)
+        fees (float): transaction fees (fixed amount per transaction)
+    
+    Output:
+        trades (dict): arrays with one value per trade (in no particular order): 'day', 'stock',
+            'kind' (0 for a purchase, 1 for a sale, 2 for a sale at the end), 'shares' and 'price'
+        positions (ndarray): shares held of each stock at the end of each day, shape (days, N),
+            in int32 (int64 if the number of shares could be too large)
+    
+    Example:
+        >>> trades, positions = backtest_trades(signals, sim_data, 5000, 20)
+    '''
+    
+    # get number of days and number of stocks, and which prices we can trade at
+    number_of_days, N = stock_prices.shape
+    day_numbers = np.arange(number_of_days, dtype = np.int32 if number_of_days < 2**31 else np.int64)[:, None]
+    tradable = ~np.isnan(stock_prices)
+    
+    # the portfolio is bought on day 0, and everything is sold on the last day after the other trades
+    to_buy = (signals == 1) | (signals == 2)
+    to_buy[0] = True
+    to_sell = (signals == -1) | (signals == 2)
+    to_sell[0] = False
+    sell_at_end = np.zeros(stock_prices.shape, dtype = bool)
+    sell_at_end[-1] = ~to_sell[-1]
+    
+    # shares bought by every purchase, and total shares bought so far
+    buy_days, buy_stocks = np.nonzero(to_buy & tradable)
+    buy_prices = trade_prices(stock_prices[buy_days, buy_stocks])
+    buy_shares = np.floor((amount - fees) / buy_prices)
+    
+    # whole numbers of shares, in int32 unless all the purchases add up to too many shares
+    share_dtype = np.int32 if np.sum(buy_shares) < 2**31 else np.int64
+    total_bought = np.zeros(stock_prices.shape, dtype = share_dtype)
+    total_bought[buy_days, buy_stocks] = buy_shares
+    np.cumsum(total_bought, axis = 0, out = total_bought)
+    
+    # we hold no shares after selling, or after trying to buy at a NaN price.
+    # Find the last day before each day when this happened (-1 if never)
+    emptied = to_sell | sell_at_end | (to_buy & ~tradable)
+    last_emptied = np.maximum.accumulate(np.where(emptied, day_numbers, -1), axis = 0)
+    previous_emptied = np.vstack([np.full((1, N), -1), last_emptied[:-1]])
+    
+    # shares bought before the last time the portfolio was emptied are gone
+    def bought_until(days):
+        return np.where(days >= 0, np.take_along_axis(total_bought, np.maximum(days, 0), axis = 0), 0)
+    
+    held_before_selling = total_bought - bought_until(previous_emptied)
+    positions = total_bought - bought_until(last_emptied)
+    
+    # we sell all the shares we hold, if there are any and the price is not NaN
+    sell_days, sell_stocks = np.nonzero((to_sell | sell_at_end) & tradable & (held_before_selling > 0))
+    sell_prices = trade_prices(stock_prices[sell_days, sell_stocks])
+    sell_shares = held_before_selling[sell_days, sell_stocks]
+    
+    trades = {'day': np.concatenate([buy_days, sell_days]),
+              'stock': np.concatenate([buy_stocks, sell_stocks]),
+              'kind': np.concatenate([np.zeros(len(buy_days), dtype = int), np.where(sell_at_end[sell_days, sell_stocks], 2, 1)]),
+              'shares': np.concatenate([buy_shares, sell_shares]),
+              'price': np.concatenate([buy_prices, sell_prices])}
+    
+    return trades, positions
+
+
+@profiling.timed
+def record_trades(trades, number_of_days, fees, ledger_file):
+    '''
+    Puts trades in the order they are made and logs them in a ledger, see backtest().
+    
+    Input:
+        trades (dict): the trades, as returned by backtest_trades() (the trades of several groups of
+            stocks can be put together, with the stock numbers of the whole portfolio)
+        number_of_days (int): number of days of the strategy
+        fees (float): transaction fees (fixed amount per transaction)
+        ledger_file (str/LedgerWriter/None): path to the ledger file, or a LedgerWriter,
+            or None to keep no ledger
+    
+    Output:
+        cash (ndarray): total cash earned (+) or spent (-) up to the end of each day, fees included, shape (days,)
+    
+    Example:
+        >>> cash = record_trades(trades, sim_data.shape[0], 20, 'ledger.txt')
+    '''
+    
+    # put the transactions in the order they are made: each day buys, then sells, then the final sells,
+    # and in order of stock
+    order = np.lexsort((trades['stock'], trades['kind'], trades['day']))
+    days, stocks, kinds = trades['day'][order], trades['stock'][order], trades['kind'][order]
+    shares, prices = trades['shares'][order], trades['price'][order]
+    
+    # amounts spent (negative) and earned (positive), including fees
+    is_buy = kinds == 0
+    amounts = np.where(is_buy, - (shares * prices) - fees, shares * prices - fees)
+    
+    # the trades made here in place of calling buy() and sell()
+    number_of_buys = int(np.count_nonzero(is_buy))
+    profiling.count('buy', number_of_buys)
+    profiling.count('sell', len(order) - number_of_buys)
+    
+    # log every transaction at once
+    if ledger_file is not None:
+        
+        # shares that were never topped up since day 0 are logged as integers, like create_portfolio() gives them:
+        # these are the sales before the first purchase after day 0
+        first_top_up = np.full(np.max(stocks, initial = -1) + 1, number_of_days)
+        np.minimum.at(first_top_up, stocks[is_buy & (days > 0)], days[is_buy & (days > 0)])
+        as_integer = ~is_buy & (days < first_top_up[stocks])
+        shares_column = shares.tolist()
+        for i in np.nonzero(as_integer)[0]:
+            shares_column[i] = int(shares_column[i])
+        
+        profiling.count('log_transaction', len(order))
+        with open_ledger(ledger_file) as ledger:
+            ledger.log_many(np.where(is_buy, 'buy', 'sell').tolist(), days.tolist(), stocks.tolist(),
+                            shares_column, prices.tolist(), [fees] * len(order), amounts.tolist())
+    
+    # total cash over time
+    return np.cumsum(np.bincount(days, weights = amounts, minlength = number_of_days))
@@ -0,0 +1,158 @@
+# Opt-in instrumentation of the trading package: where the time goes in a backtest, how many trades are made
+# and logged, how many bytes of ledger are written and the peak memory used.
+#
+# Nothing is recorded unless a profile is running, so the instrumented functions only pay for one check:
+#     >>> with profiling.profile() as report:
+#     ...     strategy.crossing_averages(sim_data)
+#     >>> print(report)
+#     >>> report.to_json('profile.json')
+import time
+import json
+import functools
+import contextlib
+import tracemalloc
+
+
+# the report being recorded, None when no profile is running (the default)
+current_report = None
+
+
+class Report:
+    '''
+    What was recorded during a profile (see profile()).
+
+    Attributes:
+        stages (dict): number of calls and total wall time (in seconds) of each instrumented function,
+            e.g. stages['strategy.momentum'] = {'calls': 1, 'seconds': 0.42}. Times include the stages
+            called inside (e.g. strategy.momentum includes indicators.oscillator).
+        counts (dict): number of calls of process.buy(), process.sell() and process.log_transaction()
+            ('buy', 'sell', 'log_transaction', the vectorized backtest counts the trades it makes in their place),
+            bytes of ledger written ('ledger_bytes') and indicator cache hits and misses
+        wall_time (float): total wall time of the profile (in seconds)
+        peak_memory (int): peak memory allocated during the profile (in bytes, measured with tracemalloc),
+            None if memory was not traced
+    '''
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+        self.wall_time = 0.0
+        self.peak_memory = None
+
+    def add_time(self, stage, seconds):
+        '''
+        Records one call of a stage taking seconds.
+        '''
+        if stage not in self.stages:
+            self.stages[stage] = {'calls': 0, 'seconds': 0.0}
+        self.stages[stage]['calls'] += 1
+        self.stages[stage]['seconds'] += seconds
+
+    def as_dict(self):
+        '''
+        Returns the report as a dict of plain Python values, with the slowest stages first.
+        '''
+        stages = sorted(self.stages.items(), key = lambda stage: stage[1]['seconds'], reverse = True)
+        return {'wall_time': self.wall_time, 'peak_memory': self.peak_memory,
+                'stages': {name: dict(values) for name, values in stages}, 'counts': dict(self.counts)}
+
+    def to_json(self, filename = None):
+        '''
+        Returns the report as a JSON string, and writes it to filename if given.
+        '''
+        text = json.dumps(self.as_dict(), indent = 2)
+        if filename is not None:
+            with open(filename, 'w') as file:
+                file.write(text)
+        return text
+
+    def __str__(self):
+        report = self.as_dict()
+        lines = [f'Wall time: {self.wall_time:.3f}s']
+        if self.peak_memory is not None:
+            lines.append(f'Peak memory: {self.peak_memory / 2**20:.1f} MB')
+        lines.append(f'{"Stage":<36} {"Calls":>8} {"Time (s)":>10}')
+        lines += [f'{name:<36} {values["calls"]:>8} {values["seconds"]:>10.4f}' for name, values in report['stages'].items()]
+        lines += [f'{name:<36} {value:>8}' for name, value in report['counts'].items()]
+        return '\n'.join(lines)
+
+
+def timed(function):
+    '''
+    Decorator recording the calls and wall time of a function while a profile is running,
+    as a stage named after its module and name (e.g. 'indicators.moving_average').
+    When no profile is running, the function is called straight away.
+
+    Example:
+        >>> @timed
+        ... def backtest_trades(signals, stock_prices, amount, fees):
+        ...     ...
+    '''
+    stage = function.__module__.replace('trading.', '', 1) + '.' + function.__qualname__
+
+    @functools.wraps(function)
+    def timed_function(*args, **kwargs):
+        report = current_report
+        if report is None:
+            return function(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            report.add_time(stage, time.perf_counter() - start)
+
+    return timed_function
+
+
+def count(name, number = 1):
+    '''
+    Adds number to the count name of the running profile, does nothing if no profile is running.
+
+    Example:
+        >>> count('ledger_bytes', len(text))
+    '''
+    report = current_report
+    if report is not None:
+        report.counts[name] = report.counts.get(name, 0) + number
+
+
+@contextlib.contextmanager
+def profile(trace_memory = True):
+    '''
+    Records what the instrumented functions do inside the with block.
+
+    Input:
+        trace_memory (bool, default True): measure the peak memory with tracemalloc
+            (which makes allocations slower)
+
+    Output:
+        report (Report): filled in during the with block, complete at the end of it
+
+    Example:
+        >>> with profile() as report:
+        ...     strategy.momentum(sim_data, osc_type = 'RSI')
+        >>> report.stages['indicators.oscillator']['seconds'], report.counts['buy'], report.peak_memory
+    '''
+    global current_report
+    report = Report()
+    previous_report = current_report
+
+    # measure the memory used from now on
+    if trace_memory:
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    current_report = report
+    start = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report.wall_time = time.perf_counter() - start
+        current_report = previous_report
+        if trace_memory:
+            report.peak_memory = tracemalloc.get_traced_memory()[1]
+            if not already_tracing:
+                tracemalloc.stop()
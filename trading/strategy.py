@@ -1,10 +1,12 @@
 # Functions to implement our trading strategy.
+import tracemalloc
 import numpy as np
 import trading.process as proc
 import trading.indicators as ind
-import matplotlib.pyplot as plt
+import trading.profiling as profiling
 
-def random(stock_prices, period = 7, amount = 5000, fees = 20, ledger = 'random_ledger.txt'):
+@profiling.timed
+def random(stock_prices, period = 7, amount = 5000, fees = 20, ledger = 'random_ledger.txt', seed = None):
     '''
     Randomly decide, every period, which stocks to purchase, do nothing, or sell (with equal probability). Spend a maximum of amount on every purchase. Records transaction data in given ledger.
 
@@ -14,53 +16,28 @@ def random(stock_prices, period = 7, amount = 5000, fees = 20, ledger = 'random_
         amount (float, default 5000): how much we spend on each purchase
             (must cover fees)
         fees (float, default 20): transaction fees
-        ledger (str, default 'ledger_random.txt'): path to the ledger file
+        ledger (str/LedgerWriter/None, default 'ledger_random.txt'): path to the ledger file, or a LedgerWriter,
+            or None to keep no ledger
+        seed (None/int/SeedSequence/Generator, default None): seed of the random decisions,
+            a fresh unpredictable one is used if None
 
-    Output: None
+    Output:
+        positions (ndarray): shares held of each stock at the end of each day, shape (days, N)
+        cash (ndarray): total cash earned (+) or spent (-) up to the end of each day, fees included
     
     Example:
         Perform random strategy with period 8-days on a given portfolio of stock.
-        Returns None
         >>> random(stock_price_data, 8)
     '''    
-    # get number of stocks and number of days
-    number_of_days, N = stock_prices.shape
-
-    # initialize portfolio
-    portfolio = proc.create_portfolio(N * [amount], stock_prices, fees, ledger)
-    
-    # set default random number generator
-    rng = np.random.default_rng()
+    # trading signals, drawn at random every period
+    signals = random_signals(stock_prices.shape, period, seed)
     
-    # loop over each period, we buy on first day so start from 'periodth' day
-    for day in range(period, number_of_days, period):
-                         
-        # draw integers for each stock, 1 is buy, -1 is sell, 0 do nothing
-        random_array = rng.integers(-1, 2, size = N)
-      
-        # decide which stocks to buy and sell
-        stocks_to_buy = np.where(random_array == 1)[0]
-        stocks_to_sell = np.where(random_array == -1)[0]
-        
-        
-        # if there are stocks to buy, buy them
-        if len(np.atleast_1d(stocks_to_buy)) > 0:
-            for stock in stocks_to_buy:
-                proc.buy(day, stock, amount, stock_prices, fees, portfolio, ledger)
-        
-        # if there are stocks to sell, sell them
-        if len(np.atleast_1d(stocks_to_sell)) > 0:            
-            for stock in stocks_to_sell:                
-                # only sell if we have them
-                if portfolio[stock] > 0:
-                    proc.sell(day, stock, stock_prices, fees, portfolio, ledger)
-
-    # if number is equal to 2 we do nothing and go to next period and sell our portfolio at the end        
-    for stock_number in range(N):
-        proc.sell(number_of_days - 1, stock_number, stock_prices, fees, portfolio, ledger)
+    # buy and sell (only the stocks we have), create the portfolio on day 0 and sell it at the end
+    return proc.backtest(signals, stock_prices, amount, fees, ledger)
     
     
-def crossing_averages(stock_prices, amount = 5000, cool_down_period = 5, n = 200, m = 50, n_weights = [], m_weights = [], plot = False, fees = 20, ledger = 'crossing_average_ledger.txt'):
+@profiling.timed
+def crossing_averages(stock_prices, amount = 5000, cool_down_period = 5, n = 200, m = 50, n_weights = [], m_weights = [], plot = False, fees = 20, ledger = 'crossing_average_ledger.txt', k = 10, method = 'representative'):
     '''
     Decide to buy shares when the m-day moving average crosses the n-day moving average from below, and decide to sell shares when the m-day moving average crosses the n-day mving average from above.
     Records transactions in ledger.
@@ -76,78 +53,41 @@ def crossing_averages(stock_prices, amount = 5000, cool_down_period = 5, n = 200
             to use for the weighted average. If empty, return a non-weighted average.
         m_weights (list, default []): must be of length m if specified. Indicates the weights
             to use for the weighted average. If empty, return a non-weighted average.
-        plot (boolean, default False): Plots moving averages if True.
+        plot (boolean, default False): Plots moving averages if True (of k stocks if there are more).
         fees (float, default 20): transaction fees
-        ledger (str, default 'crossing_average_ledger.txt'): path to the ledger file
+        ledger (str/LedgerWriter/None, default 'crossing_average_ledger.txt'): path to the ledger file, or a LedgerWriter,
+            or None to keep no ledger
+        k (int/None, default 10): maximum number of stocks to plot, all of them if None
+        method (str, default 'representative'): how to choose the stocks to plot, 'representative' or 'top'
+            (see plotting.select_stocks())
         
-    Output: None
+    Output:
+        positions (ndarray): shares held of each stock at the end of each day, shape (days, N)
+        cash (ndarray): total cash earned (+) or spent (-) up to the end of each day, fees included
     
     Example:
         Perform crossing average strategy with FMA period of 50 days and SMA period of 200 days with no weights and no cool_down period on a given portfolio.
-        Returns None.
         >>> crossing_average(stock_price_data, cool_period = 0, n = 200, m = 50)
     '''
-    # get number of stocks and number of days
-    total_days, N = stock_prices.shape
+    # trading signals from the crossing moving averages
+    signals, n_day_MA, m_day_MA = crossing_averages_signals(stock_prices, cool_down_period, n, m, n_weights, m_weights)
     
-    # initialize portfolio
-    portfolio = proc.create_portfolio(N * [amount], stock_prices, fees, ledger)
+    # buy and sell, create the portfolio on day 0 and sell it at the end
+    positions, cash = proc.backtest(signals, stock_prices, amount, fees, ledger)
     
-    # initialize MA arrays, both must have same size to match up the dates
-    m_day_MA = np.zeros(stock_prices.shape)
-    n_day_MA = np.zeros(stock_prices.shape)
-    
-    # initialize cool down matrix which indicates a cool down period
-    cool_down_matrix = np.zeros(stock_prices.shape)
-    
-    # get n_day MA
-    n_day_MA = ind.moving_average(stock_prices, n, n_weights) 
-
-    # get m_day MA
-    m_day_MA = ind.moving_average(stock_prices, m, m_weights) 
-    
-    # now loop through each day starting from day n + 1 (index n) and buy, sell as appropriate
-    for day in range(n, total_days):
-            
-        # find stocks that cross from below and check that they are out of cool down period
-        stocks_to_buy = np.where((m_day_MA[day - 1] < n_day_MA[day - 1]) & (m_day_MA[day] > n_day_MA[day]) & (cool_down_matrix[(day - cool_down_period - 1)] != 1))[0]
-        # if there are stocks to buy, buy them
-        if np.any(stocks_to_buy):
-            for stock in stocks_to_buy:
-                proc.buy(day, stock, amount, stock_prices, fees, portfolio, ledger)
-
-            # indicate not to buy during cool down period
-            cool_down_matrix[(day - cool_down_period) : day, stocks_to_buy] = 1
-
-        # if it crosses from above, we sell
-        # find stocks that cross from above and check that they are out of cool down period
-        stocks_to_sell = np.where((m_day_MA[day - 1] > n_day_MA[day - 1]) & (m_day_MA[day] < n_day_MA[day]) & (cool_down_matrix[(day - cool_down_period - 1)] != 1))[0]
-        # if there are stocks to sell, buy them
-        if np.any(stocks_to_sell):
-            for stock in stocks_to_sell:
-                proc.sell(day, stock, stock_prices, fees, portfolio, ledger)
-
-            # indicate not to buy during cool down period
-            cool_down_matrix[(day - cool_down_period) : day, stocks_to_sell] = 1
-    
-    # sell portfolio at end
-    for stock_number in range(N):
-        proc.sell(total_days - 1, stock_number, stock_prices, fees, portfolio, ledger)
-    
-    # option to see plot
+    # option to see plot (of k stocks at most, see plotting.plot_crossing_averages())
     if plot == True:
-        for i in range(N):            
-            plt.plot(stock_prices[:, i], label = f'Stock Price {i}')
-            plt.plot(n_day_MA[:, i], label = f'Stock {i} {n}-day MA')
-            plt.plot(m_day_MA[:, i], label = f'Stock {i} {m}-day MA')
-        plt.legend()
-        plt.xlabel('Time (days)')
-        plt.ylabel('Price ($)')
-        plt.title(f'{n}-day MA vs {m}-day MA')
-        plt.grid()
+        # plotting needs matplotlib, only imported when a plot is asked for
+        import matplotlib.pyplot as plt
+        import trading.plotting as plotting
+        
+        plotting.plot_crossing_averages(stock_prices, n_day_MA, m_day_MA, n, m, k, method)
         plt.show()
     
-def momentum(stock_prices, osc_type = 'stochastic', lower = 0.25, upper = 0.75, n = 7, wait_time = 3, plot = False, smoothing_period = False, amount = 5000, fees = 20, ledger = 'momentum_ledger.txt'):
+    return positions, cash
+    
+@profiling.timed
+def momentum(stock_prices, osc_type = 'stochastic', lower = 0.25, upper = 0.75, n = 7, wait_time = 3, plot = False, smoothing_period = False, amount = 5000, fees = 20, ledger = 'momentum_ledger.txt', k = 10, method = 'representative'):
     '''
     Decide to sell shares in a portfolio when chosen oscillator is above upper threshold and buy when below lower threshold.
     Only buys/sells after wait_time (days) and only buys/sells once every time threshold is crossed.
@@ -159,104 +99,339 @@ def momentum(stock_prices, osc_type = 'stochastic', lower = 0.25, upper = 0.75,
         upper (float, default 0.75): upper threshold
         n (int, default 7): period of the oscillator (in days).
         wait_time (int, default 10): period (in days) to wait before buying/selling stock if price remains below/above threshold.               
-        plot (boolean, default False): shows plot of oscillator if True.
+        plot (boolean, default False): shows plot of oscillator if True (of k stocks if there are more).
         smoothing_period (int, default = False): period of moving average to be applied to the oscillator.
         amount (float, default 5000): how much we spend on each purchase
             (must cover fees)
         
         fees (float, default 20): transaction fees
-        ledger (str, default 'crossing_average_ledger.txt'): path to the ledger file
+        ledger (str/LedgerWriter/None, default 'crossing_average_ledger.txt'): path to the ledger file, or a LedgerWriter,
+            or None to keep no ledger
+        k (int/None, default 10): maximum number of stocks to plot, all of them if None
+        method (str, default 'representative'): how to choose the stocks to plot, 'representative' or 'top'
+            (see plotting.select_stocks())
         
-    Output: None
+    Output:
+        positions (ndarray): shares held of each stock at the end of each day, shape (days, N)
+        cash (ndarray): total cash earned (+) or spent (-) up to the end of each day, fees included
     
     Example:
         Perform momentum strategy with 7-day RSI with thresholds 0.2 and 0.8, 4-day wait time and no smoothing period on a given portfolio.
-        Returns None
         >>> momentum(stock_price_data, osc_type = 'RSI', lower = 0.2, upper = 0.8, wait_time = 4)
     '''
     
-    # get number of stocks and number of days
-    total_days, N = stock_prices.shape
+    # trading signals from the oscillator
+    signals, oscillator = momentum_signals(stock_prices, osc_type, lower, upper, n, wait_time, smoothing_period)
+    
+    # buy and sell, create the portfolio on day 0 and sell it at the end
+    positions, cash = proc.backtest(signals, stock_prices, amount, fees, ledger)
+    
+    # option to plot oscillator with thresholds (of k stocks at most, see plotting.plot_oscillator())
+    if plot == True:
+        # plotting needs matplotlib, only imported when a plot is asked for
+        import trading.plotting as plotting
+        
+        plotting.plot_oscillator(oscillator, osc_type, lower, upper, n, stock_prices, k, method)
+    
+    return positions, cash
+
+
+@profiling.timed
+def random_signals(shape, period = 7, seed = None):
+    '''
+    Trading signals of the random strategy: every period, each stock is bought (1), sold (-1)
+    or left alone (0) with equal probability.
+    
+    Input:
+        shape (tuple): number of days and number of stocks
+        period (int, default 7): how often we buy/sell (days)
+        seed (None/int/SeedSequence/Generator, default None): seed of the random decisions,
+            a fresh unpredictable one is used if None
+    
+    Output:
+        signals (ndarray): 1 to buy, -1 to sell and 0 to do nothing, shape (days, N)
+    
+    Example:
+        >>> signals = random_signals(stock_price_data.shape, 8, seed = 1)
+    '''
+    # get number of days and number of stocks
+    number_of_days, N = shape
+
+    # trading signals, 1 is buy, -1 is sell, 0 do nothing
+    signals = np.zeros((number_of_days, N), dtype = np.int8)
+    
+    # set random number generator from the seed
+    rng = np.random.default_rng(seed)
+    
+    # loop over each period, we buy on first day so start from 'periodth' day
+    for day in range(period, number_of_days, period):
+                     
+        # draw integers for each stock, 1 is buy, -1 is sell, 0 do nothing
+        signals[day] = rng.integers(-1, 2, size = N)
+    
+    return signals
+
+
+@profiling.timed
+def crossing_averages_signals(stock_prices, cool_down_period = 5, n = 200, m = 50, n_weights = [], m_weights = [], use_cache = True):
+    '''
+    Trading signals of the crossing averages strategy, see crossing_averages().
+    
+    Input:
+        stock_prices (ndarray): the stock price data
+        cool_down_period (int, default = 5): how long to wait before making another trade (nb days after a trade is made)
+        n (int, default 200): period in days for the slow moving average (n > m)
+        m (int, default 50): period in days for the fast moving average (m < n)
+        n_weights (list, default []): weights of the slow moving average, non-weighted if empty
+        m_weights (list, default []): weights of the fast moving average, non-weighted if empty
+        use_cache (bool, default True): get the moving averages from indicators.indicator_cache,
+            or calculate them without keeping them
+    
+    Output:
+        signals (ndarray): 1 to buy, -1 to sell and 0 to do nothing, shape (days, N)
+        n_day_MA (ndarray): the slow moving average
+        m_day_MA (ndarray): the fast moving average
+    
+    Example:
+        >>> signals, n_day_MA, m_day_MA = crossing_averages_signals(stock_price_data, 0, 200, 50)
+    '''
+    # get number of days
+    total_days = stock_prices.shape[0]
+    
+    # trading signals, 1 is buy, -1 is sell, 0 do nothing
+    signals = np.zeros(stock_prices.shape, dtype = np.int8)
+    
+    # initialize cool down matrix which indicates a cool down period
+    cool_down_matrix = np.zeros(stock_prices.shape, dtype = bool)
+    
+    # get n_day and m_day MA (only calculated if they are not in the indicator cache yet)
+    if use_cache:
+        n_day_MA = ind.indicator_cache.get(ind.moving_average, stock_prices, n, n_weights)
+        m_day_MA = ind.indicator_cache.get(ind.moving_average, stock_prices, m, m_weights)
+    else:
+        n_day_MA = ind.moving_average(stock_prices, n, n_weights)
+        m_day_MA = ind.moving_average(stock_prices, m, m_weights)
     
-    # initialize portfolio
-    portfolio = proc.create_portfolio(N * [amount], stock_prices, fees, ledger)
+    # now loop through each day starting from day n + 1 (index n) and decide to buy or sell
+    for day in range(n, total_days):
+        
+        # find stocks that cross from below and check that they are out of cool down period
+        stocks_to_buy = np.where((m_day_MA[day - 1] < n_day_MA[day - 1]) & (m_day_MA[day] > n_day_MA[day]) & ~cool_down_matrix[(day - cool_down_period - 1)])[0]
+        # if there are stocks to buy, buy them
+        if len(stocks_to_buy) > 0:
+            signals[day, stocks_to_buy] = 1
+
+            # indicate not to buy during cool down period
+            cool_down_matrix[(day - cool_down_period) : day, stocks_to_buy] = True
+
+        # if it crosses from above, we sell
+        # find stocks that cross from above and check that they are out of cool down period
+        stocks_to_sell = np.where((m_day_MA[day - 1] > n_day_MA[day - 1]) & (m_day_MA[day] < n_day_MA[day]) & ~cool_down_matrix[(day - cool_down_period - 1)])[0]
+        # if there are stocks to sell, sell them
+        if len(stocks_to_sell) > 0:
+            signals[day, stocks_to_sell] = -1
+
+            # indicate not to buy during cool down period
+            cool_down_matrix[(day - cool_down_period) : day, stocks_to_sell] = True
     
-    # initialize oscillator array
-    oscillator = np.zeros(stock_prices.shape)
+    return signals, n_day_MA, m_day_MA
+
+
+@profiling.timed
+def momentum_signals(stock_prices, osc_type = 'stochastic', lower = 0.25, upper = 0.75, n = 7, wait_time = 3, smoothing_period = False, use_cache = True):
+    '''
+    Trading signals of the momentum strategy, see momentum().
     
-    # get the oscillator for each stock
-    oscillator = ind.oscillator(stock_prices, n, osc_type, smoothing_period)
+    Input:
+        stock_prices (ndarray): the stock price data
+        osc_type (str, default 'stochastic'): either 'stochastic' or 'RSI' to choose an oscillator.
+        lower (float, default 0.25): lower threshold
+        upper (float, default 0.75): upper threshold
+        n (int, default 7): period of the oscillator (in days).
+        wait_time (int, default 3): period (in days) to wait before buying/selling stock if price remains below/above threshold.
+        smoothing_period (int, default = False): period of moving average to be applied to the oscillator.
+        use_cache (bool, default True): get the oscillator from indicators.indicator_cache,
+            or calculate it without keeping it
     
+    Output:
+        signals (ndarray): 1 to buy, -1 to sell, 2 to buy then sell (when lower > upper both can happen
+            on the same day) and 0 to do nothing, shape (days, N)
+        oscillator (ndarray): the oscillator of each stock
+    
+    Example:
+        >>> signals, oscillator = momentum_signals(stock_price_data, 'RSI', 0.2, 0.8, wait_time = 4)
+    '''
+    # trading signals, 1 is buy, -1 is sell, 2 is buy then sell, 0 do nothing
+    signals = np.zeros(stock_prices.shape, dtype = np.int8)
+
+    # get the oscillator for each stock (only calculated if it is not in the indicator cache yet)
+    if use_cache:
+        oscillator = ind.indicator_cache.get(ind.oscillator, stock_prices, n, osc_type, smoothing_period)
+    else:
+        oscillator = ind.oscillator(stock_prices, n, osc_type, smoothing_period)
+
     # get starting day of trading
     if smoothing_period != False and smoothing_period != 0:        
         day_1 = n + smoothing_period - 1
-    
+
     else:
         day_1 = n - 1
-    
+
+    # days where the oscillator is below the lower threshold / above the upper threshold (never when it is NaN)
+    below = oscillator < lower
+    above = oscillator > upper
+
+    # first day below/above the threshold, compared with the day before (rolled, so that on day 0 it is the last day)
+    crossed_below = below & np.roll(oscillator >= lower, 1, axis = 0)
+    crossed_above = above & np.roll(oscillator <= upper, 1, axis = 0)
+    crossed_below[:day_1] = False
+    crossed_above[:day_1] = False
+
     if wait_time > 0:
-        # initialize indicator matrix which indicates we can buy after waiting time
-        indicator_matrix = np.zeros(oscillator.shape)
+        # buy/sell wait_time days after crossing the threshold, if the oscillator stayed below/above it since
+        # (both thresholds mark the day they are crossed, as a single indicator)
+        crossed = crossed_below | crossed_above
+        to_buy = dwell_signals(below, crossed, wait_time)
+        to_sell = dwell_signals(above, crossed, wait_time)
 
-        # now loop through each day to decide whether to buy or sell and implement the wait time
-        for day in range(day_1, total_days):
+    else:
+        # buy/sell on the day the threshold is crossed
+        to_buy = crossed_below
+        to_sell = crossed_above
 
-           # check if oscillator is below lower threshold and this is first time we cross threshold
-            stocks_to_buy_later = np.where((oscillator[day] < lower) & (oscillator[(day - 1)] >= lower))[0]
-            # indicate to buy later
-            indicator_matrix[day, stocks_to_buy_later] = 1
+    # with lower > upper a stock can be both below and above, then we buy it and sell it on the same day
+    signals[to_buy] = 1
+    signals[to_sell] = -1
+    signals[to_buy & to_sell] = 2
 
-            # check indicator matrix, if 1 and stock remained below threshold we buy
-            stocks_to_buy_now = np.where((indicator_matrix[(day - wait_time)] == 1) & (np.all(oscillator[(day - wait_time) : (day + 1)] < lower, axis = 0)))[0]
-            # if there are stocks to buy, buy them
-            if np.any(stocks_to_buy_now):
-                for stock in stocks_to_buy_now:
-                    proc.buy(day, stock, amount, stock_prices, fees, portfolio, ledger)
+    return signals, oscillator
 
-           # check if oscillator is above upper threshold and this is first time we cross threshold
-            stocks_to_sell_later = np.where((oscillator[day] > upper) & (oscillator[(day - 1)] <= upper))[0]
-            # indicate to sell later
-            indicator_matrix[day, stocks_to_sell_later] = 1
 
-            # check indicator matrix, if 1 and stock remained below threshold we buy
-            stocks_to_sell_now = np.where((indicator_matrix[(day - wait_time)] == 1) & (np.all(oscillator[(day - wait_time) : (day + 1)] > upper, axis = 0)))[0]
-            # if there are stocks to sell, sell them
-            if np.any(stocks_to_sell_now) != 0:
-                for stock in stocks_to_sell_now:
-                    proc.sell(day, stock, stock_prices, fees, portfolio, ledger)          
+def dwell_signals(state, start, wait_time):
+    '''
+    Finds the days where a condition has held for wait_time days since a given start day,
+    e.g. an oscillator staying below a threshold for wait_time days after crossing it.
+    The number of days in a row the condition holds (its run length) is known from the last day
+    it did not hold, so the cost is the same for any wait_time.
+    
+    Input:
+        state (ndarray): boolean array of shape (days, N), True on the days the condition holds
+        start (ndarray): boolean array of shape (days, N), True on the days the wait starts
+        wait_time (int): number of days to wait after the start
+    
+    Output:
+        fired (ndarray): boolean array of shape (days, N), True on day d if start is True on
+            day d - wait_time and state is True on every day from d - wait_time to d
+    
+    Example:
+        >>> dwell_signals(np.array([[True], [True], [True], [False]]), np.array([[True], [False], [False], [False]]), 2)[:, 0]
+        array([False, False,  True, False])
+    '''
+    total_days = state.shape[0]
+    fired = np.zeros(state.shape, dtype = bool)
+    if wait_time >= total_days:
+        return fired
 
-    else:
-        # now loop through each day to decide whether to buy or sell and implement the wait time
-        for day in range(day_1, total_days):
+    # day number of each row (in int32 to use less memory when possible)
+    day_type = np.int32 if total_days < 2**31 else np.int64
+    days = np.arange(total_days, dtype = day_type).reshape((-1,) + (1,) * (state.ndim - 1))
 
-           # check if oscillator is below lower threshold and this is first time we cross threshold
-            stocks_to_buy_now = np.where((oscillator[day] < lower) & (oscillator[(day - 1)] >= lower ))[0]
-           
-            # if there are stocks to buy, buy them
-            if np.any(stocks_to_buy_now):
-                for stock in stocks_to_buy_now:
-                    proc.buy(day, stock, amount, stock_prices, fees, portfolio, ledger)
+    # last day the condition did not hold (-1 if it always held), so it has held for days - last_false days in a row
+    last_false = np.maximum.accumulate(np.where(state, day_type(-1), days), axis = 0)
+    run_length = days[wait_time:] - last_false[wait_time:]
 
-           # check if oscillator is above upper threshold and this is first time we cross threshold
-            stocks_to_sell_now = np.where((oscillator[day] > upper) & (oscillator[(day - 1)] <= upper))[0]
-            
-            # if there are stocks to sell, sell them
-            if np.any(stocks_to_sell_now) != 0:
-                for stock in stocks_to_sell_now:
-                    proc.sell(day, stock, stock_prices, fees, portfolio, ledger)                              
-    # sell portfolio at the end
-    for stock_number in range(N):
-        proc.sell(total_days - 1, stock_number, stock_prices, fees, portfolio, ledger)
-    
-    # option to plot oscillator with thresholds
-    if plot == True:
-        for i in range(N):
-            plt.plot(oscillator[:, i], label = f'Stock {i}')
-        plt.hlines(upper, n, total_days, colors = 'r', linestyles = '--', label = 'Upper')
-        plt.hlines(lower, n, total_days, colors = 'r', linestyles = '--', label = 'Lower')
-        plt.xlabel('Time (days)')
-        plt.ylabel('Value')
-        plt.legend()
-        plt.title(f'{osc_type} Oscillator, Upper Threshold = {upper}, Lower Threshold = {lower}')
-        plt.grid()
+    # fire if the wait started wait_time days ago and the run covers the whole wait (wait_time + 1 days)
+    fired[wait_time:] = start[:(total_days - wait_time)] & (run_length > wait_time)
+
+    return fired
+
+
+@profiling.timed
+def run_in_blocks(strategy, stock_prices, block_size = 10000, amount = 5000, fees = 20, ledger = None, positions = None, report_memory = False, **parameters):
+    '''
+    Runs a strategy on a few stocks at a time, for price data too large to fit in memory
+    (e.g. the memory-mapped prices given by get_data(), see data.read_price_file()).
+    Stocks are traded independently, so each block of block_size stocks (columns) is loaded,
+    turned into trades and forgotten in turn. Only the trades of all the stocks are kept, to write
+    the ledger in the same order as running the strategy on all the stocks at once:
+    the ledger and the cash are exactly the same. The indicators of each block are calculated without
+    indicators.indicator_cache: no other run uses them, and keeping them would hold on to the memory
+    the blocks are meant to save.
+    
+    Input:
+        strategy (function): random, crossing_averages or momentum (raises a ValueError otherwise)
+        stock_prices (ndarray): the stock price data, shape (days, N)
+        block_size (int, default 10000): number of stocks in each block
+        amount (float, default 5000): how much we spend on each purchase
+            (must cover fees)
+        fees (float, default 20): transaction fees
+        ledger (str/LedgerWriter/None, default None): path to the ledger file, or a LedgerWriter,
+            or None to keep no ledger
+        positions (ndarray, default None): array of shape (days, N) (e.g. a memmap) where to write
+            the shares held of each stock at the end of each day, None to forget them
+        report_memory (bool, default False): print the progress and the peak memory used (measured with tracemalloc)
+        parameters: the other parameters of the strategy (e.g. n, m and cool_down_period for crossing_averages)
+    
+    Output:
+        cash (ndarray): total cash earned (+) or spent (-) up to the end of each day, fees included
+    
+    Example:
+        Crossing averages on every stock of a large price file, 5000 stocks at a time.
+        >>> prices = data.get_data(filename = 'large_stock_data.txt', chunk_rows = 100)
+        >>> cash = run_in_blocks(crossing_averages, prices, 5000, ledger = 'crossing_average_ledger.txt', n = 100, m = 20)
+    '''
+    # only the strategies whose signals can be found one block at a time
+    if strategy not in (random, crossing_averages, momentum):
+        raise ValueError(f'run_in_blocks() cannot run {getattr(strategy, "__name__", strategy)}, '
+                         'the supported strategies are random, crossing_averages and momentum')
+    
+    # get number of days and number of stocks
+    number_of_days, N = stock_prices.shape
+    
+    # measure the memory used from now on
+    if report_memory:
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    
+    # the random signals depend on all the stocks, draw them all first (one byte per day and stock)
+    if strategy is random:
+        all_signals = random_signals(stock_prices.shape, **parameters)
+    
+    trades = []
+    for start in range(0, N, block_size):
+        stocks = slice(start, min(start + block_size, N))
+        
+        # load the prices of this block only
+        block_prices = np.array(stock_prices[:, stocks], dtype = ind.float_dtype(stock_prices))
+        
+        # get the trading signals of this block
+        if strategy is random:
+            signals = all_signals[:, stocks]
+        elif strategy is crossing_averages:
+            signals = crossing_averages_signals(block_prices, **parameters, use_cache = False)[0]
+        elif strategy is momentum:
+            signals = momentum_signals(block_prices, **parameters, use_cache = False)[0]
+        
+        # trades of this block, numbered like in the whole portfolio
+        block_trades, block_positions = proc.backtest_trades(signals, block_prices, amount, fees)
+        block_trades['stock'] += start
+        trades.append(block_trades)
+        
+        if positions is not None:
+            positions[:, stocks] = block_positions
+        
+        if report_memory:
+            print(f'{stocks.stop}/{N} stocks done, peak memory {tracemalloc.get_traced_memory()[1] / 2**20:.1f} MB')
+    
+    # log all the trades in order
+    cash = proc.record_trades({name: np.concatenate([block_trades[name] for block_trades in trades]) for name in trades[0]},
+                              number_of_days, fees, ledger)
+    
+    if report_memory:
+        print(f'Peak memory: {tracemalloc.get_traced_memory()[1] / 2**20:.1f} MB')
+        if not already_tracing:
+            tracemalloc.stop()
     
+    return cash
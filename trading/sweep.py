@@ -0,0 +1,187 @@
+# Functions to run a strategy with many different parameters in parallel.
+import itertools
+import concurrent.futures
+from multiprocessing import shared_memory
+import numpy as np
+import trading.performance as per
+import trading.profiling as profiling
+
+
+# stock prices shared with the workers of a sweep, set in every worker by attach_prices()
+shared_prices = None
+shared_block = None
+
+
+def parameter_grid(**values):
+    '''
+    Lists every combination of the given parameter values.
+
+    Input:
+        values (lists): the values to try for each parameter, given as keyword arguments
+
+    Output:
+        parameters (list): one dict of parameters per combination
+
+    Example:
+        >>> parameter_grid(n = [100, 200], m = [20, 50])
+        [{'n': 100, 'm': 20}, {'n': 100, 'm': 50}, {'n': 200, 'm': 20}, {'n': 200, 'm': 50}]
+    '''
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+
+def random_parameters(number_of_runs, seed = None, **values):
+    '''
+    Draws random combinations of the given parameter values, each value with equal probability.
+
+    Input:
+        number_of_runs (int): how many combinations to draw
+        seed (None/int/SeedSequence/Generator, default None): seed of the random draws
+        values (lists): the values to try for each parameter, given as keyword arguments
+
+    Output:
+        parameters (list): one dict of parameters per combination (without repeats, so there can be
+            fewer than number_of_runs of them)
+
+    Example:
+        Try 50 random combinations of thresholds and wait times.
+        >>> random_parameters(50, seed = 1, lower = np.arange(0.05, 0.5, 0.05), upper = np.arange(0.55, 1, 0.05), wait_time = range(8))
+    '''
+    rng = np.random.default_rng(seed)
+
+    # draw an index into the values of each parameter for every run
+    names = list(values)
+    choices = np.column_stack([rng.integers(0, len(values[name]), size = number_of_runs) for name in names])
+
+    # remove repeated combinations, keeping the order of the draws
+    _, first = np.unique(choices, axis = 0, return_index = True)
+    choices = choices[np.sort(first)]
+
+    return [{name: values[name][i] for name, i in zip(names, row)} for row in choices]
+
+
+def attach_prices(block_name, shape, dtype):
+    '''
+    Gives a worker process access to the stock prices of a sweep, without copying them.
+    Used as the initializer of the worker processes.
+
+    Input:
+        block_name (str): name of the shared memory block holding the stock prices
+        shape (tuple): shape of the stock price array
+        dtype (str): dtype of the stock price array
+    '''
+    global shared_prices, shared_block
+
+    # keep a reference to the block, the array is only valid as long as the block is open
+    shared_block = shared_memory.SharedMemory(name = block_name)
+    shared_prices = np.ndarray(shape, dtype = dtype, buffer = shared_block.buf)
+
+
+def run_metrics(strategy, parameters, amount = 5000, fees = 20, periods_per_year = 365):
+    '''
+    Runs a strategy on the shared stock prices without writing a ledger, and calculates its metrics.
+
+    Input:
+        strategy (function): the strategy, e.g. strategy.crossing_averages or strategy.momentum
+        parameters (dict): the parameters of the strategy
+        amount (float, default 5000): how much we spend on each purchase
+        fees (float, default 20): transaction fees
+        periods_per_year (int, default 365): number of days in a year, to annualize the Sharpe ratio
+
+    Output:
+        metrics (dict): the parameters followed by the metrics of performance.risk_metrics()
+    '''
+    positions, cash = strategy(shared_prices, amount = amount, fees = fees, ledger = None, **parameters)
+
+    # mark-to-market value of the shares held, bust stocks are worth 0
+    prices = np.nan_to_num(shared_prices, nan = 0)
+    holdings = np.sum(positions * prices, axis = 1)
+
+    # value of the shares bought and sold on each day
+    changes = np.diff(positions, axis = 0, prepend = 0)
+    traded = np.sum(np.abs(changes) * prices, axis = 1)
+
+    # the capital is all the cash the strategy spends and has not earned back yet, at its largest:
+    # the strategies keep buying after the portfolio is created on day 0
+    metrics = per.risk_metrics(cash + holdings, holdings, traded, per.capital_used(cash), periods_per_year)
+
+    return dict(parameters, **{name: float(value) for name, value in metrics.items()})
+
+
+@profiling.timed
+def sweep(strategy, stock_prices, parameters, max_workers = None, progress = True, amount = 5000, fees = 20, periods_per_year = 365, table = True, sort_by = 'Total Return'):
+    '''
+    Runs a strategy once for every combination of parameters, spread over several processes.
+    The stock prices are shared with the processes instead of being copied to each of them, and no
+    ledgers are written: the metrics of every run are kept in memory.
+
+    Input:
+        strategy (function): the strategy, e.g. strategy.crossing_averages or strategy.momentum
+        stock_prices (ndarray): the stock price data
+        parameters (list): one dict of parameters per run, e.g. from parameter_grid() or random_parameters()
+        max_workers (int, default None): number of processes, one per CPU if None.
+            With 1, everything runs in this process.
+        progress (bool, default True): print how many runs are done
+        amount (float, default 5000): how much we spend on each purchase
+        fees (float, default 20): transaction fees
+        periods_per_year (int, default 365): number of days in a year, to annualize the Sharpe ratio
+        table (bool, default True): return the results as a DataFrame (needs pandas), or as a list of dicts if False
+        sort_by (str, default 'Total Return'): metric to sort the runs by (highest first, NaN last), e.g. 'Total Return'
+            (profit/loss on the capital each run needed, see performance.capital_used()), 'Total Profit/Loss' or 'Sharpe Ratio'
+
+    Output:
+        results (DataFrame/list): one row (dict) per run with its parameters and metrics, best first
+
+    Example:
+        Find the best periods for the crossing averages strategy.
+        >>> grid = parameter_grid(n = [100, 150, 200], m = [10, 20, 50], cool_down_period = [0, 5])
+        >>> results = sweep(strategy.crossing_averages, sim_data, grid)
+        >>> results.head()
+    '''
+    global shared_prices, shared_block
+
+    # copy the stock prices once into shared memory
+    stock_prices = np.ascontiguousarray(stock_prices)
+    block = shared_memory.SharedMemory(create = True, size = max(stock_prices.nbytes, 1))
+    try:
+        np.ndarray(stock_prices.shape, dtype = stock_prices.dtype, buffer = block.buf)[...] = stock_prices
+        block_info = (block.name, stock_prices.shape, stock_prices.dtype.str)
+
+        results = []
+        if max_workers == 1:
+            # run in this process
+            attach_prices(*block_info)
+            try:
+                for run in parameters:
+                    results.append(run_metrics(strategy, run, amount, fees, periods_per_year))
+                    if progress:
+                        print(f'\r{len(results)}/{len(parameters)} runs done', end = '')
+            finally:
+                # the array has to go before the block can be closed
+                shared_prices = None
+                shared_block.close()
+                shared_block = None
+
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers, initializer = attach_prices, initargs = block_info) as executor:
+                runs = [executor.submit(run_metrics, strategy, run, amount, fees, periods_per_year) for run in parameters]
+                for run in concurrent.futures.as_completed(runs):
+                    results.append(run.result())
+                    if progress:
+                        print(f'\r{len(results)}/{len(parameters)} runs done', end = '')
+
+        if progress:
+            print()
+
+    finally:
+        block.close()
+        block.unlink()
+
+    # best runs first, runs without a valid metric last
+    results.sort(key = lambda run: (not np.isnan(run[sort_by]), run[sort_by]), reverse = True)
+    if not table:
+        return results
+
+    # tables need pandas, only imported when they are asked for
+    import pandas as pd
+    return pd.DataFrame(results)